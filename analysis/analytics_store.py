@@ -0,0 +1,185 @@
+import sys
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+try:
+    import duckdb
+except ImportError:  # Listed in requirements.txt; without it the store falls back to a plain SQLite file
+    duckdb = None
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.setup_db import get_db_path
+from database.chunks import get_chunk_size
+from monitoring.metrics import STAGE_ITEMS
+from regions.config import region_path
+
+DEFAULT_ANALYTICS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'analytics')
+
+# The analytics store is a read-only copy of the columns the analytics page and the
+# charts aggregate over, exported after each pipeline run. DuckDB executes the
+# aggregations column-wise; without it the same tables go into a SQLite file, which
+# still keeps the aggregations off the databases that serve pages.
+BACKEND = 'duckdb' if duckdb else 'sqlite'
+STORE_FILENAME = 'analytics.duckdb' if duckdb else 'analytics.db'
+
+# Days are kept as 'YYYY-MM-DD' text so the same queries run on both backends
+STORE_SCHEMA = [
+    "CREATE TABLE articles (id INTEGER, source VARCHAR, day VARCHAR, cluster_id INTEGER)",
+    "CREATE TABLE entities (id INTEGER, text VARCHAR, label VARCHAR)",
+    "CREATE TABLE mentions (article_id INTEGER, entity_id INTEGER, count INTEGER, day VARCHAR)",
+    "CREATE TABLE clusters (id INTEGER, topic VARCHAR, article_count INTEGER)",
+]
+
+# Rows copied out of the live database for each store table
+EXPORT_QUERIES = {
+    'articles': "SELECT id, source, substr(published_date, 1, 10), cluster_id FROM articles",
+    'entities': "SELECT id, text, label FROM entities",
+    'mentions': """SELECT m.article_id, m.entity_id, m.count, substr(a.published_date, 1, 10)
+                   FROM entity_mentions m JOIN articles a ON a.id = m.article_id""",
+    'clusters': "SELECT id, topic, article_count FROM clusters",
+}
+
+def get_analytics_dir():
+    """Get the current region's analytics directory; EVENT_ANALYTICS_DIR overrides it"""
+    return os.environ.get('EVENT_ANALYTICS_DIR') or region_path(DEFAULT_ANALYTICS_DIR, 'analytics')
+
+def get_store_path():
+    """Path of the current region's analytics store"""
+    return os.path.join(get_analytics_dir(), STORE_FILENAME)
+
+def _connect(path, read_only=False):
+    if duckdb:
+        return duckdb.connect(path, read_only=read_only)
+    if read_only:
+        return sqlite3.connect(f'file:{os.path.abspath(path)}?mode=ro', uri=True, check_same_thread=False)
+    return sqlite3.connect(path)
+
+def _copy_rows(source, store, table, query, chunk_size):
+    """Copy the rows of a query on the live database into a store table a chunk at a time
+
+    The query runs as a single statement, so its chunks are consistent with each
+    other. DuckDB takes each chunk as a DataFrame in one columnar append instead
+    of row by row inserts. Returns the number of rows copied.
+    """
+    count = 0
+    if duckdb:
+        import pandas as pd
+        for frame in pd.read_sql_query(query, source, chunksize=chunk_size):
+            store.append(table, frame)
+            count += len(frame)
+        return count
+
+    cursor = source.execute(query)
+    placeholders = ', '.join('?' * len(cursor.description))
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return count
+        store.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows)
+        count += len(rows)
+
+def export_analytics_store(chunk_size=None):
+    """Export articles, entity mentions and clusters from the live database into a fresh analytics store
+
+    The store is written under a temporary name and swapped in with an atomic
+    rename, so readers always see a complete export. Returns the number of
+    articles exported.
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    path = get_store_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    for stale in (tmp_path, f"{tmp_path}.wal"):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    if not duckdb:
+        print("Warning: duckdb is not installed, so the analytics store is a SQLite row store and the "
+              "aggregations won't run column-wise; install the packages in requirements.txt")
+
+    start = time.time()
+    counts = {}
+    source = sqlite3.connect(f'file:{os.path.abspath(get_db_path())}?mode=ro', uri=True)
+    try:
+        with closing(_connect(tmp_path)) as store:
+            store.execute("BEGIN TRANSACTION")
+            for statement in STORE_SCHEMA:
+                store.execute(statement)
+            for table, query in EXPORT_QUERIES.items():
+                counts[table] = _copy_rows(source, store, table, query, chunk_size)
+            store.commit()
+    finally:
+        source.close()
+
+    os.replace(tmp_path, path)
+    STAGE_ITEMS.inc(counts['articles'], stage='analytics')
+    print(f"Exported {counts['articles']} articles, {counts['mentions']} entity mentions and "
+          f"{counts['clusters']} clusters to the {BACKEND} analytics store in {time.time() - start:.1f}s")
+    return counts['articles']
+
+def has_store():
+    """Whether the current region has an analytics store"""
+    return os.path.exists(get_store_path())
+
+def query_store(sql, params=()):
+    """Run a query against the current region's analytics store; returns its rows, or None without a store"""
+    path = get_store_path()
+    if not os.path.exists(path):
+        return None
+    with closing(_connect(path, read_only=True)) as store:
+        return store.execute(sql, params).fetchall()
+
+def get_totals():
+    """Article, cluster and entity counts, or None without a store"""
+    rows = query_store(
+        """SELECT (SELECT COUNT(*) FROM articles), (SELECT COUNT(*) FROM clusters),
+                  (SELECT COUNT(*) FROM entities)"""
+    )
+    if rows is None:
+        return None
+    articles, clusters, entities = rows[0]
+    return {'total_articles': articles, 'total_clusters': clusters, 'total_entities': entities}
+
+def get_source_counts():
+    """(source, article count) pairs, or None without a store"""
+    return query_store("SELECT source, COUNT(*) FROM articles GROUP BY source ORDER BY source")
+
+def get_cluster_sizes():
+    """(cluster id, topic, article count) rows, or None without a store"""
+    return query_store("SELECT id, topic, article_count FROM clusters ORDER BY id")
+
+def get_entity_totals(limit=20):
+    """The most mentioned entities as (text, label, total count) rows, or None without a store"""
+    return query_store(
+        """WITH totals AS (
+               SELECT entity_id, SUM(count) AS total FROM mentions GROUP BY entity_id
+           )
+           SELECT e.text, e.label, t.total FROM totals t JOIN entities e ON e.id = t.entity_id
+           ORDER BY t.total DESC, e.text LIMIT ?""",
+        (limit,)
+    )
+
+def get_entity_timeline(limit=5, days=30):
+    """Daily mentions of the most mentioned entities over the last days
+
+    Returns (text, label, day, count) rows ordered by day, or None without a store.
+    """
+    since = time.strftime('%Y-%m-%d', time.localtime(time.time() - days * 86400))
+    return query_store(
+        """WITH top AS (
+               SELECT entity_id FROM mentions GROUP BY entity_id ORDER BY SUM(count) DESC, entity_id LIMIT ?
+           ), daily AS (
+               SELECT m.entity_id, m.day, SUM(m.count) AS total FROM mentions m
+               JOIN top ON top.entity_id = m.entity_id
+               WHERE m.day >= ?
+               GROUP BY m.entity_id, m.day
+           )
+           SELECT e.text, e.label, d.day, d.total FROM daily d JOIN entities e ON e.id = d.entity_id
+           ORDER BY d.day, e.text""",
+        (limit, since)
+    )
+
+if __name__ == "__main__":
+    export_analytics_store()
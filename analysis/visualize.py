@@ -1,138 +1,349 @@
 import sys
 import os
-import matplotlib.pyplot as plt
-import seaborn as sns
-import pandas as pd
-from collections import Counter
+import json
+import glob
+import time
+import multiprocessing
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
 from sqlalchemy import func
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database.models import Article, Entity, Cluster, setup_db
+from database.models import Article, EntityMention, Cluster, setup_db
+from database.entity_stats import ensure_entity_stats, top_entities as get_top_entities
+from analysis.analytics_store import (
+    has_store, get_entity_totals, get_cluster_sizes, get_source_counts, get_entity_timeline
+)
+from regions.config import DEFAULT_REGION, get_region
 
-def create_entity_frequency_chart(output_dir='webapp/static'):
-    """Create a chart showing the most frequent entities"""
-    session = setup_db()
-    
-    # Get top entities
-    top_entities = session.query(
-        Entity.text, Entity.label, func.sum(Entity.count).label('total_count')
+# Versioned chart files and the manifest pointing at the current ones
+CHARTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'webapp', 'static', 'charts')
+MANIFEST_NAME = 'charts.json'
+
+def get_charts_static_path():
+    """Path of the current region's chart files below the web app's static folder"""
+    region = get_region()
+    return 'charts' if region == DEFAULT_REGION else f'charts/{region}'
+
+def get_charts_dir():
+    """Get the directory holding the current region's chart files; EVENT_CHARTS_DIR overrides it"""
+    return os.environ.get('EVENT_CHARTS_DIR') or os.path.join(os.path.dirname(CHARTS_DIR), *get_charts_static_path().split('/'))
+
+# 'png' renders images with matplotlib; 'data' only writes JSON series that the
+# analytics page draws in the browser, so matplotlib is never needed
+CHART_MODE = os.environ.get('CHART_MODE', 'png')
+
+# Entities followed over time on the timeline chart, and how far back it reaches
+TIMELINE_ENTITIES = 5
+TIMELINE_DAYS = 30
+
+def _timeline_series(rows):
+    """Turn (text, label, day, count) rows into one series of daily counts per entity"""
+    days = sorted({row[2] for row in rows})
+    positions = {day: i for i, day in enumerate(days)}
+    series = {}
+    for text, label, day, count in rows:
+        counts = series.setdefault((text, label), [0] * len(days))
+        counts[positions[day]] = count
+    return {
+        'days': days,
+        'entities': [text for text, _ in series],
+        'types': [label for _, label in series],
+        'counts': list(series.values())
+    }
+
+def _chart_data(top_entities, clusters, sources, timeline):
+    return {
+        'entity_frequency': {
+            'entities': [e[0] for e in top_entities],
+            'types': [e[1] for e in top_entities],
+            'counts': [e[2] for e in top_entities]
+        },
+        'cluster_distribution': {
+            'ids': [c[0] for c in clusters],
+            'topics': [c[1] if c[1] else f"Cluster {c[0]}" for c in clusters],
+            'counts': [c[2] for c in clusters]
+        },
+        'source_distribution': {
+            'sources': [s[0] for s in sources],
+            'counts': [s[1] for s in sources]
+        },
+        'entity_timeline': _timeline_series(timeline)
+    }
+
+def get_store_chart_data():
+    """Collect the series behind every chart from the analytics store, or None if it was never exported"""
+    if not has_store():
+        return None
+    return _chart_data(
+        get_entity_totals(limit=20),
+        get_cluster_sizes(),
+        get_source_counts(),
+        get_entity_timeline(limit=TIMELINE_ENTITIES, days=TIMELINE_DAYS)
+    )
+
+def get_chart_data(session):
+    """Collect the series behind every chart in one pass over the database"""
+    # Get top entities from the materialized global totals
+    top_entities = get_top_entities(session, limit=20)
+
+    # Get cluster counts
+    clusters = session.query(Cluster.id, Cluster.topic, Cluster.article_count).order_by(Cluster.id).all()
+
+    # Get article source counts
+    sources = session.query(
+        Article.source, func.count(Article.id).label('count')
     ).group_by(
-        Entity.text, Entity.label
-    ).order_by(
-        func.sum(Entity.count).desc()
-    ).limit(20).all()
-    
-    if not top_entities:
+        Article.source
+    ).all()
+
+    # Get daily mentions of the leading entities
+    day = func.substr(Article.published_date, 1, 10)
+    since = (datetime.now() - timedelta(days=TIMELINE_DAYS)).strftime('%Y-%m-%d')
+    leading = {e.entity_id: e for e in top_entities[:TIMELINE_ENTITIES]}
+    daily = session.query(
+        EntityMention.entity_id, day, func.sum(EntityMention.count)
+    ).join(
+        Article, Article.id == EntityMention.article_id
+    ).filter(
+        EntityMention.entity_id.in_(leading), day >= since
+    ).group_by(EntityMention.entity_id, day).order_by(day).all()
+    timeline = [(leading[entity_id].text, leading[entity_id].label, d, count) for entity_id, d, count in daily]
+
+    return _chart_data(
+        [(e.text, e.label, e.total_count) for e in top_entities], clusters, sources, timeline
+    )
+
+def _new_figure(figsize):
+    """Create a standalone Agg figure, independent of pyplot's global state"""
+    import seaborn as sns
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    with sns.axes_style("whitegrid"):
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+    return fig, ax
+
+def _save_figure(fig, output_dir, filename):
+    """Save a figure via a temporary file so readers never see a partial PNG"""
+    output_dir = output_dir or get_charts_dir()
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, filename)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fig.tight_layout()
+    fig.savefig(tmp_path, dpi=100, format='png')
+    os.replace(tmp_path, path)
+    return filename
+
+def create_entity_frequency_chart(data, output_dir=None, filename='entity_frequency.png'):
+    """Create a chart showing the most frequent entities"""
+    import pandas as pd
+    import seaborn as sns
+
+    if not data['entities']:
         print("No entities found.")
-        session.close()
-        return
-    
+        return None
+
     # Prepare data for plotting
-    df = pd.DataFrame([(e.text, e.label, e.total_count) for e in top_entities], 
-                      columns=['Entity', 'Type', 'Count'])
-    
-    # Create figure
-    plt.figure(figsize=(12, 8))
-    sns.set_style("whitegrid")
-    
+    df = pd.DataFrame({'Entity': data['entities'], 'Type': data['types'], 'Count': data['counts']})
+
     # Create bar plot
-    sns.barplot(data=df, x='Count', y='Entity', hue='Type')
-    
-    plt.title('Most Frequent Entities', fontsize=16)
-    plt.xlabel('Frequency', fontsize=12)
-    plt.ylabel('Entity', fontsize=12)
-    
+    fig, ax = _new_figure((12, 8))
+    sns.barplot(data=df, x='Count', y='Entity', hue='Type', ax=ax)
+
+    ax.set_title('Most Frequent Entities', fontsize=16)
+    ax.set_xlabel('Frequency', fontsize=12)
+    ax.set_ylabel('Entity', fontsize=12)
+
     # Save figure
-    os.makedirs(output_dir, exist_ok=True)
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, 'entity_frequency.png'), dpi=100)
-    plt.close()
-    
+    _save_figure(fig, output_dir, filename)
+
     print("Entity frequency chart created!")
+    return filename
 
-def create_cluster_distribution_chart(output_dir='webapp/static'):
+def create_cluster_distribution_chart(data, output_dir=None, filename='cluster_distribution.png'):
     """Create a chart showing the distribution of articles in clusters"""
-    session = setup_db()
-    
-    # Get cluster counts
-    clusters = session.query(Cluster.id, Cluster.article_count, Cluster.topic).all()
-    
-    if not clusters:
+    import pandas as pd
+    import seaborn as sns
+
+    if not data['ids']:
         print("No clusters found.")
-        session.close()
-        return
-    
+        return None
+
     # Prepare data for plotting
-    df = pd.DataFrame([(c.id, c.article_count, c.topic if c.topic else f"Cluster {c.id}") 
-                       for c in clusters], 
-                      columns=['ID', 'Articles', 'Topic'])
-    
-    # Create figure
-    plt.figure(figsize=(10, 8))
-    sns.set_style("whitegrid")
-    
+    df = pd.DataFrame({'ID': data['ids'], 'Articles': data['counts'], 'Topic': data['topics']})
+
     # Create bar plot
-    ax = sns.barplot(data=df, x='ID', y='Articles')
-    
+    fig, ax = _new_figure((10, 8))
+    sns.barplot(data=df, x='ID', y='Articles', ax=ax)
+
     # Add topic labels
     for i, topic in enumerate(df['Topic']):
         ax.text(i, 0.5, topic, rotation=90, ha='center', fontsize=10)
-    
-    plt.title('Article Distribution by Cluster', fontsize=16)
-    plt.xlabel('Cluster ID', fontsize=12)
-    plt.ylabel('Number of Articles', fontsize=12)
-    
+
+    ax.set_title('Article Distribution by Cluster', fontsize=16)
+    ax.set_xlabel('Cluster ID', fontsize=12)
+    ax.set_ylabel('Number of Articles', fontsize=12)
+
     # Save figure
-    os.makedirs(output_dir, exist_ok=True)
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, 'cluster_distribution.png'), dpi=100)
-    plt.close()
-    
+    _save_figure(fig, output_dir, filename)
+
     print("Cluster distribution chart created!")
+    return filename
 
-def create_source_distribution_chart(output_dir='webapp/static'):
+def create_source_distribution_chart(data, output_dir=None, filename='source_distribution.png'):
     """Create a chart showing the distribution of articles by source"""
-    session = setup_db()
-    
-    # Get article source counts
-    sources = session.query(
-        Article.source, func.count(Article.id).label('count')
-    ).group_by(
-        Article.source
-    ).all()
-    
-    if not sources:
+    if not data['sources']:
         print("No sources found.")
-        session.close()
-        return
-    
-    # Prepare data for plotting
-    df = pd.DataFrame([(s.source, s.count) for s in sources], 
-                      columns=['Source', 'Count'])
-    
-    # Create figure
-    plt.figure(figsize=(10, 6))
-    sns.set_style("whitegrid")
-    
+        return None
+
     # Create pie chart
-    plt.pie(df['Count'], labels=df['Source'], autopct='%1.1f%%', startangle=90)
-    plt.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle
-    
-    plt.title('Article Distribution by Source', fontsize=16)
-    
+    fig, ax = _new_figure((10, 6))
+    ax.pie(data['counts'], labels=data['sources'], autopct='%1.1f%%', startangle=90)
+    ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle
+
+    ax.set_title('Article Distribution by Source', fontsize=16)
+
     # Save figure
-    os.makedirs(output_dir, exist_ok=True)
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, 'source_distribution.png'), dpi=100)
-    plt.close()
-    
+    _save_figure(fig, output_dir, filename)
+
     print("Source distribution chart created!")
+    return filename
+
+def create_entity_timeline_chart(data, output_dir=None, filename='entity_timeline.png'):
+    """Create a chart showing daily mentions of the most frequent entities"""
+    if not data['days']:
+        print("No entity mentions in the timeline window.")
+        return None
+
+    # One line per entity
+    fig, ax = _new_figure((12, 6))
+    for entity, label, counts in zip(data['entities'], data['types'], data['counts']):
+        ax.plot(data['days'], counts, marker='o', label=f"{entity} ({label})")
+
+    ax.set_title('Entity Mentions Over Time', fontsize=16)
+    ax.set_xlabel('Day', fontsize=12)
+    ax.set_ylabel('Mentions', fontsize=12)
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.legend()
+
+    # Save figure
+    _save_figure(fig, output_dir, filename)
+
+    print("Entity timeline chart created!")
+    return filename
+
+CHART_RENDERERS = {
+    'entity_frequency': create_entity_frequency_chart,
+    'cluster_distribution': create_cluster_distribution_chart,
+    'source_distribution': create_source_distribution_chart,
+    'entity_timeline': create_entity_timeline_chart
+}
+
+def _render_chart(name, data, output_dir, filename):
+    """Render one chart; runs in a worker process"""
+    return name, CHART_RENDERERS[name](data, output_dir, filename)
+
+def render_charts(chart_data, version, output_dir=None, parallel=True):
+    """Render every chart as a PNG, each in its own worker process when parallel"""
+    output_dir = output_dir or get_charts_dir()
+    jobs = [
+        (name, chart_data[name], output_dir, f'{name}.{version}.png')
+        for name in CHART_RENDERERS
+    ]
+
+    if parallel:
+        try:
+            # spawn gives each worker a clean process instead of a copy of the runner's threads and connections
+            context = multiprocessing.get_context('spawn')
+            workers = min(len(jobs), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                futures = [executor.submit(_render_chart, *job) for job in jobs]
+                return dict(future.result() for future in futures)
+        except (OSError, RuntimeError) as e:
+            # Environments without process support fall back to rendering inline
+            print(f"Parallel chart rendering unavailable ({e}), rendering serially.")
+
+    return dict(_render_chart(*job) for job in jobs)
+
+def load_chart_manifest(output_dir=None):
+    """Load the manifest describing the current chart files, or None if charts were never rendered"""
+    output_dir = output_dir or get_charts_dir()
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_json(output_dir, filename, content):
+    """Atomically write a JSON file"""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, filename)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(content, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def _remove_old_charts(output_dir, keep_versions):
+    """Delete chart files that belong to neither the current nor the previous version"""
+    paths = glob.glob(os.path.join(output_dir, '*.png')) + glob.glob(os.path.join(output_dir, 'chart_data.*.json'))
+    for path in paths:
+        version = os.path.basename(path).split('.')[-2]
+        if version not in keep_versions:
+            os.remove(path)
+
+def generate_all_visualizations(version=None, output_dir=None, mode=None, parallel=True, from_store=True,
+                                db_fallback=True):
+    """Generate all visualizations as versioned files and publish them through the manifest
+
+    mode is 'png' (images plus their data) or 'data' (JSON series only); it
+    defaults to the CHART_MODE environment variable. With from_store=False the
+    series are aggregated from the live database instead of the analytics store.
+    With db_fallback=False nothing is generated without an analytics store;
+    returns whether charts were generated.
+    """
+    mode = mode or CHART_MODE
+    output_dir = output_dir or get_charts_dir()
+    version = str(version if version is not None else int(time.time()))
+    previous = load_chart_manifest(output_dir)
+
+    # The aggregations run on the analytics store; the database is only queried until one is exported,
+    # or while a run is still writing it
+    chart_data = get_store_chart_data() if from_store else None
+    if chart_data is None:
+        if not db_fallback:
+            print("No analytics store to build charts from yet; the pipeline's charts stage will build them")
+            return False
+        session = setup_db()
+        ensure_entity_stats(session)
+        try:
+            chart_data = get_chart_data(session)
+        finally:
+            session.close()
+
+    data_filename = f'chart_data.{version}.json'
+    _write_json(output_dir, data_filename, chart_data)
+
+    charts = {}
+    if mode == 'png':
+        charts = render_charts(chart_data, version, output_dir, parallel=parallel)
+
+    _write_json(output_dir, MANIFEST_NAME, {
+        'version': version,
+        'generated_at': time.time(),
+        'mode': mode,
+        'data': data_filename,
+        'charts': {name: filename for name, filename in charts.items() if filename}
+    })
 
-def generate_all_visualizations():
-    """Generate all visualizations"""
-    create_entity_frequency_chart()
-    create_cluster_distribution_chart()
-    create_source_distribution_chart()
+    # Pages rendered just before the swap may still reference the previous version
+    keep_versions = {version}
+    if previous:
+        keep_versions.add(str(previous.get('version')))
+    _remove_old_charts(output_dir, keep_versions)
+    return True
 
 if __name__ == "__main__":
-    generate_all_visualizations()
\ No newline at end of file
+    generate_all_visualizations()
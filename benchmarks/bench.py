@@ -0,0 +1,310 @@
+import sys
+import os
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.corpus import DEFAULT_SEED, build_corpus_db, generate_articles
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BENCH_DIR, '.corpus')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+# A benchmark regresses when its median is this much slower than the baseline...
+DEFAULT_THRESHOLD = 0.20
+# ...and by at least this many seconds, so timer noise on tiny timings is ignored
+MIN_REGRESSION_SECONDS = 0.005
+
+# Pipeline stages in the order their inputs are produced; each runs on the output of the previous one
+STAGE_CHAIN = ['preprocess', 'ner', 'cluster', 'topics', 'summarize']
+BENCHMARKS = ['scrape'] + STAGE_CHAIN + ['web']
+
+# Articles served by the local feed in the scraper benchmark
+SCRAPE_ARTICLES = 100
+
+def copy_db(source, destination):
+    """Copy a database, including pages still in its WAL, to a fresh file"""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(destination + suffix):
+            os.remove(destination + suffix)
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(destination)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+def use_db(path):
+    """Point every later setup_db() call in this process at path"""
+    os.environ['EVENT_DB_PATH'] = path
+
+def corpus_db(size, seed, served=False):
+    """Get the path of a cached synthetic corpus database, generating it on first use"""
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    path = os.path.join(CORPUS_DIR, f"corpus-{size}-{seed}{'-served' if served else ''}.db")
+    if not os.path.exists(path):
+        print(f"Generating {'served ' if served else ''}corpus of {size} articles...")
+        tmp_path = f"{path}.tmp"
+        build_corpus_db(tmp_path, size, seed, served=served)
+        copy_db(tmp_path, path)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(tmp_path + suffix):
+                os.remove(tmp_path + suffix)
+    return path
+
+def measure(repeat, prepare, func):
+    """Time func repeat times, calling prepare (untimed) before each run"""
+    timings = []
+    for run in range(repeat):
+        prepare(run)
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def bench_scrape(args, work_dir):
+    """Scrape a local feed: RSS parsing, article page extraction and inserts"""
+    try:
+        from scraper import scrape
+    except ImportError as e:
+        print(f"Skipping scrape: {e}")
+        return {}
+    from database.models import setup_db
+    from benchmarks.feed_server import FeedServer
+
+    # Benchmarks measure our code, not the politeness delay between requests
+    scrape.REQUEST_DELAY_SECONDS = (0, 0)
+    articles = list(generate_articles(SCRAPE_ARTICLES, args.seed))
+
+    with FeedServer(articles) as server:
+        def prepare(run):
+            path = os.path.join(work_dir, f'scrape-{run}.db')
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            use_db(path)
+
+        def scrape_feed():
+            session = setup_db()
+            try:
+                scrape.scrape_rss_feed(session, server.feed_url, 'Synthetic News', limit=len(articles))
+            finally:
+                session.close()
+
+        return {'scrape': measure(args.repeat, prepare, scrape_feed)}
+
+def _stage_function(name):
+    """Import a pipeline stage lazily, so missing NLP packages only skip that stage"""
+    if name == 'preprocess':
+        from processing.preprocess import preprocess_articles
+        return preprocess_articles
+    if name == 'ner':
+        from processing.ner import process_entities
+        return process_entities
+    if name == 'cluster':
+        from processing.cluster import cluster_articles
+        return cluster_articles
+    if name == 'topics':
+        from processing.topic_model import extract_topics
+        return extract_topics
+    if name == 'summarize':
+        from summarization.summarize import generate_cluster_summaries
+        return generate_cluster_summaries
+    raise ValueError(f"Unknown stage {name}")
+
+def bench_stages(args, work_dir, selected):
+    """Run the pipeline stages in order, timing the selected ones on fresh copies of their input"""
+    results = {}
+    last = max(STAGE_CHAIN.index(name) for name in selected)
+    base = corpus_db(args.size, args.seed)
+
+    for name in STAGE_CHAIN[:last + 1]:
+        try:
+            stage = _stage_function(name)
+        except ImportError as e:
+            print(f"Skipping {name} and later stages: {e}")
+            break
+
+        outputs = []
+
+        def prepare(run):
+            # A new file per run, since setup_db keeps connections open per path
+            outputs.append(os.path.join(work_dir, f'{name}-{run}.db'))
+            copy_db(base, outputs[-1])
+            use_db(outputs[-1])
+
+        # Stages that are only needed as input for a later one run once, untimed
+        timings = measure(args.repeat if name in selected else 1, prepare, stage)
+        if name in selected:
+            results[name] = timings
+        base = outputs[-1]
+    return results
+
+WEB_ROUTES = {
+    'web_index': lambda ids: '/',
+    'web_cluster': lambda ids: f"/cluster/{ids['cluster']}",
+    'web_analytics': lambda ids: '/analytics',
+    'web_search': lambda ids: f"/search?q={ids['term']}",
+    'web_api_clusters': lambda ids: '/api/clusters?limit=100',
+    'web_api_articles': lambda ids: '/api/articles?limit=100',
+    'web_api_search': lambda ids: f"/api/search?q={ids['term']}",
+}
+
+def bench_web(args, work_dir):
+    """Render the web pages and API responses from a published snapshot, with a cold page cache"""
+    from database.models import Cluster, setup_db
+    from database.runs import get_data_version
+    from database.snapshot import publish_snapshot
+    from database.entity_stats import top_entities
+    from analysis.analytics_store import export_analytics_store
+    from analysis.visualize import generate_all_visualizations
+
+    path = os.path.join(work_dir, 'web.db')
+    copy_db(corpus_db(args.size, args.seed, served=True), path)
+    use_db(path)
+
+    session = setup_db()
+    ids = {
+        'cluster': session.query(Cluster.id).order_by(Cluster.article_count.desc()).limit(1).scalar(),
+        'term': top_entities(session, limit=1)[0].text.split()[0],
+    }
+    version = get_data_version(session)
+    session.close()
+    publish_snapshot(version)
+    # The analytics page reads the corpus's analytics store and chart data, as after a pipeline run
+    export_analytics_store()
+    generate_all_visualizations(version, mode='data')
+
+    from webapp import app as webapp
+    # Chart rendering is benchmarked with the pipeline, not as a side effect of a page view
+    webapp.render_charts_in_background = lambda version=None: None
+    client = webapp.app.test_client()
+
+    def prepare(run):
+        webapp._page_cache.clear()
+
+    results = {}
+    for name, route in WEB_ROUTES.items():
+        url = route(ids)
+
+        def get():
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} returned {response.status_code}")
+
+        results[name] = measure(args.repeat, prepare, get)
+    return results
+
+def run_benchmarks(args):
+    """Run the selected benchmarks in a scratch directory and return their timings"""
+    selected = args.only or BENCHMARKS
+    work_dir = tempfile.mkdtemp(prefix='event-bench-')
+    # Snapshots, the analytics store and charts written by the benchmarks must not replace the real ones
+    os.environ['EVENT_SNAPSHOT_DIR'] = os.path.join(work_dir, 'snapshots')
+    os.environ['EVENT_ANALYTICS_DIR'] = os.path.join(work_dir, 'analytics')
+    os.environ['EVENT_CHARTS_DIR'] = os.path.join(work_dir, 'charts')
+    results = {}
+    try:
+        if 'scrape' in selected:
+            results.update(bench_scrape(args, work_dir))
+        stages = [name for name in STAGE_CHAIN if name in selected]
+        if stages:
+            results.update(bench_stages(args, work_dir, stages))
+        if 'web' in selected:
+            results.update(bench_web(args, work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def summarize_timings(timings):
+    return {name: {'median': statistics.median(runs), 'min': min(runs), 'runs': runs}
+            for name, runs in timings.items()}
+
+def baseline_path(size, seed):
+    return os.path.join(RESULTS_DIR, f'baseline-{size}-{seed}.json')
+
+def save_results(record, save_baseline):
+    """Append a result to the history and, if asked or if there is none yet, make it the baseline"""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, 'history.jsonl'), 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+    path = baseline_path(record['size'], record['seed'])
+    if save_baseline or not os.path.exists(path):
+        with open(path, 'w') as f:
+            json.dump(record, f, indent=2)
+        print(f"Saved baseline to {path}")
+
+def find_regressions(record, baseline, threshold):
+    """Compare medians with the baseline; returns (name, baseline, current) for each regression"""
+    regressions = []
+    for name, result in record['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        before, after = previous['median'], result['median']
+        if after > before * (1 + threshold) and after - before > MIN_REGRESSION_SECONDS:
+            regressions.append((name, before, after))
+    return regressions
+
+def print_report(record, baseline):
+    print(f"\n{'benchmark':<20} {'median':>10} {'min':>10} {'baseline':>10} {'change':>8}")
+    for name, result in record['results'].items():
+        previous = baseline['results'].get(name) if baseline else None
+        line = f"{name:<20} {result['median']:>9.3f}s {result['min']:>9.3f}s"
+        if previous:
+            change = (result['median'] - previous['median']) / previous['median'] if previous['median'] else 0
+            line += f" {previous['median']:>9.3f}s {change:>+7.1%}"
+        print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages and web routes on a synthetic corpus")
+    parser.add_argument('--size', type=int, default=1000, help="articles in the synthetic corpus (1k to 1M)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per benchmark; the median is compared")
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, help="run only these benchmarks")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="fail when a median is this fraction slower than the baseline")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the new baseline")
+    args = parser.parse_args(argv)
+
+    record = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'size': args.size,
+        'seed': args.seed,
+        'results': summarize_timings(run_benchmarks(args)),
+    }
+
+    baseline = None
+    if os.path.exists(baseline_path(args.size, args.seed)):
+        with open(baseline_path(args.size, args.seed)) as f:
+            baseline = json.load(f)
+    print_report(record, baseline)
+
+    regressions = find_regressions(record, baseline, args.threshold) if baseline and not args.save_baseline else []
+    save_results(record, args.save_baseline)
+
+    for name, before, after in regressions:
+        print(f"REGRESSION {name}: {before:.3f}s -> {after:.3f}s (threshold {args.threshold:.0%})")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
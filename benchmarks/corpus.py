@@ -0,0 +1,283 @@
+import sys
+import os
+import random
+import argparse
+from datetime import datetime, timedelta
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Generation is seeded, so the same size and seed always give the same corpus
+DEFAULT_SEED = 1234
+START_DATE = datetime(2024, 1, 1)
+
+SOURCES = [
+    'Seattle PI', 'KOMO News', 'MyNorthwest', 'KING 5', 'The Stranger',
+    'Crosscut', 'South Seattle Emerald', 'Capitol Hill Seattle', 'Seattle Medium'
+]
+
+PLACES = [
+    'Seattle', 'Tacoma', 'Bellevue', 'Everett', 'Redmond', 'Kirkland', 'Renton', 'Shoreline',
+    'Ballard', 'Capitol Hill', 'Fremont', 'Rainier Valley', 'West Seattle', 'Beacon Hill',
+    'South Lake Union', 'Queen Anne', 'Georgetown', 'Northgate', 'Puget Sound', 'King County',
+    'Pierce County', 'Snohomish County', 'Lake Washington', 'Pike Place Market', 'Sea-Tac Airport'
+]
+
+FIRST_NAMES = [
+    'Maria', 'James', 'Aisha', 'David', 'Mei', 'Robert', 'Priya', 'Michael', 'Fatima', 'John',
+    'Sofia', 'Daniel', 'Keiko', 'Carlos', 'Grace', 'Ahmed', 'Linda', 'Tomas', 'Hannah', 'Kevin'
+]
+
+LAST_NAMES = [
+    'Chen', 'Johnson', 'Nguyen', 'Williams', 'Garcia', 'Kim', 'Patel', 'Brown', 'Martinez',
+    'Lee', 'Harris', 'Tanaka', 'Lopez', 'Wilson', 'Okafor', 'Anderson', 'Singh', 'Clark'
+]
+
+# Story templates per category: title and body sentences, filled with the event's entities
+CATEGORIES = {
+    'transit': {
+        'orgs': ['Sound Transit', 'King County Metro', 'WSDOT', 'Port of Seattle'],
+        'titles': ['{org} announces new service to {place}', 'Delays expected on {place} line as {org} starts repairs',
+                   '{place} riders react to {org} schedule changes'],
+        'sentences': ['{org} said the changes to service near {place} will begin next month.',
+                      'Commuters in {place} have waited years for faster trips downtown.',
+                      '"This is a major step for riders across the region," said {person}.',
+                      'The project is expected to cost {amount} million dollars.',
+                      'Officials from {org} will hold a public meeting in {place} on {weekday}.'],
+    },
+    'public_safety': {
+        'orgs': ['Seattle Police Department', 'Seattle Fire Department', 'King County Sheriff', 'Harborview Medical Center'],
+        'titles': ['{org} investigates incident in {place}', 'Fire crews respond to blaze in {place}',
+                   '{place} residents asked to avoid area after {org} response'],
+        'sentences': ['{org} responded to reports of the incident in {place} early {weekday}.',
+                      'No injuries were reported, according to {person}.',
+                      'Several streets in {place} were closed for about {amount} hours.',
+                      '"We ask everyone to stay clear of the area," said {person} of {org}.',
+                      'Investigators are still working to determine the cause.'],
+    },
+    'civic': {
+        'orgs': ['Seattle City Council', 'King County Council', 'Washington State Legislature', 'Seattle Public Schools'],
+        'titles': ['{org} votes on {place} housing plan', '{person} proposes new budget for {place}',
+                   'Debate over {place} zoning continues at {org}'],
+        'sentences': ['Members of {org} debated the proposal for {place} on {weekday}.',
+                      '{person} said the plan would add {amount} hundred homes over the next decade.',
+                      'Residents of {place} packed the meeting to share their concerns.',
+                      'A final vote by {org} is expected later this month.',
+                      'The proposal has drawn support from neighborhood groups in {place}.'],
+    },
+    'business': {
+        'orgs': ['Amazon', 'Microsoft', 'Boeing', 'Starbucks', 'Nordstrom', 'REI'],
+        'titles': ['{org} expands in {place}', '{org} to hire {amount} hundred workers in {place}',
+                   'Small businesses in {place} see change as {org} grows'],
+        'sentences': ['{org} announced plans to expand its offices in {place}.',
+                      '"The talent here is exceptional," said {person}, a spokesperson for {org}.',
+                      'The expansion is expected to bring {amount} hundred jobs to {place}.',
+                      'Local shop owners in {place} say foot traffic has already increased.',
+                      'Economists say the move reflects steady growth across the region.'],
+    },
+    'sports': {
+        'orgs': ['Seattle Seahawks', 'Seattle Mariners', 'Seattle Sounders', 'Seattle Storm', 'Seattle Kraken'],
+        'titles': ['{org} win at home in front of {place} crowd', '{person} leads {org} past rivals',
+                   '{org} fans gather in {place} ahead of big game'],
+        'sentences': ['{person} scored twice as {org} won on {weekday}.',
+                      'Fans packed bars across {place} to watch the game.',
+                      '"We played with a lot of heart tonight," said {person}.',
+                      '{org} have now won {amount} of their last ten games.',
+                      'The team returns home next week to face a division rival.'],
+    },
+    'weather': {
+        'orgs': ['National Weather Service', 'Seattle City Light', 'Puget Sound Energy', 'WSDOT'],
+        'titles': ['Storm brings heavy rain to {place}', 'Heat advisory issued for {place}',
+                   'Snow closes schools across {place}'],
+        'sentences': ['Forecasters expect conditions in {place} to continue through {weekday}.',
+                      '{org} urged residents to check on vulnerable neighbors.',
+                      'Some areas of {place} could see up to {amount} inches by morning.',
+                      '"Plan ahead and give yourself extra time," said {person}.',
+                      'Power outages were reported in parts of {place}.'],
+    },
+}
+
+# Background sentences any story may contain
+FILLER = [
+    'More details are expected to be released later this week.',
+    'The announcement drew mixed reactions on social media.',
+    'Neighbors said they had noticed changes over the past few months.',
+    'Calls to the office were not immediately returned.',
+    'This story will be updated as more information becomes available.',
+]
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Share of articles that are syndicated copies of another outlet's story
+DUPLICATE_RATE = 0.08
+
+def _zipf_choice(rng, items, exponent=1.1):
+    """Pick an item with Zipf-distributed popularity, so a few entities dominate the news"""
+    rank = min(int(rng.paretovariate(exponent)), len(items))
+    return items[rank - 1]
+
+def _people(size, seed):
+    """A pool of person names that grows with the corpus, most-mentioned first"""
+    rng = random.Random(seed)
+    names = [f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES]
+    rng.shuffle(names)
+    return names[:max(20, min(len(names), size // 50))]
+
+def generate_articles(size, seed=DEFAULT_SEED):
+    """Yield size synthetic local news articles
+
+    Articles are grouped into events of Pareto-distributed size. Each event has a
+    category, a place, an organization and a few people drawn with Zipf popularity;
+    a share of articles are syndicated near-duplicates of earlier ones. Each article
+    dict carries the ground truth in event_id and mentions.
+    """
+    rng = random.Random(seed)
+    people = _people(size, seed)
+    categories = sorted(CATEGORIES)
+    published = []
+    article_id = 0
+    event_id = 0
+
+    while article_id < size:
+        event_id += 1
+        category = rng.choice(categories)
+        templates = CATEGORIES[category]
+        event = {
+            'place': _zipf_choice(rng, PLACES),
+            'org': _zipf_choice(rng, templates['orgs']),
+            'people': [_zipf_choice(rng, people) for _ in range(rng.randint(1, 3))],
+            'date': START_DATE + timedelta(minutes=event_id * 37),
+        }
+        event_size = min(int(rng.paretovariate(1.5)) + 1, 40)
+
+        for _ in range(event_size):
+            if article_id >= size:
+                break
+            article_id += 1
+
+            if published and rng.random() < DUPLICATE_RATE:
+                # Syndicated copy: same story under another outlet's name and URL
+                original = rng.choice(published)
+                source = rng.choice([s for s in SOURCES if s != original['source']])
+                yield dict(original, url=f"https://{_slug(source)}.example.com/news/{article_id}",
+                           source=source, title=original['title'] + f" | {source}")
+                continue
+
+            fill = {
+                'place': event['place'], 'org': event['org'], 'weekday': rng.choice(WEEKDAYS),
+                'amount': rng.randint(2, 90),
+            }
+            fill['person'] = rng.choice(event['people'])
+            title = rng.choice(templates['titles']).format(**fill)
+            sentences = []
+            mentions = Counter([(event['place'], 'GPE'), (event['org'], 'ORG')])
+            for _ in range(rng.randint(6, 14)):
+                fill['person'] = rng.choice(event['people'])
+                sentence = rng.choice(templates['sentences'] if rng.random() < 0.7 else FILLER)
+                sentences.append(sentence.format(**fill))
+                if '{person}' in sentence:
+                    mentions[(fill['person'], 'PERSON')] += 1
+                if '{place}' in sentence:
+                    mentions[(event['place'], 'GPE')] += 1
+                if '{org}' in sentence:
+                    mentions[(event['org'], 'ORG')] += 1
+
+            source = rng.choice(SOURCES)
+            article = {
+                'title': title[:255],
+                'url': f"https://{_slug(source)}.example.com/news/{article_id}",
+                'source': source,
+                'author': rng.choice(people),
+                'published_date': event['date'] + timedelta(minutes=rng.randint(0, 600)),
+                'content': ' '.join(sentences),
+                'event_id': event_id,
+                'category': category,
+                'mentions': mentions,
+            }
+            published.append(article)
+            if len(published) > 1000:
+                # Syndication happens within days, so only recent stories get copied
+                published.pop(0)
+            yield article
+
+def _slug(name):
+    return ''.join(c for c in name.lower() if c.isalnum())
+
+def build_corpus_db(path, size, seed=DEFAULT_SEED, served=False, batch_size=5000):
+    """Write a synthetic corpus into a fresh database at path
+
+    With served=True the ground truth is also written as clusters, entities and
+    summaries, giving the state the web application serves after a pipeline run.
+    """
+    from sqlalchemy import insert
+    from database.models import Article, EntityMention, Cluster, Summary, STATE_DONE, setup_db
+    from database.entity_dictionary import EntityInterner
+    from database.runs import start_run, finish_run
+    from database.entity_stats import rebuild_entity_stats
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    os.environ['EVENT_DB_PATH'] = path
+    session = setup_db()
+
+    articles, mentions, events = [], [], {}
+    interner = EntityInterner()
+
+    def flush():
+        if not articles:
+            return
+        session.execute(insert(Article), articles)
+        if mentions:
+            interner.resolve(session, {mention for _, counts in mentions for mention in counts})
+            session.execute(insert(EntityMention), [
+                {'article_id': article_id, 'entity_id': entity_id, 'count': count}
+                for article_id, counts in mentions
+                for entity_id, count in interner.intern_counts(session, counts).items()
+            ])
+        session.commit()
+        articles.clear()
+        mentions.clear()
+
+    for article_id, article in enumerate(generate_articles(size, seed), start=1):
+        row = {key: article[key] for key in ('title', 'url', 'source', 'author', 'published_date', 'content')}
+        row['id'] = article_id
+        if served:
+            row['cluster_id'] = article['event_id']
+            row['ner_state'] = STATE_DONE
+            row['entity_names'] = ' '.join(entity_text for entity_text, _ in article['mentions'])
+            event = events.setdefault(article['event_id'], {'count': 0, 'topic': None, 'title': article['title']})
+            event['count'] += 1
+            event['topic'] = event['topic'] or f"{article['category']}, {article['mentions'].most_common(1)[0][0][0].lower()}"
+            mentions.append((article_id, article['mentions']))
+        articles.append(row)
+        if len(articles) >= batch_size:
+            flush()
+    flush()
+
+    if served:
+        clusters = [{'id': event_id, 'article_count': event['count'], 'topic': event['topic']}
+                    for event_id, event in events.items()]
+        summaries = [{'cluster_id': event_id, 'summary_text': f"{event['title']}. Coverage from {event['count']} articles."}
+                     for event_id, event in events.items() if event['count'] >= 2]
+        for start in range(0, len(clusters), batch_size):
+            session.execute(insert(Cluster), clusters[start:start + batch_size])
+        for start in range(0, len(summaries), batch_size):
+            session.execute(insert(Summary), summaries[start:start + batch_size])
+        session.commit()
+        rebuild_entity_stats(session)
+        finish_run(session, start_run(session))
+
+    session.close()
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic local news corpus database")
+    parser.add_argument('path', help="database file to create")
+    parser.add_argument('--size', type=int, default=1000, help="number of articles (1k to 1M)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--served', action='store_true',
+                        help="also write clusters, entities and summaries from the ground truth")
+    args = parser.parse_args()
+    build_corpus_db(args.path, args.size, args.seed, args.served)
+    print(f"Wrote {args.size} articles to {args.path}")
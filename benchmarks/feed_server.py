@@ -0,0 +1,105 @@
+import threading
+from email.utils import format_datetime
+from html import escape
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Feed entries whose summary is shorter than the scraper's 300 characters make it
+# download and parse the article page, so every other entry exercises that path
+SHORT_SUMMARY_EVERY = 2
+
+def render_feed(base_url, source, articles):
+    """Render articles as an RSS 2.0 feed linking to pages on this server"""
+    items = []
+    for index, article in enumerate(articles):
+        if index % SHORT_SUMMARY_EVERY == 0:
+            summary = article['content'][:120]
+        else:
+            summary = f"<p>{article['content']}</p>"
+        items.append(f"""
+    <item>
+      <title>{escape(article['title'])}</title>
+      <link>{base_url}/article/{index}</link>
+      <guid>{base_url}/article/{index}</guid>
+      <author>{escape(article['author'] or '')}</author>
+      <pubDate>{format_datetime(article['published_date'])}</pubDate>
+      <category>News</category>
+      <description>{escape(summary)}</description>
+    </item>""")
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0">
+  <channel>
+    <title>{escape(source)}</title>
+    <link>{base_url}/</link>
+    <description>Synthetic local news</description>{''.join(items)}
+  </channel>
+</rss>"""
+
+def render_article_page(article):
+    """Render an article as a news page the way publishers mark them up"""
+    paragraphs = ''.join(f"<p>{escape(sentence.strip())}.</p>\n" for sentence in article['content'].split('.') if sentence.strip())
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+  <title>{escape(article['title'])}</title>
+  <meta property="og:title" content="{escape(article['title'])}">
+  <meta name="author" content="{escape(article['author'] or '')}">
+  <meta property="article:published_time" content="{article['published_date'].isoformat()}">
+</head>
+<body>
+  <header><nav><a href="/">Home</a> <a href="/news">News</a></nav></header>
+  <article>
+    <h1>{escape(article['title'])}</h1>
+    <div class="byline">By {escape(article['author'] or 'Staff')}</div>
+    <div class="article-body">
+{paragraphs}    </div>
+  </article>
+  <footer>Copyright Synthetic News</footer>
+</body>
+</html>"""
+
+class FeedServer:
+    """A local stand-in for a news site: one RSS feed and the article pages it links to"""
+
+    def __init__(self, articles, source='Synthetic News'):
+        self.articles = list(articles)
+        self.source = source
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/feed.xml':
+                    body, content_type = render_feed(server.url, server.source, server.articles), 'application/rss+xml'
+                elif self.path.startswith('/article/'):
+                    try:
+                        article = server.articles[int(self.path.rsplit('/', 1)[1])]
+                    except (ValueError, IndexError):
+                        self.send_error(404)
+                        return
+                    body, content_type = render_article_page(article), 'text/html'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.feed_url = f"{self.url}/feed.xml"
+        self.thread = None
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
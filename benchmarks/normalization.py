@@ -0,0 +1,79 @@
+import sys
+import os
+import time
+import argparse
+from sklearn.cluster import KMeans
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics import adjusted_rand_score
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.corpus import DEFAULT_SEED, generate_articles
+from processing import preprocess
+from processing.fast_normalize import FastNormalizer
+
+# Compares the two preprocessing normalizers on a synthetic corpus: how long each
+# takes, and how well TF-IDF + KMeans recovers the corpus's events from its output
+
+def load_spacy():
+    """Load the spaCy model for the spaCy path; returns False if spaCy or its model is missing"""
+    try:
+        start = time.perf_counter()
+        preprocess.get_nlp()
+    except (ImportError, OSError) as e:
+        print(f"Skipping the spaCy normalizer: {e}")
+        return False
+    # Not counted in the spaCy timing below, which covers normalization only
+    print(f"Loaded the spaCy model in {time.perf_counter() - start:.2f}s")
+    return True
+
+def time_normalizer(normalize, texts, chunk_size):
+    """Normalize texts chunk by chunk as the preprocess stage does; returns (normalized texts, seconds)"""
+    start = time.perf_counter()
+    normalized = []
+    for offset in range(0, len(texts), chunk_size):
+        normalized.extend(normalize(texts[offset:offset + chunk_size]))
+    return normalized, time.perf_counter() - start
+
+def cluster_labels(normalized, n_clusters, seed):
+    """Cluster normalized texts the way processing.cluster does in TF-IDF mode"""
+    embeddings = TfidfVectorizer(max_features=5000).fit_transform(normalized)
+    return KMeans(n_clusters=n_clusters, random_state=seed).fit_predict(embeddings)
+
+def compare_normalizers(size, seed=DEFAULT_SEED, chunk_size=500, stop_words=None):
+    """Time both normalizers and score their clusterings against the corpus's events
+
+    Returns {'timings': {name: seconds}, 'ari': {name: adjusted Rand index}}, with
+    'spacy/fast' in ari giving the agreement between the two clusterings.
+    """
+    articles = list(generate_articles(size, seed))
+    texts = [f"{article['title']} {article['content']}" for article in articles]
+    events = [article['event_id'] for article in articles]
+    n_clusters = len(set(events))
+    print(f"{size} articles in {n_clusters} events")
+
+    normalizers = {'fast': FastNormalizer(stop_words or preprocess.stop_words).normalize_batch}
+    if load_spacy():
+        normalizers['spacy'] = lambda batch: [preprocess.preprocess_text(text) for text in batch]
+
+    timings, labels, ari = {}, {}, {}
+    for name, normalize in normalizers.items():
+        normalized, timings[name] = time_normalizer(normalize, texts, chunk_size)
+        labels[name] = cluster_labels(normalized, n_clusters, seed)
+        ari[name] = adjusted_rand_score(events, labels[name])
+
+    print(f"\n{'normalizer':<12} {'seconds':>8} {'articles/s':>11} {'ARI vs events':>14}")
+    for name in timings:
+        print(f"{name:<12} {timings[name]:>7.2f}s {size / timings[name]:>11.0f} {ari[name]:>14.3f}")
+    if 'spacy' in labels:
+        ari['spacy/fast'] = adjusted_rand_score(labels['spacy'], labels['fast'])
+        print(f"\nSpeedup {timings['spacy'] / timings['fast']:.1f}x, "
+              f"clusterings agree at ARI {ari['spacy/fast']:.3f}")
+    return {'timings': timings, 'ari': ari}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the spaCy and fast normalizers on a synthetic corpus")
+    parser.add_argument('--size', type=int, default=2000, help="articles in the synthetic corpus")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--chunk-size', type=int, default=500, help="articles normalized per batch")
+    args = parser.parse_args()
+    compare_normalizers(args.size, args.seed, args.chunk_size)
@@ -0,0 +1,309 @@
+import sys
+import os
+import zlib
+import sqlite3
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.models import Article, ArchivedArticle, Cluster, Entity, EntityMention, Summary, setup_db
+from database.chunks import iter_chunks
+from database.entity_stats import ensure_entity_stats, record_article_removals
+from monitoring.metrics import STAGE_ITEMS
+from regions.config import region_path
+
+DEFAULT_ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'archive')
+
+# Articles published longer ago than this are archived by the pipeline; unset keeps everything live
+RETENTION_DAYS = int(os.environ['EVENT_RETENTION_DAYS']) if os.environ.get('EVENT_RETENTION_DAYS') else None
+
+# Pages returned to the OS per incremental vacuum step; each step is a short write transaction
+VACUUM_STEP_PAGES = 2000
+
+# Archive files hold one month of articles each. The bulky text columns are stored
+# zlib-compressed; everything needed to find an article stays plain.
+ARCHIVE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS articles (
+        id INTEGER PRIMARY KEY, title TEXT NOT NULL, url TEXT NOT NULL UNIQUE, source TEXT NOT NULL,
+        author TEXT, published_date TEXT, cluster_id INTEGER,
+        content BLOB, processed_content BLOB, embedding BLOB, archived_at TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS entities (
+        id INTEGER PRIMARY KEY, article_id INTEGER NOT NULL, text TEXT NOT NULL, label TEXT NOT NULL, count INTEGER
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_entities_article_id ON entities (article_id)",
+    """CREATE TABLE IF NOT EXISTS summaries (
+        id INTEGER PRIMARY KEY, cluster_id INTEGER NOT NULL, topic TEXT, summary_text TEXT NOT NULL,
+        created_date TEXT, archived_at TEXT
+    )""",
+]
+
+COMPRESSED_COLUMNS = ('content', 'processed_content', 'embedding')
+
+def _compress(value):
+    return None if value is None else sqlite3.Binary(zlib.compress(value.encode('utf-8')))
+
+def _decompress(value):
+    return None if value is None else zlib.decompress(value).decode('utf-8')
+
+def get_archive_dir():
+    """Get the current region's archive directory; EVENT_ARCHIVE_DIR overrides it"""
+    return os.environ.get('EVENT_ARCHIVE_DIR') or region_path(DEFAULT_ARCHIVE_DIR, 'archive')
+
+def archive_file_for(published_date):
+    """Name of the archive file holding articles published in the given month"""
+    return f"articles_{published_date:%Y_%m}.db"
+
+def open_archive(filename, read_only=False):
+    """Open (creating if needed) an archive database in the archive directory
+
+    With read_only=True a missing archive is not created; None is returned instead.
+    """
+    archive_dir = get_archive_dir()
+    if read_only:
+        path = os.path.join(archive_dir, filename)
+        if not os.path.exists(path):
+            return None
+        return sqlite3.connect(f'file:{os.path.abspath(path)}?mode=ro', uri=True)
+    os.makedirs(archive_dir, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(archive_dir, filename))
+    for statement in ARCHIVE_SCHEMA:
+        conn.execute(statement)
+    return conn
+
+def _write_articles(filename, articles, entities, now):
+    """Copy articles and their entities into an archive file; safe to repeat after a crash"""
+    conn = open_archive(filename)
+    try:
+        conn.executemany(
+            """INSERT OR REPLACE INTO articles (id, title, url, source, author, published_date, cluster_id,
+                                               content, processed_content, embedding, archived_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            [(a.id, a.title, a.url, a.source, a.author, a.published_date.isoformat(sep=' '), a.cluster_id,
+              *(_compress(getattr(a, column)) for column in COMPRESSED_COLUMNS), now)
+             for a in articles]
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO entities (id, article_id, text, label, count) VALUES (?, ?, ?, ?, ?)",
+            [(e.id, e.article_id, e.text, e.label, e.count) for e in entities]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def archive_articles(session, cutoff, chunk_size=None):
+    """Move articles published before cutoff, with their entities, into the archive files
+
+    Each chunk is written to its archive file before it is deleted from the live
+    database, and the live side commits once per chunk, so an interrupted run
+    loses nothing and simply continues on the next call. Returns the number of
+    articles archived.
+    """
+    ensure_entity_stats(session)
+    old = session.query(Article.id).filter(Article.published_date < cutoff)
+    archived = 0
+    for chunk in iter_chunks(old, Article.id, chunk_size):
+        article_ids = [article_id for article_id, in chunk]
+        articles = session.query(
+            Article.id, Article.title, Article.url, Article.source, Article.author, Article.published_date,
+            Article.cluster_id, Article.content, Article.processed_content, Article.embedding
+        ).filter(Article.id.in_(article_ids)).all()
+        # Archive files are self-contained, so mentions are stored with their entity's name
+        entities = session.query(
+            EntityMention.id, EntityMention.article_id, Entity.text, Entity.label, EntityMention.count
+        ).join(
+            Entity, Entity.id == EntityMention.entity_id
+        ).filter(EntityMention.article_id.in_(article_ids)).all()
+
+        now = datetime.now()
+        files = defaultdict(list)
+        for article in articles:
+            files[archive_file_for(article.published_date)].append(article)
+        for filename, file_articles in files.items():
+            ids = {article.id for article in file_articles}
+            _write_articles(filename, file_articles, [e for e in entities if e.article_id in ids], now.isoformat(sep=' '))
+
+        session.bulk_insert_mappings(ArchivedArticle, [{
+            'article_id': article.id,
+            'url': article.url,
+            'title': article.title,
+            'source': article.source,
+            'published_date': article.published_date,
+            'archive_file': archive_file_for(article.published_date),
+            'archived_at': now
+        } for article in articles])
+        # The change log and full-text triggers record the deletions
+        record_article_removals(session, article_ids)
+        session.query(EntityMention).filter(EntityMention.article_id.in_(article_ids)).delete(synchronize_session=False)
+        session.query(Article).filter(Article.id.in_(article_ids)).delete(synchronize_session=False)
+        session.commit()
+        archived += len(articles)
+        print(f"Archived {archived} articles")
+    return archived
+
+def archive_orphan_clusters(session):
+    """Move clusters without any live articles left, and their summaries, into the archive
+
+    Their summaries go to the archive file of the month they were written in.
+    Returns the number of clusters archived.
+    """
+    orphans = session.query(Cluster).filter(
+        ~session.query(Article.id).filter(Article.cluster_id == Cluster.id).exists()
+    ).all()
+    if not orphans:
+        return 0
+
+    cluster_ids = [cluster.id for cluster in orphans]
+    topics = {cluster.id: cluster.topic for cluster in orphans}
+    summaries = session.query(Summary).filter(Summary.cluster_id.in_(cluster_ids)).all()
+    now = datetime.now().isoformat(sep=' ')
+    files = defaultdict(list)
+    for summary in summaries:
+        files[archive_file_for(summary.created_date or datetime.now())].append(summary)
+    for filename, file_summaries in files.items():
+        conn = open_archive(filename)
+        try:
+            conn.executemany(
+                """INSERT OR REPLACE INTO summaries (id, cluster_id, topic, summary_text, created_date, archived_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                [(s.id, s.cluster_id, topics[s.cluster_id], s.summary_text,
+                  s.created_date.isoformat(sep=' ') if s.created_date else None, now)
+                 for s in file_summaries]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    session.query(Summary).filter(Summary.cluster_id.in_(cluster_ids)).delete(synchronize_session=False)
+    session.query(Cluster).filter(Cluster.id.in_(cluster_ids)).delete(synchronize_session=False)
+    session.commit()
+    return len(cluster_ids)
+
+def compact_database(session, step_pages=VACUUM_STEP_PAGES):
+    """Return the live database's free pages to the OS while it stays in use
+
+    Frees pages in small incremental vacuum steps, each its own short write
+    transaction, then truncates the WAL. Databases created before incremental
+    auto-vacuum was enabled need a one-time conversion (convert_database).
+    """
+    if session.execute(text("PRAGMA auto_vacuum")).scalar() != 2:
+        print("Compaction needs incremental auto-vacuum; run 'python database/archive.py --convert' once")
+        return 0
+    session.commit()
+    freed = session.execute(text("PRAGMA freelist_count")).scalar()
+    # Python's execute() steps a pragma only once, freeing a single page; executescript
+    # runs each step to completion
+    dbapi_connection = session.connection().connection
+    while session.execute(text("PRAGMA freelist_count")).scalar():
+        dbapi_connection.executescript(f"PRAGMA incremental_vacuum({step_pages});")
+    session.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    session.commit()
+    page_size = session.execute(text("PRAGMA page_size")).scalar()
+    print(f"Compacted database: freed {freed * page_size / 1024 / 1024:.1f} MiB")
+    return freed
+
+def convert_database(session):
+    """Enable incremental auto-vacuum on an existing database; rewrites the file once with VACUUM"""
+    session.commit()
+    connection = session.connection()
+    connection.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+    connection.exec_driver_sql("VACUUM")
+    session.commit()
+    print("Enabled incremental auto-vacuum")
+
+def run_archive(days=None, chunk_size=None):
+    """Archive articles older than the retention window, then compact the live database"""
+    days = days or RETENTION_DAYS
+    if not days:
+        print("No retention window set (EVENT_RETENTION_DAYS), nothing to archive")
+        return 0
+    session = setup_db()
+    try:
+        cutoff = datetime.now() - timedelta(days=days)
+        archived = archive_articles(session, cutoff, chunk_size)
+        clusters = archive_orphan_clusters(session)
+        if archived or clusters:
+            compact_database(session)
+        STAGE_ITEMS.inc(archived, stage='archive')
+        print(f"Archived {archived} articles and {clusters} clusters older than {days} days")
+        return archived
+    finally:
+        session.close()
+
+def is_archived_url(session, url):
+    """Whether an article with this URL has already been archived"""
+    return session.query(ArchivedArticle.id).filter_by(url=url).first() is not None
+
+def get_archived_article(session, article_id):
+    """Load an archived article with its entities as a dict, or None if it isn't archived
+
+    A missing archive file also gives None; reading never creates one.
+    """
+    entry = session.query(ArchivedArticle).filter_by(article_id=article_id).order_by(ArchivedArticle.id.desc()).first()
+    if not entry:
+        return None
+    conn = open_archive(entry.archive_file, read_only=True)
+    if conn is None:
+        return None
+    conn.row_factory = sqlite3.Row
+    try:
+        row = conn.execute("SELECT * FROM articles WHERE url = ?", (entry.url,)).fetchone()
+        if row is None:
+            return None
+        article = dict(row)
+        for column in COMPRESSED_COLUMNS:
+            article[column] = _decompress(article[column])
+        article['entities'] = [dict(e) for e in conn.execute(
+            "SELECT text, label, count FROM entities WHERE article_id = ? ORDER BY count DESC", (row['id'],)
+        )]
+        return article
+    finally:
+        conn.close()
+
+def search_archived_titles(session, term, limit=20, include_archive=True):
+    """Find live and, optionally, archived articles whose title contains term, newest first
+
+    Returns (id, title, url, source, published_date, archived) tuples.
+    """
+    pattern = f"%{term}%"
+    live = session.query(
+        Article.id, Article.title, Article.url, Article.source, Article.published_date
+    ).filter(Article.title.like(pattern)).order_by(Article.published_date.desc()).limit(limit).all()
+    results = [(*row, False) for row in live]
+    if include_archive:
+        archived = session.query(
+            ArchivedArticle.article_id, ArchivedArticle.title, ArchivedArticle.url,
+            ArchivedArticle.source, ArchivedArticle.published_date
+        ).filter(ArchivedArticle.title.like(pattern)).order_by(ArchivedArticle.published_date.desc()).limit(limit).all()
+        results.extend((*row, True) for row in archived)
+    results.sort(key=lambda row: row[4] or datetime.min, reverse=True)
+    return results[:limit]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old articles out of the live database and compact it")
+    parser.add_argument('--days', type=int, default=RETENTION_DAYS,
+                        help="archive articles published more than this many days ago (default EVENT_RETENTION_DAYS)")
+    parser.add_argument('--compact', action='store_true',
+                        help="only compact the live database")
+    parser.add_argument('--convert', action='store_true',
+                        help="enable incremental auto-vacuum on an existing database (rewrites it once)")
+    parser.add_argument('--search', metavar='TERM',
+                        help="list live and archived articles whose title contains TERM")
+    args = parser.parse_args()
+
+    if args.search:
+        session = setup_db()
+        for article_id, title, url, source, published_date, archived in search_archived_titles(session, args.search):
+            date = published_date.strftime('%Y-%m-%d') if published_date else '----------'
+            print(f"{date} {'archived' if archived else 'live    '} {source}: {title} ({url})")
+        session.close()
+    elif args.convert or args.compact:
+        session = setup_db()
+        if args.convert:
+            convert_database(session)
+        compact_database(session)
+        session.close()
+    else:
+        run_archive(args.days)
@@ -0,0 +1,109 @@
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+# Local time, matching the datetime.now() defaults used by the models
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+
+def _trigger(name, event, condition, kind, entity_id, payload):
+    when = f"WHEN {condition} " if condition else ""
+    return f"""CREATE TRIGGER IF NOT EXISTS {name} {event} {when}BEGIN
+        INSERT INTO change_log (kind, entity_id, payload, created_at)
+        VALUES ('{kind}', {entity_id}, json_object({payload}), {NOW});
+    END"""
+
+# Every change the web tier can show is recorded by a trigger, so the log stays
+# complete no matter which stage (or manual script) made the change
+TRIGGERS = [
+    _trigger('change_log_article_added', 'AFTER INSERT ON articles', None,
+             'article_added', 'new.id',
+             "'title', new.title, 'source', new.source, 'url', new.url, "
+             "'published_date', new.published_date, 'cluster_id', new.cluster_id"),
+    _trigger('change_log_article_moved', 'AFTER UPDATE OF cluster_id ON articles',
+             'old.cluster_id IS NOT new.cluster_id',
+             'article_moved', 'new.id',
+             "'from_cluster_id', old.cluster_id, 'to_cluster_id', new.cluster_id"),
+    _trigger('change_log_article_removed', 'AFTER DELETE ON articles', None,
+             'article_removed', 'old.id',
+             "'cluster_id', old.cluster_id"),
+    _trigger('change_log_cluster_added', 'AFTER INSERT ON clusters', None,
+             'cluster_added', 'new.id',
+             "'topic', new.topic, 'article_count', new.article_count"),
+    _trigger('change_log_cluster_resized', 'AFTER UPDATE OF article_count ON clusters',
+             'old.article_count IS NOT new.article_count',
+             'cluster_resized', 'new.id',
+             "'article_count', new.article_count"),
+    _trigger('change_log_topic_changed', 'AFTER UPDATE OF topic ON clusters',
+             'old.topic IS NOT new.topic',
+             'topic_changed', 'new.id',
+             "'topic', new.topic"),
+    _trigger('change_log_cluster_removed', 'AFTER DELETE ON clusters', None,
+             'cluster_removed', 'old.id', "'topic', old.topic"),
+    _trigger('change_log_summary_added', 'AFTER INSERT ON summaries', None,
+             'summary_updated', 'new.cluster_id',
+             "'summary_id', new.id, 'summary_text', new.summary_text"),
+    _trigger('change_log_summary_updated', 'AFTER UPDATE OF summary_text ON summaries',
+             'old.summary_text IS NOT new.summary_text',
+             'summary_updated', 'new.cluster_id',
+             "'summary_id', new.id, 'summary_text', new.summary_text"),
+    _trigger('change_log_summary_removed', 'AFTER DELETE ON summaries', None,
+             'summary_removed', 'old.cluster_id', "'summary_id', old.id"),
+]
+
+def ensure_change_triggers(engine):
+    """Create the triggers that fill the change log"""
+    with engine.begin() as conn:
+        for statement in TRIGGERS:
+            conn.execute(text(statement))
+
+def get_changes(session, since=0, limit=500):
+    """Get changes with a version greater than since, oldest first"""
+    rows = session.execute(text("""
+        SELECT version, kind, entity_id, payload, created_at
+        FROM change_log
+        WHERE version > :since
+        ORDER BY version
+        LIMIT :limit
+    """), {'since': since, 'limit': limit}).fetchall()
+
+    return [{
+        'version': row.version,
+        'kind': row.kind,
+        'id': row.entity_id,
+        'data': json.loads(row.payload) if row.payload else {},
+        'created_at': row.created_at
+    } for row in rows]
+
+def get_version_range(session):
+    """Get the oldest retained and the latest change version (0, 0 when the log is empty)"""
+    row = session.execute(text("SELECT MIN(version), MAX(version) FROM change_log")).first()
+    return (row[0] or 0, row[1] or 0)
+
+def get_latest_version(session):
+    """Get the latest change version ever assigned, even if the log has since been pruned"""
+    version = session.execute(text(
+        "SELECT seq FROM sqlite_sequence WHERE name = 'change_log'"
+    )).scalar()
+    return version or 0
+
+def has_changes(session, since, kinds=None):
+    """Whether any change (of the given kinds) has a version greater than since
+
+    Changes pruned from the log count as present, since nothing can be said about them.
+    """
+    oldest, latest = get_version_range(session)
+    if since < get_latest_version(session) and (latest == 0 or oldest > since + 1):
+        return True
+    query = "SELECT 1 FROM change_log WHERE version > :since"
+    params = {'since': since}
+    if kinds:
+        names = [f':kind{i}' for i in range(len(kinds))]
+        query += f" AND kind IN ({', '.join(names)})"
+        params.update({f'kind{i}': kind for i, kind in enumerate(kinds)})
+    return session.execute(text(query + " LIMIT 1"), params).first() is not None
+
+def prune_change_log(session, max_age_days=30):
+    """Delete changes older than max_age_days; clients further behind must resync"""
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).strftime('%Y-%m-%d %H:%M:%S')
+    result = session.execute(text("DELETE FROM change_log WHERE created_at < :cutoff"), {'cutoff': cutoff})
+    return result.rowcount
@@ -0,0 +1,38 @@
+import os
+
+# Rows loaded per chunk by the pipeline stages; EVENT_CHUNK_SIZE overrides it, so a stage's
+# memory use can be bounded independently of the database size
+DEFAULT_CHUNK_SIZE = 500
+
+def get_chunk_size():
+    """Get the number of rows the processing stages load at a time"""
+    value = os.environ.get('EVENT_CHUNK_SIZE')
+    return max(1, int(value)) if value else DEFAULT_CHUNK_SIZE
+
+def set_chunk_size(chunk_size):
+    """Set the chunk size for this process and the worker processes it starts"""
+    os.environ['EVENT_CHUNK_SIZE'] = str(chunk_size)
+
+def iter_chunks(query, key, chunk_size=None):
+    """Yield the rows of query in lists of at most chunk_size rows, in key order
+
+    Pages with WHERE key > last instead of OFFSET, so every chunk is an index range
+    scan and rows updated by the caller between chunks are never revisited or skipped.
+    The key column must be the first column the query selects.
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    last = None
+    while True:
+        page = query if last is None else query.filter(key > last)
+        rows = page.order_by(key).limit(chunk_size).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1][0]
+
+def iter_rows(query, key, chunk_size=None):
+    """Yield the rows of query one at a time, loading chunk_size rows at a time"""
+    for rows in iter_chunks(query, key, chunk_size):
+        yield from rows
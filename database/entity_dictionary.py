@@ -0,0 +1,111 @@
+import re
+from sqlalchemy import inspect, text
+
+# Keep IN (...) lists well below SQLite's bound parameter limit
+BATCH_SIZE = 500
+
+# Surface variations that name the same entity: case, curly quotes, a leading
+# article, a trailing possessive, surrounding punctuation and runs of whitespace
+QUOTES = str.maketrans({'’': "'", '‘': "'", '“': '"', '”': '"'})
+LEADING_ARTICLE = re.compile(r"^the\s+")
+POSSESSIVE = re.compile(r"'s$")
+EDGE_PUNCTUATION = '\'"()[]{}.,;:!?-'
+
+def entity_key(entity_text):
+    """Alias key of an entity name: 'The Seattle Times', "seattle times'" and 'SEATTLE TIMES' share one"""
+    key = ' '.join(entity_text.translate(QUOTES).casefold().split())
+    key = key.strip(EDGE_PUNCTUATION)
+    key = POSSESSIVE.sub('', key)
+    key = LEADING_ARTICLE.sub('', key)
+    return key.strip(EDGE_PUNCTUATION)
+
+class EntityInterner:
+    """Resolves entity mentions to entity dictionary ids, adding new entities as they are first seen
+
+    Ids are cached for the interner's lifetime, so each distinct entity is
+    looked up (or inserted) once per run. The first surface form seen for an
+    alias key becomes the entity's canonical text.
+    """
+
+    def __init__(self):
+        self.ids = {}
+
+    def resolve(self, session, mentions):
+        """Map (text, label) mentions to entity ids; mentions without a usable name map to None"""
+        keys = {(entity_text, label): (entity_key(entity_text), label) for entity_text, label in mentions}
+        missing = {}
+        for (entity_text, label), key in keys.items():
+            if key[0] and key not in self.ids:
+                missing.setdefault(key, entity_text)
+
+        missing_keys = list(missing)
+        for start in range(0, len(missing_keys), BATCH_SIZE):
+            batch = missing_keys[start:start + BATCH_SIZE]
+            session.execute(
+                text("INSERT INTO entities (key, label, text) VALUES (:key, :label, :text) "
+                     "ON CONFLICT (key, label) DO NOTHING"),
+                [{'key': key, 'label': label, 'text': missing[(key, label)]} for key, label in batch]
+            )
+            params = {f'k{i}': key for i, (key, _) in enumerate(batch)}
+            rows = session.execute(
+                text(f"SELECT id, key, label FROM entities WHERE key IN ({', '.join(':' + name for name in params)})"),
+                params
+            )
+            for entity_id, key, label in rows:
+                self.ids[(key, label)] = entity_id
+
+        return {mention: self.ids.get(key) for mention, key in keys.items()}
+
+    def intern_counts(self, session, entity_counts):
+        """Turn counts keyed by (text, label) into counts keyed by entity id, merging aliases"""
+        ids = self.resolve(session, entity_counts)
+        counts = {}
+        for mention, count in entity_counts.items():
+            entity_id = ids[mention]
+            if entity_id is not None:
+                counts[entity_id] = counts.get(entity_id, 0) + count
+        return counts
+
+def migrate_legacy_entities(engine, tables):
+    """Convert a per-article entities table (text and label repeated on every row) into the
+    entity dictionary plus mentions, before the new tables are created
+
+    tables are the Table objects of the dictionary and the mentions. The
+    entity statistics, keyed by text until now, are dropped and rebuilt
+    from the mentions by database.entity_stats on first use.
+    """
+    inspector = inspect(engine)
+    table_names = inspector.get_table_names()
+    with engine.begin() as conn:
+        if 'cluster_entity_stats' in table_names and 'text' in {
+            column['name'] for column in inspector.get_columns('cluster_entity_stats')
+        }:
+            conn.execute(text("DROP TABLE cluster_entity_stats"))
+
+        if 'entities' not in table_names or 'article_id' not in {
+            column['name'] for column in inspector.get_columns('entities')
+        }:
+            return False
+
+        print("Moving entities into the entity dictionary...")
+        conn.connection.create_function('entity_key', 1, entity_key, deterministic=True)
+        conn.execute(text("ALTER TABLE entities RENAME TO legacy_entities"))
+        for table in tables:
+            table.create(conn)
+        # The most mentioned surface form of each alias key becomes the canonical name
+        conn.execute(text(
+            """INSERT INTO entities (key, label, text)
+               SELECT key, label, text FROM (
+                   SELECT entity_key(text) AS key, label, text,
+                          ROW_NUMBER() OVER (PARTITION BY entity_key(text), label ORDER BY SUM(count) DESC, text) AS rank
+                   FROM legacy_entities GROUP BY entity_key(text), label, text
+               ) WHERE rank = 1 AND key != ''"""
+        ))
+        conn.execute(text(
+            """INSERT INTO entity_mentions (article_id, entity_id, count)
+               SELECT l.article_id, e.id, SUM(l.count) FROM legacy_entities l
+               JOIN entities e ON e.key = entity_key(l.text) AND e.label = l.label
+               GROUP BY l.article_id, e.id"""
+        ))
+        conn.execute(text("DROP TABLE legacy_entities"))
+    return True
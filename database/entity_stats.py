@@ -0,0 +1,170 @@
+import sys
+import os
+from collections import defaultdict
+from sqlalchemy import func, literal
+from sqlalchemy.dialects.sqlite import insert
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.models import Article, Entity, EntityMention, ClusterEntityStat, setup_db
+
+# Pseudo cluster id holding the corpus-wide entity totals
+GLOBAL_CLUSTER_ID = -1
+
+# Keep IN (...) lists well below SQLite's bound parameter limit
+BATCH_SIZE = 500
+
+def _apply_deltas(session, deltas):
+    """Add (total_count, article_count) deltas keyed by (cluster_id, entity_id) to the stats table"""
+    rows = [
+        {
+            'cluster_id': cluster_id,
+            'entity_id': entity_id,
+            'total_count': total_delta,
+            'article_count': article_delta
+        }
+        for (cluster_id, entity_id), (total_delta, article_delta) in deltas.items()
+        if total_delta or article_delta
+    ]
+    if not rows:
+        return
+
+    stmt = insert(ClusterEntityStat)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['cluster_id', 'entity_id'],
+        set_={
+            'total_count': ClusterEntityStat.total_count + stmt.excluded.total_count,
+            'article_count': ClusterEntityStat.article_count + stmt.excluded.article_count
+        }
+    )
+    session.execute(stmt, rows)
+
+    # Entities that no longer appear in a cluster drop out of the table
+    shrunk_clusters = {row['cluster_id'] for row in rows if row['article_count'] < 0}
+    if shrunk_clusters:
+        session.query(ClusterEntityStat).filter(
+            ClusterEntityStat.cluster_id.in_(shrunk_clusters),
+            ClusterEntityStat.article_count <= 0
+        ).delete(synchronize_session=False)
+
+def _add_delta(deltas, cluster_id, entity_id, count, sign):
+    total_delta, article_delta = deltas[(cluster_id, entity_id)]
+    deltas[(cluster_id, entity_id)] = (total_delta + sign * count, article_delta + sign)
+
+def record_article_entities(session, cluster_id, entity_counts):
+    """Add the entities extracted from one article to its cluster and to the global totals
+
+    entity_counts maps entity ids to the number of mentions in the article.
+    """
+    deltas = defaultdict(lambda: (0, 0))
+    for entity_id, count in entity_counts.items():
+        _add_delta(deltas, GLOBAL_CLUSTER_ID, entity_id, count, 1)
+        if cluster_id is not None:
+            _add_delta(deltas, cluster_id, entity_id, count, 1)
+    _apply_deltas(session, deltas)
+
+def record_cluster_moves(session, moves):
+    """Move entity totals for articles that changed cluster
+
+    moves maps article_id to an (old_cluster_id, new_cluster_id) pair.
+    """
+    if not moves:
+        return
+
+    deltas = defaultdict(lambda: (0, 0))
+    article_ids = list(moves)
+    for start in range(0, len(article_ids), BATCH_SIZE):
+        batch = article_ids[start:start + BATCH_SIZE]
+        rows = session.query(
+            EntityMention.article_id, EntityMention.entity_id, EntityMention.count
+        ).filter(
+            EntityMention.article_id.in_(batch)
+        ).all()
+
+        for row in rows:
+            old_cluster_id, new_cluster_id = moves[row.article_id]
+            if old_cluster_id is not None:
+                _add_delta(deltas, old_cluster_id, row.entity_id, row.count, -1)
+            if new_cluster_id is not None:
+                _add_delta(deltas, new_cluster_id, row.entity_id, row.count, 1)
+
+    _apply_deltas(session, deltas)
+
+def record_article_removals(session, article_ids):
+    """Take the entities of articles about to be deleted out of their clusters and the global totals"""
+    deltas = defaultdict(lambda: (0, 0))
+    article_ids = list(article_ids)
+    for start in range(0, len(article_ids), BATCH_SIZE):
+        batch = article_ids[start:start + BATCH_SIZE]
+        rows = session.query(
+            Article.cluster_id, EntityMention.entity_id, EntityMention.count
+        ).join(
+            Article, Article.id == EntityMention.article_id
+        ).filter(
+            EntityMention.article_id.in_(batch)
+        ).all()
+
+        for row in rows:
+            _add_delta(deltas, GLOBAL_CLUSTER_ID, row.entity_id, row.count, -1)
+            if row.cluster_id is not None:
+                _add_delta(deltas, row.cluster_id, row.entity_id, row.count, -1)
+
+    _apply_deltas(session, deltas)
+
+def rebuild_entity_stats(session):
+    """Recompute the whole stats table from the entity mentions"""
+    session.query(ClusterEntityStat).delete(synchronize_session=False)
+
+    session.execute(
+        insert(ClusterEntityStat).from_select(
+            ['cluster_id', 'entity_id', 'total_count', 'article_count'],
+            session.query(
+                Article.cluster_id, EntityMention.entity_id,
+                func.sum(EntityMention.count), func.count(EntityMention.id)
+            ).join(
+                Article, Article.id == EntityMention.article_id
+            ).filter(
+                Article.cluster_id.isnot(None)
+            ).group_by(
+                Article.cluster_id, EntityMention.entity_id
+            )
+        )
+    )
+    session.execute(
+        insert(ClusterEntityStat).from_select(
+            ['cluster_id', 'entity_id', 'total_count', 'article_count'],
+            session.query(
+                literal(GLOBAL_CLUSTER_ID), EntityMention.entity_id,
+                func.sum(EntityMention.count), func.count(EntityMention.id)
+            ).group_by(
+                EntityMention.entity_id
+            )
+        )
+    )
+
+def ensure_entity_stats(session):
+    """Backfill the stats table for databases created before it existed"""
+    has_stats = session.query(ClusterEntityStat.id).first() is not None
+    has_entities = session.query(EntityMention.id).first() is not None
+    if has_entities and not has_stats:
+        print("Building cluster entity statistics...")
+        rebuild_entity_stats(session)
+        session.commit()
+
+def top_entities(session, cluster_id=GLOBAL_CLUSTER_ID, limit=10):
+    """Get the most mentioned entities for a cluster, or globally by default"""
+    return session.query(
+        ClusterEntityStat.entity_id, Entity.text, Entity.label, ClusterEntityStat.total_count
+    ).join(
+        Entity, Entity.id == ClusterEntityStat.entity_id
+    ).filter(
+        ClusterEntityStat.cluster_id == cluster_id
+    ).order_by(
+        ClusterEntityStat.total_count.desc()
+    ).limit(limit).all()
+
+if __name__ == "__main__":
+    session = setup_db()
+    rebuild_entity_stats(session)
+    session.commit()
+    session.close()
+    print("Cluster entity statistics rebuilt!")
@@ -1,3 +1,3 @@
-from database.setup_db import Article, Entity, Cluster, Summary, setup_db
+from database.setup_db import Article, Entity, EntityMention, Cluster, ClusterEntityStat, ClusterLineage, Summary, PipelineRun, PipelineJob, ChangeLogEntry, StageWatermark, ArchivedArticle, STATE_DONE, STATE_FAILED, setup_db
 
 # This file serves as an import point for models
\ No newline at end of file
@@ -0,0 +1,43 @@
+import sys
+import os
+import json
+from datetime import datetime
+from sqlalchemy import func
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.models import PipelineRun, setup_db
+
+def start_run(session):
+    """Record the start of a pipeline run and return its id"""
+    run = PipelineRun(started_at=datetime.now(), status='running')
+    session.add(run)
+    session.commit()
+    return run.id
+
+def finish_run(session, run_id, status='completed', metrics=None):
+    """Mark a pipeline run as finished, storing its metrics summary if given"""
+    run = session.query(PipelineRun).get(run_id)
+    if run:
+        run.finished_at = datetime.now()
+        run.status = status
+        if metrics is not None:
+            run.metrics = json.dumps(metrics)
+        session.commit()
+
+def get_latest_run(session):
+    """Get the latest completed pipeline run, or None if none has completed"""
+    return session.query(PipelineRun).filter(
+        PipelineRun.status == 'completed'
+    ).order_by(PipelineRun.id.desc()).first()
+
+def get_data_version(session):
+    """Get the id of the latest completed pipeline run, or 0 if none has completed"""
+    version = session.query(func.max(PipelineRun.id)).filter(
+        PipelineRun.status == 'completed'
+    ).scalar()
+    return version or 0
+
+if __name__ == "__main__":
+    session = setup_db()
+    print(f"Current data version: {get_data_version(session)}")
+    session.close()
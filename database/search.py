@@ -0,0 +1,147 @@
+import re
+from sqlalchemy import text
+
+# Markers wrapped around matched terms in snippets; callers replace them after escaping
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+
+# Column weights for bm25(): title, content, entities
+ARTICLE_WEIGHTS = (10.0, 1.0, 5.0)
+
+# Full-text tables are external-content tables over articles and summaries: they hold
+# only the index and read titles, content and snippets from the source rows, keyed
+# by their ids. Triggers keep them in step, removing old values before adding new ones
+SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+        title, content, entity_names, content = 'articles', content_rowid = 'id', tokenize = 'porter unicode61'
+    )""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS summaries_fts USING fts5(
+        summary_text, content = 'summaries', content_rowid = 'id', tokenize = 'porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS articles_fts_insert AFTER INSERT ON articles BEGIN
+        INSERT INTO articles_fts(rowid, title, content, entity_names)
+            VALUES (new.id, new.title, new.content, new.entity_names);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS articles_fts_update AFTER UPDATE OF title, content, entity_names ON articles BEGIN
+        INSERT INTO articles_fts(articles_fts, rowid, title, content, entity_names)
+            VALUES ('delete', old.id, old.title, old.content, old.entity_names);
+        INSERT INTO articles_fts(rowid, title, content, entity_names)
+            VALUES (new.id, new.title, new.content, new.entity_names);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS articles_fts_delete AFTER DELETE ON articles BEGIN
+        INSERT INTO articles_fts(articles_fts, rowid, title, content, entity_names)
+            VALUES ('delete', old.id, old.title, old.content, old.entity_names);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS summaries_fts_insert AFTER INSERT ON summaries BEGIN
+        INSERT INTO summaries_fts(rowid, summary_text) VALUES (new.id, new.summary_text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS summaries_fts_update AFTER UPDATE OF summary_text ON summaries BEGIN
+        INSERT INTO summaries_fts(summaries_fts, rowid, summary_text) VALUES ('delete', old.id, old.summary_text);
+        INSERT INTO summaries_fts(rowid, summary_text) VALUES (new.id, new.summary_text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS summaries_fts_delete AFTER DELETE ON summaries BEGIN
+        INSERT INTO summaries_fts(summaries_fts, rowid, summary_text) VALUES ('delete', old.id, old.summary_text);
+    END""",
+]
+
+FTS_TABLES = ['articles_fts', 'summaries_fts']
+FTS_TRIGGERS = [
+    'articles_fts_insert', 'articles_fts_update', 'articles_fts_delete',
+    'summaries_fts_insert', 'summaries_fts_update', 'summaries_fts_delete',
+]
+
+def ensure_search_index(engine):
+    """Create the full-text tables and their triggers, indexing existing rows on first creation
+
+    Full-text tables from before they were external-content tables kept their own
+    copy of every text; they are dropped and rebuilt from the source rows.
+    """
+    with engine.begin() as conn:
+        definition = conn.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'articles_fts'"
+        )).scalar()
+        exists = definition is not None and 'content_rowid' in definition
+        if definition is not None and not exists:
+            print("Rebuilding the full-text index as external-content tables...")
+            for trigger in FTS_TRIGGERS:
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+            for table in FTS_TABLES:
+                conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        try:
+            for statement in SCHEMA:
+                conn.execute(text(statement))
+        except Exception as e:
+            # SQLite builds without FTS5 still work, just without search
+            print(f"Full-text search unavailable: {e}")
+            return False
+        if not exists:
+            for table in FTS_TABLES:
+                conn.execute(text(f"INSERT INTO {table}({table}) VALUES ('rebuild')"))
+    return True
+
+def index_article_entities(session, article_id, entity_texts):
+    """Store an article's entity names for search; the update trigger indexes them"""
+    session.execute(
+        text("UPDATE articles SET entity_names = :entity_names WHERE id = :id"),
+        {'entity_names': ' '.join(entity_texts), 'id': article_id}
+    )
+
+def optimize_search_index(session):
+    """Merge the full-text index segments after a batch of updates"""
+    session.execute(text("INSERT INTO articles_fts(articles_fts) VALUES ('optimize')"))
+    session.execute(text("INSERT INTO summaries_fts(summaries_fts) VALUES ('optimize')"))
+
+def build_match_query(query):
+    """Turn free text into a safe FTS5 query: all terms must match, the last one as a prefix"""
+    terms = re.findall(r'\w+', query or '')
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+def search_articles(session, query, limit=20, offset=0):
+    """Find articles matching a query, best BM25 score first"""
+    match = build_match_query(query)
+    if match is None:
+        return []
+
+    # Ranked and limited inside the full-text table, so FTS5 orders by its rank directly
+    # and only the page of matches is joined to articles
+    return session.execute(text("""
+        SELECT a.id, a.title, a.url, a.source, a.published_date, a.cluster_id, f.snippet, f.score
+        FROM (
+            SELECT rowid, snippet(articles_fts, -1, :start, :end, '…', 24) AS snippet, rank AS score
+            FROM articles_fts
+            WHERE articles_fts MATCH :match AND rank MATCH :rank
+            ORDER BY rank
+            LIMIT :limit OFFSET :offset
+        ) f
+        JOIN articles a ON a.id = f.rowid
+        ORDER BY f.score
+    """), {
+        'match': match, 'rank': f"bm25({', '.join(str(w) for w in ARTICLE_WEIGHTS)})",
+        'start': SNIPPET_START, 'end': SNIPPET_END, 'limit': limit, 'offset': offset
+    }).fetchall()
+
+def search_summaries(session, query, limit=10):
+    """Find cluster summaries matching a query, best BM25 score first"""
+    match = build_match_query(query)
+    if match is None:
+        return []
+
+    return session.execute(text("""
+        SELECT s.id, s.cluster_id, c.topic, f.snippet, f.score
+        FROM (
+            SELECT rowid, snippet(summaries_fts, 0, :start, :end, '…', 24) AS snippet, rank AS score
+            FROM summaries_fts
+            WHERE summaries_fts MATCH :match
+            ORDER BY rank
+            LIMIT :limit
+        ) f
+        JOIN summaries s ON s.id = f.rowid
+        LEFT JOIN clusters c ON c.id = s.cluster_id
+        ORDER BY f.score
+    """), {
+        'match': match, 'start': SNIPPET_START, 'end': SNIPPET_END, 'limit': limit
+    }).fetchall()
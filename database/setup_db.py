@@ -1,38 +1,80 @@
 import sqlite3
+import sys
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Text, Float, DateTime, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Text, Float, DateTime, ForeignKey, Index, UniqueConstraint, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from datetime import datetime
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.search import ensure_search_index
+from database.changes import ensure_change_triggers
+from database.entity_dictionary import migrate_legacy_entities
+from monitoring.metrics import instrument_engine
+from regions.config import region_path
+
 Base = declarative_base()
 
+# Per-article stage states; NULL means the stage still has to process the article
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+
 class Article(Base):
     __tablename__ = 'articles'
     
     id = Column(Integer, primary_key=True)
     title = Column(String(255), nullable=False)
     url = Column(String(512), unique=True, nullable=False)
-    source = Column(String(100), nullable=False)
+    source = Column(String(100), nullable=False, index=True)
     author = Column(String(100), nullable=True)
     published_date = Column(DateTime, default=datetime.now)
     content = Column(Text, nullable=False)
     processed_content = Column(Text, nullable=True)
-    cluster_id = Column(Integer, nullable=True)
+    cluster_id = Column(Integer, nullable=True, index=True)
     embedding = Column(Text, nullable=True)  # Store as JSON string
+    preprocess_state = Column(String(10), nullable=True, index=True)  # NULL, done, failed
+    ner_state = Column(String(10), nullable=True, index=True)  # NULL, done, failed
+    entity_names = Column(Text, nullable=True)  # Extracted entity names, indexed for full-text search
     
-    entities = relationship("Entity", back_populates="article")
+    mentions = relationship("EntityMention", back_populates="article")
     
 class Entity(Base):
+    """Entity dictionary: each distinct named entity once, with its canonical name"""
     __tablename__ = 'entities'
+    __table_args__ = (
+        UniqueConstraint('key', 'label', name='uq_entities_key_label'),
+    )
     
     id = Column(Integer, primary_key=True)
-    article_id = Column(Integer, ForeignKey('articles.id'))
-    text = Column(String(255), nullable=False)
+    key = Column(String(255), nullable=False)  # Alias key from database.entity_dictionary.entity_key
     label = Column(String(50), nullable=False)  # PERSON, ORG, LOC, etc.
+    text = Column(String(255), nullable=False)  # Canonical name
+    
+class EntityMention(Base):
+    """How often an article mentions an entity"""
+    __tablename__ = 'entity_mentions'
+    
+    id = Column(Integer, primary_key=True)
+    article_id = Column(Integer, ForeignKey('articles.id'), index=True)
+    entity_id = Column(Integer, ForeignKey('entities.id'), nullable=False, index=True)
     count = Column(Integer, default=1)
     
-    article = relationship("Article", back_populates="entities")
+    article = relationship("Article", back_populates="mentions")
+    entity = relationship("Entity")
+    
+class ClusterEntityStat(Base):
+    """Materialized entity totals per cluster, kept up to date by database.entity_stats"""
+    __tablename__ = 'cluster_entity_stats'
+    __table_args__ = (
+        UniqueConstraint('cluster_id', 'entity_id', name='uq_cluster_entity_stats_entity'),
+        Index('ix_cluster_entity_stats_rank', 'cluster_id', 'total_count'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    cluster_id = Column(Integer, nullable=False)  # -1 holds corpus-wide totals
+    entity_id = Column(Integer, nullable=False)
+    total_count = Column(Integer, nullable=False, default=0)
+    article_count = Column(Integer, nullable=False, default=0)
     
 class Cluster(Base):
     __tablename__ = 'clusters'
@@ -41,21 +83,154 @@ class Cluster(Base):
     created_date = Column(DateTime, default=datetime.now)
     topic = Column(String(255), nullable=True)
     article_count = Column(Integer, default=0)
+    updated_date = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    
+class ClusterLineage(Base):
+    """One event in the history of a persistent cluster id, recorded by processing.lineage"""
+    __tablename__ = 'cluster_lineage'
+    
+    id = Column(Integer, primary_key=True)
+    cluster_id = Column(Integer, nullable=False, index=True)
+    kind = Column(String(20), nullable=False)  # born, split, merged, ended
+    other_cluster_id = Column(Integer, nullable=True, index=True)  # split: parent, merged: the cluster it joined
+    article_count = Column(Integer, nullable=False, default=0)
+    similarity = Column(Float, nullable=True)  # Match score to other_cluster_id
+    created_at = Column(DateTime, default=datetime.now)
     
 class Summary(Base):
     __tablename__ = 'summaries'
     
     id = Column(Integer, primary_key=True)
-    cluster_id = Column(Integer, nullable=False)
+    cluster_id = Column(Integer, nullable=False, index=True)
     summary_text = Column(Text, nullable=False)
     created_date = Column(DateTime, default=datetime.now)
     
-def setup_db():
-    db_path = os.path.join(os.path.dirname(__file__), '..', 'event_data.db')
-    engine = create_engine(f'sqlite:///{db_path}')
-    Base.metadata.create_all(engine)
+class PipelineRun(Base):
+    """One execution of the data pipeline; completed runs act as the data version"""
+    __tablename__ = 'pipeline_runs'
+    
+    id = Column(Integer, primary_key=True)
+    started_at = Column(DateTime, default=datetime.now)
+    finished_at = Column(DateTime, nullable=True)
+    status = Column(String(20), nullable=False, default='running')  # running, completed, failed
+    metrics = Column(Text, nullable=True)  # JSON list of [name, labels, value] samples for this run
+    
+class PipelineJob(Base):
+    """A queued or executed pipeline job, consumed by the pipeline runner process"""
+    __tablename__ = 'pipeline_jobs'
+    
+    id = Column(Integer, primary_key=True)
+    status = Column(String(20), nullable=False, default='queued', index=True)  # queued, running, completed, failed
+    trigger = Column(String(20), nullable=False, default='manual')  # manual, schedule
+    requested_at = Column(DateTime, default=datetime.now)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    worker_pid = Column(Integer, nullable=True)
+    run_id = Column(Integer, nullable=True)
+    stage = Column(String(50), nullable=True)
+    stages_done = Column(Integer, default=0)
+    stages_total = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
     
-    Session = sessionmaker(bind=engine)
+class ChangeLogEntry(Base):
+    """One change to the served data; version only ever increases, written by triggers in database.changes"""
+    __tablename__ = 'change_log'
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    version = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)  # article_added, article_moved, summary_updated, topic_changed, ...
+    entity_id = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=True)  # JSON object
+    created_at = Column(DateTime, default=datetime.now)
+    
+class StageWatermark(Base):
+    """The change log version a pipeline stage has consumed up to, used to skip stages without new inputs"""
+    __tablename__ = 'stage_watermarks'
+    
+    stage = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    run_id = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    
+class ArchivedArticle(Base):
+    """Compact index of an article moved to an archive database by database.archive"""
+    __tablename__ = 'archived_articles'
+    
+    id = Column(Integer, primary_key=True)
+    article_id = Column(Integer, nullable=False, index=True)  # The article's id in the live database
+    url = Column(String(512), unique=True, nullable=False)
+    title = Column(String(255), nullable=False)
+    source = Column(String(100), nullable=False)
+    published_date = Column(DateTime, nullable=True, index=True)
+    archive_file = Column(String(100), nullable=False)  # File name in the archive directory
+    archived_at = Column(DateTime, default=datetime.now)
+    
+# Pipeline stages write concurrently; a writer waits this long for another's transaction to finish
+BUSY_TIMEOUT_SECONDS = 60
+
+# Statements that fill a column added to an existing table from the data it replaces
+COLUMN_BACKFILLS = {
+    ('articles', 'preprocess_state'): f"UPDATE articles SET preprocess_state = '{STATE_DONE}' WHERE processed_content IS NOT NULL",
+    ('articles', 'ner_state'): f"UPDATE articles SET ner_state = '{STATE_DONE}' WHERE id IN (SELECT article_id FROM entity_mentions)",
+    ('articles', 'entity_names'): """UPDATE articles SET entity_names = (
+        SELECT group_concat(e.text, ' ') FROM entity_mentions m JOIN entities e ON e.id = m.entity_id
+        WHERE m.article_id = articles.id
+    )""",
+}
+
+# One session factory per database file, so schema checks only run once per process
+_session_factories = {}
+
+def _ensure_indexes(engine):
+    """Create indexes that were added to existing tables after they were first created"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+def _ensure_columns(engine):
+    """Add columns that were added to existing tables after they were first created"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                    backfill = COLUMN_BACKFILLS.get((table.name, column.name))
+                    if backfill:
+                        conn.execute(text(backfill))
+
+def get_db_path():
+    """Get the path of the current region's live (read-write) database file; EVENT_DB_PATH overrides it"""
+    return os.environ.get('EVENT_DB_PATH') or region_path(
+        os.path.join(os.path.dirname(__file__), '..', 'event_data.db'), 'event_data.db'
+    )
+
+def setup_db():
+    db_path = get_db_path()
+    Session = _session_factories.get(db_path)
+    if Session is None:
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        engine = create_engine(f'sqlite:///{db_path}', connect_args={'timeout': BUSY_TIMEOUT_SECONDS})
+        instrument_engine(engine, 'live')
+        # WAL lets readers and one writer proceed at the same time; the setting is stored in the file
+        with engine.connect() as conn:
+            # Lets database.archive return freed pages to the OS without a full VACUUM. Only
+            # takes effect on a new file, before WAL mode writes its header; existing files
+            # are converted by its --convert option
+            conn.exec_driver_sql('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.exec_driver_sql('PRAGMA journal_mode=WAL')
+        migrate_legacy_entities(engine, [Entity.__table__, EntityMention.__table__])
+        Base.metadata.create_all(engine)
+        _ensure_columns(engine)
+        _ensure_indexes(engine)
+        ensure_search_index(engine)
+        ensure_change_triggers(engine)
+        
+        Session = sessionmaker(bind=engine)
+        _session_factories[db_path] = Session
     return Session()
 
 if __name__ == "__main__":
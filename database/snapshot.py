@@ -0,0 +1,184 @@
+import sys
+import os
+import glob
+import sqlite3
+import threading
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.setup_db import get_db_path, setup_db
+from database.entity_stats import ensure_entity_stats
+from monitoring.metrics import instrument_engine
+from regions.config import region_path
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'snapshots')
+CURRENT_POINTER = 'CURRENT'
+
+def get_snapshot_dir():
+    """Get the current region's snapshot directory; EVENT_SNAPSHOT_DIR overrides it"""
+    return os.environ.get('EVENT_SNAPSHOT_DIR') or region_path(DEFAULT_SNAPSHOT_DIR, 'snapshots')
+
+# Tables that only exist in published snapshots
+SnapshotBase = declarative_base()
+
+class ClusterCard(SnapshotBase):
+    """A cluster pre-joined with its first summary and first article, as shown on the home page"""
+    __tablename__ = 'cluster_cards'
+
+    id = Column(Integer, primary_key=True)
+    topic = Column(String(255), nullable=True)
+    article_count = Column(Integer, default=0)
+    updated_date = Column(DateTime, nullable=True)
+    summary_text = Column(Text, nullable=False)
+    sample_title = Column(String(255), nullable=False)
+
+# Statements run against a fresh copy to make it compact and pre-joined
+PREPARE_SNAPSHOT = [
+    # Pipeline-only data the web tier never reads
+    "UPDATE articles SET processed_content = NULL, embedding = NULL",
+    "DELETE FROM pipeline_jobs",
+    "DELETE FROM stage_watermarks",
+    "DELETE FROM archived_articles",
+    """CREATE TABLE cluster_cards AS
+        SELECT c.id AS id, c.topic AS topic, c.article_count AS article_count,
+               c.updated_date AS updated_date, s.summary_text AS summary_text, a.title AS sample_title
+        FROM clusters c
+        JOIN summaries s ON s.id = (SELECT MIN(id) FROM summaries WHERE cluster_id = c.id)
+        JOIN articles a ON a.id = (SELECT MIN(id) FROM articles WHERE cluster_id = c.id)
+        ORDER BY c.id""",
+    "CREATE UNIQUE INDEX ix_cluster_cards_id ON cluster_cards (id)",
+]
+
+def publish_snapshot(version):
+    """Copy the live database into a compact read-only snapshot and make it current
+
+    The copy is prepared under a temporary name and only becomes visible
+    through an atomic rename of the CURRENT pointer, so readers always see
+    either the previous snapshot or the complete new one.
+    """
+    snapshot_dir = get_snapshot_dir()
+    os.makedirs(snapshot_dir, exist_ok=True)
+    filename = f'event_snapshot_{version}.db'
+    path = os.path.join(snapshot_dir, filename)
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    # Snapshots of databases that predate the entity statistics still get them
+    session = setup_db()
+    ensure_entity_stats(session)
+    session.close()
+
+    # VACUUM INTO copies a consistent view of the live database in one read transaction
+    source = sqlite3.connect(get_db_path())
+    try:
+        source.execute("VACUUM INTO ?", (tmp_path,))
+    finally:
+        source.close()
+
+    snapshot = sqlite3.connect(tmp_path)
+    try:
+        triggers = snapshot.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall()
+        for (name,) in triggers:
+            snapshot.execute(f'DROP TRIGGER "{name}"')
+        for statement in PREPARE_SNAPSHOT:
+            snapshot.execute(statement)
+        snapshot.commit()
+        snapshot.execute("VACUUM")
+        snapshot.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        snapshot.close()
+
+    os.replace(tmp_path, path)
+    _write_pointer(filename)
+    _remove_old_snapshots(keep={filename})
+    print(f"Published snapshot {filename}")
+    return path
+
+def _write_pointer(filename):
+    """Atomically point CURRENT at a snapshot file"""
+    pointer = os.path.join(get_snapshot_dir(), CURRENT_POINTER)
+    tmp_pointer = f"{pointer}.{os.getpid()}.tmp"
+    with open(tmp_pointer, 'w') as f:
+        f.write(filename)
+    os.replace(tmp_pointer, pointer)
+
+def _remove_old_snapshots(keep, retain=1):
+    """Delete snapshots other than the current one and the most recent previous ones"""
+    paths = sorted(glob.glob(os.path.join(get_snapshot_dir(), 'event_snapshot_*.db')), key=os.path.getmtime)
+    old = [path for path in paths if os.path.basename(path) not in keep]
+    for path in old[:-retain] if retain else old:
+        try:
+            os.remove(path)
+        except OSError:
+            # Still open by a reader on a platform that doesn't allow deleting open files
+            pass
+
+def current_snapshot_path():
+    """Get the path of the current snapshot, or None if none has been published"""
+    snapshot_dir = get_snapshot_dir()
+    try:
+        with open(os.path.join(snapshot_dir, CURRENT_POINTER)) as f:
+            filename = f.read().strip()
+    except OSError:
+        return None
+    path = os.path.join(snapshot_dir, filename)
+    return path if os.path.exists(path) else None
+
+# Session factory for the snapshot currently in use in each snapshot directory (one per
+# region), replaced when its CURRENT changes
+_read_states = {}
+_read_lock = threading.Lock()
+
+def _snapshot_factory():
+    """Get a session factory for the current snapshot, reopening it after a new publish"""
+    snapshot_dir = get_snapshot_dir()
+    pointer = os.path.join(snapshot_dir, CURRENT_POINTER)
+    try:
+        mtime = os.stat(pointer).st_mtime_ns
+    except OSError:
+        return None
+
+    with _read_lock:
+        _read_state = _read_states.setdefault(snapshot_dir, {'pointer_mtime': None, 'path': None, 'factory': None})
+        if _read_state['pointer_mtime'] == mtime:
+            return _read_state['factory']
+
+        path = current_snapshot_path()
+        factory = None
+        if path:
+            # immutable=1 lets SQLite skip locking and change detection entirely
+            engine = create_engine(
+                f'sqlite:///file:{os.path.abspath(path)}?mode=ro&immutable=1&uri=true',
+                poolclass=QueuePool,
+                connect_args={'check_same_thread': False}
+            )
+            instrument_engine(engine, 'snapshot')
+            factory = sessionmaker(bind=engine, info={'snapshot': True})
+
+        old_factory = _read_state['factory']
+        _read_state.update(pointer_mtime=mtime, path=path, factory=factory)
+    if old_factory is not None:
+        old_factory.kw['bind'].dispose()
+    return factory
+
+def setup_read_db():
+    """Get a read-only session on the current snapshot, or on the live database if none exists"""
+    factory = _snapshot_factory()
+    if factory is None:
+        return setup_db()
+    return factory()
+
+def is_snapshot(session):
+    """Whether a session reads from a published snapshot"""
+    return bool(session.info.get('snapshot'))
+
+if __name__ == "__main__":
+    from database.runs import get_data_version
+    session = setup_db()
+    version = get_data_version(session)
+    session.close()
+    publish_snapshot(version)
@@ -0,0 +1,308 @@
+import sys
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; peak RSS is simply not reported there
+    resource = None
+
+# Histogram buckets in seconds, from a fast query to a slow model call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class Registry:
+    """A set of metrics that can be rendered in Prometheus text format, snapshotted and merged
+
+    Snapshots are plain dicts, so worker processes can send theirs back to be merged
+    and a pipeline run can store the difference between two of them as its summary.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def snapshot(self):
+        """Copy every metric's current values"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def merge(self, snapshot):
+        """Fold in a snapshot from another process: counters and histograms add up, gauges are replaced"""
+        for name, values in snapshot.items():
+            metric = self._metrics.get(name)
+            if metric is not None:
+                metric.merge(values)
+
+    def delta(self, before):
+        """What changed since an earlier snapshot: counter and histogram increments, gauges set since"""
+        result = {}
+        for name, values in self.snapshot().items():
+            metric = self._metrics[name]
+            changed = metric.delta(values, before.get(name, {}))
+            if changed:
+                result[name] = changed
+        return result
+
+    def render(self):
+        """Render every metric in Prometheus text exposition format"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        return ''.join(metric.render() for metric in metrics)
+
+REGISTRY = Registry()
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._values.items()}
+
+    def _copy(self, value):
+        return value
+
+    def merge(self, values):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = value
+
+    def delta(self, after, before):
+        return after
+
+    def samples(self):
+        """(name suffix, labels, value) for every series"""
+        for key, value in sorted(self.snapshot().items()):
+            yield '', dict(zip(self.labelnames, key)), value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}\n", f"# TYPE {self.name} {self.type}\n"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(labels)} {format_value(value)}\n")
+        return ''.join(lines)
+
+class Counter(Metric):
+    """A count that only goes up"""
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def merge(self, values):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+    def delta(self, after, before):
+        return {key: value - before.get(key, 0) for key, value in after.items() if value != before.get(key, 0)}
+
+class Gauge(Metric):
+    """A value that is set to its latest reading
+
+    Each series remembers when it was set, so a delta only contains readings taken since
+    the earlier snapshot, and merging keeps the newer of two readings.
+    """
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = (value, time.time())
+
+    @contextmanager
+    def time(self, **labels):
+        """Set the gauge to the duration of the block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.set(time.perf_counter() - start, **labels)
+
+    def merge(self, values):
+        with self._lock:
+            for key, (value, set_at) in values.items():
+                if key not in self._values or self._values[key][1] <= set_at:
+                    self._values[key] = (value, set_at)
+
+    def delta(self, after, before):
+        return {key: value for key, value in after.items() if key not in before or before[key][1] < value[1]}
+
+    def samples(self):
+        for key, (value, _) in sorted(self.snapshot().items()):
+            yield '', dict(zip(self.labelnames, key)), value
+
+class Histogram(Metric):
+    """Observations counted into buckets, with their sum and count"""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(buckets) + (float('inf'),)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            counts = [c + (1 if value <= bound else 0) for c, bound in zip(counts, self.buckets)]
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _copy(self, value):
+        counts, total, count = value
+        return (list(counts), total, count)
+
+    def merge(self, values):
+        with self._lock:
+            for key, (counts, total, count) in values.items():
+                old_counts, old_total, old_count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+                self._values[key] = ([a + b for a, b in zip(old_counts, counts)], old_total + total, old_count + count)
+
+    def delta(self, after, before):
+        result = {}
+        for key, (counts, total, count) in after.items():
+            old_counts, old_total, old_count = before.get(key) or ([0] * len(counts), 0.0, 0)
+            if count != old_count:
+                result[key] = ([a - b for a, b in zip(counts, old_counts)], total - old_total, count - old_count)
+        return result
+
+    def samples(self):
+        for key, (counts, total, count) in sorted(self.snapshot().items()):
+            labels = dict(zip(self.labelnames, key))
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield '_bucket', dict(labels, le=format_value(bound)), bucket_count
+            yield '_sum', labels, total
+            yield '_count', labels, count
+
+# Pipeline
+STAGE_SECONDS = Gauge('pipeline_stage_seconds', "Duration of the latest run of each pipeline stage", ['stage'])
+STAGE_ITEMS = Counter('pipeline_stage_items_total', "Items processed by each pipeline stage", ['stage'])
+MODEL_LOAD_SECONDS = Gauge('pipeline_model_load_seconds', "Time taken to load each NLP model", ['model'])
+PIPELINE_JOBS = Gauge('pipeline_jobs', "Pipeline jobs by status", ['status'])
+
+# Scraper
+SCRAPE_FETCH_SECONDS = Histogram('scraper_fetch_seconds', "Latency of feed and article fetches by source",
+                                 ['source', 'kind'])
+SCRAPE_ARTICLES = Counter('scraper_articles_total', "New articles stored by source", ['source'])
+SCRAPE_ERRORS = Counter('scraper_errors_total', "Feeds that failed to scrape by source", ['source'])
+
+# Database
+DB_QUERIES = Counter('db_queries_total', "SQL statements executed", ['db', 'statement'])
+DB_QUERY_SECONDS = Histogram('db_query_seconds', "SQL statement latency", ['db'])
+
+# Web
+HTTP_REQUESTS = Counter('http_requests_total', "HTTP requests by endpoint, method and status",
+                        ['endpoint', 'method', 'status'])
+HTTP_REQUEST_SECONDS = Histogram('http_request_seconds', "HTTP request latency by endpoint", ['endpoint'])
+
+# Process
+PEAK_RSS_BYTES = Gauge('process_peak_rss_bytes', "Peak resident set size of each process", ['process'])
+
+def record_peak_rss(process):
+    """Record this process's peak resident set size"""
+    if resource is None:
+        return
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    PEAK_RSS_BYTES.set(peak if sys.platform == 'darwin' else peak * 1024, process=process)
+
+def instrument_engine(engine, db):
+    """Count and time every statement an SQLAlchemy engine executes"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Kept on the execution context, so a statement that raises leaves nothing behind
+        context._query_start = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = context._query_start
+        verb = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else 'other'
+        if verb not in ('select', 'insert', 'update', 'delete'):
+            verb = 'other'
+        DB_QUERIES.inc(db=db, statement=verb)
+        DB_QUERY_SECONDS.observe(time.perf_counter() - start, db=db)
+
+def run_summary(delta):
+    """Flatten a registry delta into JSON-friendly samples for a pipeline run's summary
+
+    Stage throughput is added as pipeline_stage_items_per_second.
+    """
+    samples = []
+    for name, values in sorted(delta.items()):
+        metric = REGISTRY.get(name)
+        for key, value in sorted(values.items()):
+            labels = dict(zip(metric.labelnames, key))
+            if isinstance(metric, Histogram):
+                _, total, count = value
+                samples.append([f'{name}_sum', labels, total])
+                samples.append([f'{name}_count', labels, count])
+            elif isinstance(metric, Gauge):
+                samples.append([name, labels, value[0]])
+            else:
+                samples.append([name, labels, value])
+
+    seconds = delta.get(STAGE_SECONDS.name, {})
+    for key, items in delta.get(STAGE_ITEMS.name, {}).items():
+        if key in seconds and seconds[key][0] > 0:
+            samples.append(['pipeline_stage_items_per_second', {'stage': key[0]}, items / seconds[key][0]])
+    return samples
+
+def render_samples(samples, prefix):
+    """Render stored summary samples as gauges, with their names moved under prefix"""
+    lines = []
+    seen = set()
+    # Series of one metric must be contiguous in the output
+    for name, labels, value in sorted(samples, key=lambda sample: sample[0]):
+        full_name = prefix + (name[len('pipeline_'):] if name.startswith('pipeline_') else name)
+        if full_name not in seen:
+            seen.add(full_name)
+            lines.append(f"# TYPE {full_name} gauge\n")
+        lines.append(f"{full_name}{format_labels(labels)} {format_value(value)}\n")
+    return ''.join(lines)
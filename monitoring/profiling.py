@@ -0,0 +1,167 @@
+import sys
+import os
+import io
+import re
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from regions.config import DEFAULT_REGION, get_region
+
+# EVENT_PROFILE turns profiling on: a comma separated list of 'cpu' (cProfile), 'memory'
+# (tracemalloc) and 'sampling' (pyinstrument, if installed); '1' or 'all' means cpu and memory
+PROFILE_ENV = 'EVENT_PROFILE'
+PROFILE_DIR_ENV = 'EVENT_PROFILE_DIR'
+# Web routes to profile by endpoint or URL rule, e.g. 'index,/api/search'; '*' profiles every route
+PROFILE_ROUTES_ENV = 'EVENT_PROFILE_ROUTES'
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'profiles')
+MODES = ('cpu', 'memory', 'sampling')
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+
+# tracemalloc is process-wide, so overlapping profiled blocks share one tracing session
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+
+def _parse_modes(value):
+    value = (value or '').strip().lower()
+    if value in ('', '0', 'false', 'off'):
+        return frozenset()
+    if value in ('1', 'true', 'on', 'all'):
+        return frozenset(('cpu', 'memory'))
+    return frozenset(mode.strip() for mode in value.split(',') if mode.strip() in MODES)
+
+def profiling_modes():
+    """The profiling modes enabled for this process"""
+    return _parse_modes(os.environ.get(PROFILE_ENV))
+
+def enable_profiling(modes='all'):
+    """Turn profiling on for this process and the worker processes it starts"""
+    os.environ[PROFILE_ENV] = modes
+
+def profile_root():
+    return os.environ.get(PROFILE_DIR_ENV) or DEFAULT_PROFILE_DIR
+
+def run_profile_dir(run_id):
+    """Directory for the profiles of one pipeline run, or None when profiling is off"""
+    if not profiling_modes():
+        return None
+    # Run ids are per region shard
+    region = get_region()
+    if region != DEFAULT_REGION:
+        return os.path.join(profile_root(), region, f'run_{run_id}')
+    return os.path.join(profile_root(), f'run_{run_id}')
+
+def _start_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+        _tracing_users += 1
+
+def _stop_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0:
+            tracemalloc.stop()
+
+def _write_cpu_report(profiler, path):
+    profiler.dump_stats(f'{path}.prof')
+    report = io.StringIO()
+    stats = pstats.Stats(profiler, stream=report)
+    stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    with open(f'{path}.cpu.txt', 'w') as f:
+        f.write(report.getvalue())
+
+def _write_memory_report(snapshot, peak, path):
+    stats = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+    ]).statistics('lineno')
+    with open(f'{path}.memory.txt', 'w') as f:
+        f.write(f"Peak traced memory: {peak / 1024 / 1024:.1f} MiB\n\n")
+        f.write(f"Top {TOP_ALLOCATIONS} allocation sites still live at the end:\n")
+        for stat in stats[:TOP_ALLOCATIONS]:
+            f.write(f"{stat}\n")
+
+def _start_sampler():
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        print("Sampling profiler unavailable: install pyinstrument")
+        return None
+    sampler = Profiler()
+    sampler.start()
+    return sampler
+
+@contextmanager
+def profile_block(name, output_dir):
+    """Profile the enclosed block into output_dir/<name>.*; does nothing when output_dir is None"""
+    modes = profiling_modes() if output_dir else None
+    if not modes:
+        yield
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, re.sub(r'[^\w.-]+', '_', name).strip('_') or 'root')
+    profiler = cProfile.Profile() if 'cpu' in modes else None
+    sampler = _start_sampler() if 'sampling' in modes else None
+    if 'memory' in modes:
+        _start_tracing()
+        tracemalloc.reset_peak()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        if 'memory' in modes:
+            # Snapshot before writing any report, so the reports' own allocations don't show up
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            _stop_tracing()
+            _write_memory_report(snapshot, peak, path)
+        if profiler:
+            _write_cpu_report(profiler, path)
+        if sampler:
+            sampler.stop()
+            with open(f'{path}.sampling.html', 'w') as f:
+                f.write(sampler.output_html())
+        print(f"Profile written to {path}.*")
+
+def _profiled_view(endpoint, view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        output_dir = os.path.join(profile_root(), 'web', time.strftime('%Y%m%d'))
+        name = f"{time.strftime('%H%M%S')}_{int(time.time() * 1000) % 1000:03d}_{endpoint}_{os.getpid()}"
+        with profile_block(name, output_dir):
+            return view(*args, **kwargs)
+    return wrapper
+
+def init_profiling(app):
+    """Wrap the routes selected by EVENT_PROFILE_ROUTES with the profiler
+
+    Call after every route and blueprint is registered. When profiling is off the
+    views are left untouched, so there is no per-request cost.
+    """
+    routes = os.environ.get(PROFILE_ROUTES_ENV, '').strip()
+    if not profiling_modes() or not routes:
+        return
+    selected = {route.strip() for route in routes.split(',')}
+    rules = {}
+    for rule in app.url_map.iter_rules():
+        rules.setdefault(rule.endpoint, set()).add(rule.rule)
+    for endpoint, view in list(app.view_functions.items()):
+        if endpoint == 'static':
+            continue
+        if '*' in selected or endpoint in selected or rules.get(endpoint, set()) & selected:
+            app.view_functions[endpoint] = _profiled_view(endpoint, view)
+    print(f"Profiling routes: {routes}")
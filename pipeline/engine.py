@@ -0,0 +1,139 @@
+import sys
+import os
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from sqlalchemy.dialects.sqlite import insert
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.models import StageWatermark
+from database.changes import get_latest_version, has_changes
+from monitoring.metrics import REGISTRY, STAGE_SECONDS, record_peak_rss
+from monitoring.profiling import profile_block
+
+# Stage inputs that match every kind of change
+ANY_CHANGE = '*'
+
+# A pipeline stage: deps are the stages that must finish first; inputs are the change
+# kinds that give it work (None for source stages, which always run)
+Stage = namedtuple('Stage', ['name', 'func', 'deps', 'inputs'])
+
+def get_watermark(session, stage):
+    """Get the change version a stage has consumed up to, or None if it never completed"""
+    return session.query(StageWatermark.version).filter_by(stage=stage).scalar()
+
+def set_watermark(session, stage, version, run_id=None):
+    """Record that a stage has consumed every change up to version"""
+    now = datetime.now()
+    statement = insert(StageWatermark).values(stage=stage, version=version, run_id=run_id, updated_at=now)
+    session.execute(statement.on_conflict_do_update(
+        index_elements=['stage'],
+        set_={'version': statement.excluded.version, 'run_id': run_id, 'updated_at': now}
+    ))
+    session.commit()
+
+def is_dirty(session, stage):
+    """Whether a stage has inputs it has not consumed yet"""
+    if stage.inputs is None:
+        return True
+    watermark = get_watermark(session, stage.name)
+    if watermark is None:
+        return True
+    kinds = None if stage.inputs == ANY_CHANGE else stage.inputs
+    return has_changes(session, watermark, kinds)
+
+def plan_waves(stages):
+    """Group stages into waves; every stage in a wave only depends on earlier waves"""
+    names = {stage.name for stage in stages}
+    done = set()
+    remaining = list(stages)
+    waves = []
+    while remaining:
+        wave = [stage for stage in remaining if all(dep in done or dep not in names for dep in stage.deps)]
+        if not wave:
+            raise ValueError(f"Pipeline stages have a dependency cycle: {[stage.name for stage in remaining]}")
+        waves.append(wave)
+        done.update(stage.name for stage in wave)
+        remaining = [stage for stage in remaining if stage.name not in done]
+    return waves
+
+def _call_stage(name, func, profile_dir=None):
+    """Run one stage and record its duration, profiling it into profile_dir if given"""
+    with STAGE_SECONDS.time(stage=name), profile_block(name, profile_dir):
+        func()
+
+def _call_stage_in_worker(name, func, profile_dir=None):
+    """Run one stage in a worker process and return the metrics it recorded"""
+    _call_stage(name, func, profile_dir)
+    record_peak_rss(name)
+    return REGISTRY.snapshot()
+
+def _run_wave(stages, parallel, profile_dir=None):
+    """Run the stages of one wave, each in its own worker process when parallel
+
+    Returns (completed stage names, first error or None).
+    """
+    if parallel and len(stages) > 1:
+        try:
+            # spawn gives each stage a clean process instead of a copy of our open database connections
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=len(stages), mp_context=context) as executor:
+                futures = [(stage, executor.submit(_call_stage_in_worker, stage.name, stage.func, profile_dir)) for stage in stages]
+                completed, error = [], None
+                for stage, future in futures:
+                    try:
+                        REGISTRY.merge(future.result())
+                        completed.append(stage.name)
+                    except Exception as e:
+                        print(f"Stage {stage.name} failed: {e}")
+                        error = error or e
+                return completed, error
+        except OSError as e:
+            # Environments without process support fall back to running stages inline
+            print(f"Parallel stages unavailable ({e}), running serially.")
+
+    completed = []
+    for stage in stages:
+        try:
+            _call_stage(stage.name, stage.func, profile_dir)
+        except Exception as e:
+            print(f"Stage {stage.name} failed: {e}")
+            return completed, e
+        completed.append(stage.name)
+    return completed, None
+
+def run_stages(session, stages, run_id=None, full=False, parallel=True, progress=None, after_wave=None,
+               profile_dir=None):
+    """Run the stages that have new inputs, in dependency order, and return the names of those that ran
+
+    progress, if given, is called as progress(stage, stages_done, stages_total) before
+    each wave; after_wave, if given, is called after every wave that ran a stage.
+    With full=True every stage runs regardless of its watermark. With profile_dir,
+    each stage is profiled into that directory.
+    """
+    total = len(stages)
+    done = 0
+    ran = []
+    for wave in plan_waves(stages):
+        # Changes made while a stage runs are left for its next run, so capture the version first
+        version = get_latest_version(session)
+        due = [stage for stage in wave if full or is_dirty(session, stage)]
+        session.commit()
+        for stage in wave:
+            if stage not in due:
+                print(f"Skipping {stage.name}: no new inputs")
+
+        if due:
+            if progress:
+                progress(', '.join(stage.name for stage in due), done, total)
+            completed, error = _run_wave(due, parallel, profile_dir)
+            for name in completed:
+                set_watermark(session, name, version, run_id)
+            ran.extend(completed)
+            if error is not None:
+                raise error
+            if after_wave:
+                after_wave(done + len(wave))
+        done += len(wave)
+    return ran
@@ -0,0 +1,141 @@
+import sys
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import DateTime, bindparam, text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.models import PipelineJob, setup_db
+
+# A running job whose runner has not sent a heartbeat for this long is considered dead
+STALE_AFTER = timedelta(minutes=10)
+
+def enqueue_job(session, trigger='manual'):
+    """Queue a pipeline job, reusing an already queued one so requests don't pile up"""
+    job = session.query(PipelineJob).filter_by(status='queued').order_by(PipelineJob.id).first()
+    if job:
+        return job
+
+    job = PipelineJob(status='queued', trigger=trigger, requested_at=datetime.now())
+    session.add(job)
+    session.commit()
+    return job
+
+def fail_stale_jobs(session):
+    """Mark running jobs whose runner stopped sending heartbeats as failed"""
+    cutoff = datetime.now() - STALE_AFTER
+    stale = session.query(PipelineJob).filter(
+        PipelineJob.status == 'running',
+        PipelineJob.heartbeat_at < cutoff
+    ).all()
+    for job in stale:
+        job.status = 'failed'
+        job.finished_at = datetime.now()
+        job.error = f"Runner (pid {job.worker_pid}) stopped responding"
+    session.commit()
+    return len(stale)
+
+def claim_next_job(session, worker_pid):
+    """Atomically start the oldest queued job, or return None
+
+    The claim is a single UPDATE that only succeeds while no other job is
+    running, which makes it the single-run lock: SQLite serializes writers,
+    so two runners can never both move a job to running.
+    """
+    now = datetime.now()
+    result = session.execute(text("""
+        UPDATE pipeline_jobs
+        SET status = 'running', started_at = :now, heartbeat_at = :now, worker_pid = :pid
+        WHERE id = (SELECT id FROM pipeline_jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+          AND NOT EXISTS (SELECT 1 FROM pipeline_jobs WHERE status = 'running')
+    """).bindparams(bindparam('now', type_=DateTime)), {'now': now, 'pid': worker_pid})
+    session.commit()
+
+    if result.rowcount == 0:
+        return None
+    return session.query(PipelineJob).filter_by(status='running', worker_pid=worker_pid).order_by(
+        PipelineJob.id.desc()
+    ).first()
+
+def start_job(session, worker_pid, trigger='direct'):
+    """Atomically record a job that runs right away in this process, or return None
+
+    For runs started outside the runner. The INSERT only succeeds while no other
+    job is running, so it takes the same single-run lock as claim_next_job.
+    """
+    now = datetime.now()
+    result = session.execute(text("""
+        INSERT INTO pipeline_jobs (status, trigger, requested_at, started_at, heartbeat_at, worker_pid,
+                                   stages_done, stages_total)
+        SELECT 'running', :trigger, :now, :now, :now, :pid, 0, 0
+        WHERE NOT EXISTS (SELECT 1 FROM pipeline_jobs WHERE status = 'running')
+    """).bindparams(bindparam('now', type_=DateTime)), {'now': now, 'pid': worker_pid, 'trigger': trigger})
+    session.commit()
+
+    if result.rowcount == 0:
+        return None
+    return session.query(PipelineJob).filter_by(status='running', worker_pid=worker_pid).order_by(
+        PipelineJob.id.desc()
+    ).first()
+
+def running_job(session):
+    """Get the job that is currently running, or None"""
+    return session.query(PipelineJob).filter_by(status='running').first()
+
+def heartbeat(session, job_id):
+    """Record that the runner working on a job is still alive"""
+    session.query(PipelineJob).filter_by(id=job_id).update(
+        {'heartbeat_at': datetime.now()}, synchronize_session=False
+    )
+    session.commit()
+
+def update_progress(session, job_id, stage, stages_done, stages_total, run_id=None):
+    """Record which stage a running job has reached"""
+    values = {
+        'stage': stage,
+        'stages_done': stages_done,
+        'stages_total': stages_total,
+        'heartbeat_at': datetime.now()
+    }
+    if run_id is not None:
+        values['run_id'] = run_id
+    session.query(PipelineJob).filter_by(id=job_id).update(values, synchronize_session=False)
+    session.commit()
+
+def finish_job(session, job_id, status='completed', error=None):
+    """Mark a job as finished"""
+    session.query(PipelineJob).filter_by(id=job_id).update({
+        'status': status,
+        'finished_at': datetime.now(),
+        'error': error
+    }, synchronize_session=False)
+    session.commit()
+
+def last_requested_at(session):
+    """Get when the most recent job was requested, or None"""
+    job = session.query(PipelineJob).order_by(PipelineJob.id.desc()).first()
+    return job.requested_at if job else None
+
+def job_to_dict(job):
+    """Convert a job into a JSON-ready dict"""
+    def iso(value):
+        return value.isoformat() if value else None
+
+    return {
+        'id': job.id,
+        'status': job.status,
+        'trigger': job.trigger,
+        'requested_at': iso(job.requested_at),
+        'started_at': iso(job.started_at),
+        'finished_at': iso(job.finished_at),
+        'run_id': job.run_id,
+        'stage': job.stage,
+        'stages_done': job.stages_done,
+        'stages_total': job.stages_total,
+        'error': job.error
+    }
+
+if __name__ == "__main__":
+    session = setup_db()
+    job = enqueue_job(session)
+    print(f"Pipeline job {job.id} queued")
+    session.close()
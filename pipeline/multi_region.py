@@ -0,0 +1,72 @@
+import sys
+import os
+import argparse
+import multiprocessing
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from regions.config import activate_region, load_regions
+
+def _run_region(region, runner, full=False, runner_args=None):
+    """Process entry point: work on one region's shard for the life of the process"""
+    activate_region(region)
+    # Imported after the region is set, so nothing is opened against another region's shard
+    if runner:
+        from pipeline.runner import run_runner
+        run_runner(**(runner_args or {}))
+    else:
+        from pipeline.runner import run_once
+        if run_once(full=full) != 'completed':
+            sys.exit(1)
+
+def run_regions(regions=None, runner=False, full=False, runner_args=None):
+    """Run the pipeline (or a pipeline runner) for each region in its own process
+
+    Regions share nothing but the code: each process has its own shard, models
+    and job queue, so a failing or backlogged region doesn't hold up the others.
+    Returns the names of the regions whose process failed.
+    """
+    regions = regions or list(load_regions())
+    # spawn gives every region a fresh interpreter instead of a copy of our state
+    context = multiprocessing.get_context('spawn')
+    processes = {
+        region: context.Process(target=_run_region, args=(region, runner, full, runner_args),
+                                name=f'pipeline-{region}')
+        for region in regions
+    }
+    for region, process in processes.items():
+        process.start()
+        print(f"Started {'runner' if runner else 'pipeline'} for {region} (pid {process.pid})")
+
+    failed = []
+    try:
+        for region, process in processes.items():
+            process.join()
+            if process.exitcode != 0:
+                failed.append(region)
+                print(f"Region {region} failed (exit code {process.exitcode})")
+            else:
+                print(f"Region {region} completed")
+    except KeyboardInterrupt:
+        for process in processes.values():
+            process.join()
+    return failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline for several regions in parallel, one process each")
+    parser.add_argument('--regions',
+                        help="comma separated regions to run (default: every configured region)")
+    parser.add_argument('--runner', action='store_true',
+                        help="start a long-running pipeline runner per region instead of a single run")
+    parser.add_argument('--full', action='store_true',
+                        help="run every stage, even those without new inputs")
+    parser.add_argument('--interval-hours', type=float, default=6,
+                        help="with --runner, queue a scheduled run this often (0 disables scheduling)")
+    args = parser.parse_args()
+
+    regions = [region.strip() for region in args.regions.split(',')] if args.regions else None
+    unknown = set(regions or []) - set(load_regions())
+    if unknown:
+        parser.error(f"unknown regions: {', '.join(sorted(unknown))}")
+    failed = run_regions(regions, runner=args.runner, full=args.full,
+                         runner_args={'interval_hours': args.interval_hours})
+    sys.exit(1 if failed else 0)
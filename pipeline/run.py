@@ -0,0 +1,129 @@
+import sys
+import os
+import argparse
+from functools import partial
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.models import setup_db
+from database.runs import start_run, finish_run
+from database.changes import prune_change_log, get_latest_version
+from database.search import optimize_search_index
+from database.snapshot import publish_snapshot, current_snapshot_path
+from database.archive import RETENTION_DAYS, run_archive
+from pipeline.engine import Stage, ANY_CHANGE, run_stages
+from monitoring.metrics import REGISTRY, record_peak_rss, run_summary
+from database.chunks import set_chunk_size
+from regions.config import activate_region
+from monitoring.profiling import enable_profiling, run_profile_dir
+from scraper.scrape import run_scraper
+from processing.preprocess import preprocess_articles, set_normalizer, NORMALIZERS
+from processing.ner import process_entities
+from processing.cluster import cluster_articles
+from processing.topic_model import extract_topics
+from summarization.summarize import generate_cluster_summaries
+from analysis.analytics_store import export_analytics_store
+from analysis.visualize import generate_all_visualizations, CHART_MODE
+
+# Pipeline stages and the change kinds that give each of them work. Preprocessing
+# and entity extraction are independent of each other, as are topics and summaries,
+# so each pair runs concurrently
+STAGES = [
+    Stage('scrape', run_scraper, deps=(), inputs=None),
+    Stage('preprocess', preprocess_articles, deps=('scrape',), inputs=('article_added',)),
+    Stage('ner', process_entities, deps=('scrape',), inputs=('article_added',)),
+    Stage('cluster', cluster_articles, deps=('preprocess', 'ner'),
+          inputs=('article_added', 'article_removed')),
+    Stage('topics', extract_topics, deps=('cluster',),
+          inputs=('article_added', 'article_removed', 'article_moved', 'cluster_added', 'cluster_removed')),
+    Stage('summarize', generate_cluster_summaries, deps=('cluster',),
+          inputs=('cluster_added', 'cluster_resized', 'summary_removed')),
+]
+
+def run_pipeline(progress=None, full=False, parallel=True):
+    """Run the stages of the data pipeline that have new inputs
+
+    progress, if given, is called as progress(stage, stages_done, stages_total, run_id)
+    before each group of stages and once more when the run is done. With full=True
+    every stage runs even if nothing changed since its last run.
+    """
+    print("Running data pipeline...")
+    session = setup_db()
+    run_id = start_run(session)
+    metrics_before = REGISTRY.snapshot()
+    start_version = get_latest_version(session)
+    stages = list(STAGES)
+    if RETENTION_DAYS:
+        # Archiving runs alongside the scraper, so the new articles are never the ones archived
+        stages.insert(1, Stage('archive', run_archive, deps=(), inputs=None))
+    # Analytics queries and charts aggregate over a columnar copy of the finished run
+    stages.append(Stage('analytics', export_analytics_store, deps=tuple(stage.name for stage in stages),
+                        inputs=ANY_CHANGE))
+    stages.append(Stage('charts', partial(generate_all_visualizations, run_id), deps=('analytics',),
+                        inputs=ANY_CHANGE))
+    total = len(stages)
+
+    def report(stage, stages_done, stages_total):
+        if progress:
+            progress(stage, stages_done, stages_total, run_id)
+
+    def refresh_chart_data(stages_done):
+        if CHART_MODE == 'data' and stages_done < total:
+            # Chart data is cheap to write, so the analytics page follows the run stage by stage.
+            # The analytics store is exported once, by its own stage; until then the series
+            # come from the live database
+            generate_all_visualizations(f"{run_id}-{stages_done}", from_store=False)
+
+    status = 'failed'
+    changed = False
+    try:
+        run_stages(session, stages, run_id=run_id, full=full, parallel=parallel,
+                   progress=report, after_wave=refresh_chart_data, profile_dir=run_profile_dir(run_id))
+
+        changed = get_latest_version(session) != start_version
+        if changed:
+            optimize_search_index(session)
+        prune_change_log(session)
+        session.commit()
+
+        report('done', total, total)
+        status = 'completed'
+    finally:
+        record_peak_rss('pipeline')
+        # Completing the run bumps the data version, which invalidates cached pages
+        finish_run(session, run_id, status=status, metrics=run_summary(REGISTRY.delta(metrics_before)))
+        session.close()
+
+    # Hand the finished run's data to the web tier as a fresh read-only snapshot
+    if changed or full or current_snapshot_path() is None:
+        publish_snapshot(run_id)
+
+    print("Pipeline completed at", datetime.now())
+    return run_id
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the data pipeline once")
+    parser.add_argument('--full', action='store_true',
+                        help="run every stage, even those without new inputs")
+    parser.add_argument('--serial', action='store_true',
+                        help="run independent stages one after another instead of concurrently")
+    parser.add_argument('--profile', nargs='?', const='all', metavar='MODES',
+                        help="profile every stage into profiles/run_<id>/ (cpu, memory, sampling; default cpu,memory)")
+    parser.add_argument('--chunk-size', type=int, metavar='ROWS',
+                        help="rows each stage loads at a time, bounding its memory use (default 500)")
+    parser.add_argument('--normalizer', choices=NORMALIZERS,
+                        help="text normalization for preprocessing: spacy, or the model-free fast path (default spacy)")
+    parser.add_argument('--region',
+                        help="region whose shard to work on (default EVENT_REGION, or the default region)")
+    args = parser.parse_args()
+    if args.region:
+        activate_region(args.region)
+    if args.profile:
+        enable_profiling(args.profile)
+    if args.chunk_size:
+        set_chunk_size(args.chunk_size)
+    if args.normalizer:
+        set_normalizer(args.normalizer)
+    # Recorded as a pipeline job, so it never overlaps a run of the pipeline runner
+    from pipeline.runner import run_once
+    sys.exit(0 if run_once(full=args.full, parallel=not args.serial) == 'completed' else 1)
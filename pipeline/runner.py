@@ -0,0 +1,152 @@
+import sys
+import os
+import time
+import argparse
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.models import setup_db
+from database.chunks import set_chunk_size
+from regions.config import activate_region
+from monitoring.profiling import enable_profiling
+from processing.preprocess import NORMALIZERS, set_normalizer
+from pipeline.jobs import (
+    enqueue_job, fail_stale_jobs, claim_next_job, start_job, running_job, heartbeat,
+    update_progress, finish_job, last_requested_at
+)
+
+HEARTBEAT_SECONDS = 30
+
+def _heartbeat_loop(job_id, stop):
+    """Keep the job's heartbeat fresh while a long stage is running"""
+    session = setup_db()
+    try:
+        while not stop.wait(HEARTBEAT_SECONDS):
+            heartbeat(session, job_id)
+    finally:
+        session.close()
+
+def run_job(session, job, full=False, parallel=True):
+    """Run the pipeline for a claimed job and record the outcome; returns the job's final status"""
+    # Imported here so the runner starts without loading the NLP models until there is work
+    from pipeline.run import run_pipeline
+
+    print(f"Starting pipeline job {job.id} ({job.trigger})")
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat_loop, args=(job.id, stop), daemon=True)
+    beat.start()
+
+    def progress(stage, stages_done, stages_total, run_id):
+        update_progress(session, job.id, stage, stages_done, stages_total, run_id)
+
+    try:
+        run_pipeline(progress=progress, full=full, parallel=parallel)
+        finish_job(session, job.id, 'completed')
+        print(f"Pipeline job {job.id} completed")
+        return 'completed'
+    except Exception as e:
+        traceback.print_exc()
+        session.rollback()
+        finish_job(session, job.id, 'failed', error=str(e))
+        print(f"Pipeline job {job.id} failed: {e}")
+        return 'failed'
+    except KeyboardInterrupt:
+        # Release the single-run lock now instead of when the job goes stale
+        session.rollback()
+        finish_job(session, job.id, 'failed', error="Interrupted")
+        raise
+    finally:
+        stop.set()
+        beat.join()
+
+def run_once(full=False, parallel=True):
+    """Run the pipeline once in this process, under the same single-run lock as the runner's jobs
+
+    Returns the job's final status, or None without running when another run
+    is already in progress on this shard.
+    """
+    session = setup_db()
+    try:
+        fail_stale_jobs(session)
+        job = start_job(session, os.getpid())
+        if job is None:
+            current = running_job(session)
+            print(f"Pipeline job {current.id if current else '?'} is already running; not starting another run")
+            return None
+        return run_job(session, job, full=full, parallel=parallel)
+    finally:
+        session.close()
+
+def schedule_due_job(session, interval):
+    """Queue a scheduled job when nothing was requested within the interval"""
+    last = last_requested_at(session)
+    if last is None or datetime.now() - last >= interval:
+        job = enqueue_job(session, trigger='schedule')
+        print(f"Scheduled pipeline job {job.id}")
+
+def run_runner(interval_hours=6, poll_seconds=5, once=False):
+    """Process pipeline jobs until interrupted
+
+    With once=True, runs at most one queued job and returns.
+    """
+    session = setup_db()
+    interval = timedelta(hours=interval_hours) if interval_hours else None
+    pid = os.getpid()
+    print(f"Pipeline runner started (pid {pid})")
+
+    try:
+        while True:
+            fail_stale_jobs(session)
+            if interval and not once:
+                schedule_due_job(session, interval)
+
+            job = claim_next_job(session, pid)
+            if job:
+                run_job(session, job)
+            if once:
+                break
+            if not job:
+                time.sleep(poll_seconds)
+    except KeyboardInterrupt:
+        print("Pipeline runner stopped")
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run queued pipeline jobs outside the web process")
+    parser.add_argument('--interval-hours', type=float, default=6,
+                        help="queue a scheduled run this often (0 disables scheduling)")
+    parser.add_argument('--poll-seconds', type=float, default=5,
+                        help="how often to check the queue for new jobs")
+    parser.add_argument('--once', action='store_true',
+                        help="run at most one queued job and exit")
+    parser.add_argument('--enqueue', action='store_true',
+                        help="queue a job before processing")
+    parser.add_argument('--profile', nargs='?', const='all', metavar='MODES',
+                        help="profile every stage of every run (cpu, memory, sampling; default cpu,memory)")
+    parser.add_argument('--chunk-size', type=int, metavar='ROWS',
+                        help="rows each stage loads at a time, bounding its memory use (default 500)")
+    parser.add_argument('--normalizer', choices=NORMALIZERS,
+                        help="text normalization for preprocessing: spacy, or the model-free fast path (default spacy)")
+    parser.add_argument('--region',
+                        help="region whose shard to work on (default EVENT_REGION, or the default region)")
+    args = parser.parse_args()
+    if args.region:
+        activate_region(args.region)
+
+    if args.profile:
+        enable_profiling(args.profile)
+    if args.chunk_size:
+        set_chunk_size(args.chunk_size)
+    if args.normalizer:
+        set_normalizer(args.normalizer)
+
+    if args.enqueue:
+        session = setup_db()
+        job = enqueue_job(session)
+        session.close()
+        print(f"Pipeline job {job.id} queued")
+
+    run_runner(args.interval_hours, args.poll_seconds, args.once)
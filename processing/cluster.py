@@ -10,68 +10,111 @@ from datetime import datetime
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database.models import Article, Cluster, setup_db
+from database.chunks import get_chunk_size, iter_chunks, iter_rows
+from database.entity_stats import ensure_entity_stats, record_cluster_moves
+from processing.lineage import match_clusters, next_cluster_id, apply_lineage
+from monitoring.metrics import MODEL_LOAD_SECONDS, STAGE_ITEMS
 
 def get_embeddings_tfidf(processed_texts):
-    """Get TF-IDF embeddings for articles"""
+    """Get TF-IDF embeddings for articles as a sparse matrix
+    
+    processed_texts may be any iterable; it is consumed in a single pass.
+    """
     vectorizer = TfidfVectorizer(max_features=5000)
     return vectorizer.fit_transform(processed_texts)
 
-def get_embeddings_transformer(processed_texts):
-    """Get sentence transformer embeddings for articles"""
-    model = SentenceTransformer('all-MiniLM-L6-v2')  # Smaller model for faster processing
-    return model.encode(processed_texts)
+def get_embeddings_transformer(processed_texts, chunk_size=None):
+    """Get sentence transformer embeddings for articles, encoding chunk_size texts at a time"""
+    with MODEL_LOAD_SECONDS.time(model='all-MiniLM-L6-v2'):
+        model = SentenceTransformer('all-MiniLM-L6-v2')  # Smaller model for faster processing
+    chunk_size = chunk_size or get_chunk_size()
+    batches, batch = [], []
+    for text in processed_texts:
+        batch.append(text)
+        if len(batch) == chunk_size:
+            batches.append(model.encode(batch))
+            batch = []
+    if batch:
+        batches.append(model.encode(batch))
+    return np.vstack(batches)
 
-def cluster_articles(embedding_type='tfidf', min_cluster_size=2):
+def cluster_articles(embedding_type='tfidf', min_cluster_size=2, chunk_size=None):
     """Cluster articles based on their content"""
     session = setup_db()
+    ensure_entity_stats(session)
     
-    # Get articles that have been preprocessed but not assigned to clusters
-    articles = session.query(Article).filter(
+    # Get articles that have been preprocessed; only the ids and current clusters are kept
+    # in memory, the texts are streamed straight into the vectorizer
+    processed = session.query(Article.id, Article.cluster_id, Article.processed_content).filter(
         Article.processed_content.isnot(None),
-    ).all()
+    )
+    article_ids, old_cluster_ids = [], []
+    
+    def processed_texts():
+        for article_id, cluster_id, processed_content in iter_rows(processed, Article.id, chunk_size):
+            article_ids.append(article_id)
+            old_cluster_ids.append(cluster_id)
+            yield processed_content
     
-    if len(articles) < min_cluster_size:
-        print(f"Not enough articles to form clusters. Found {len(articles)} articles.")
+    if processed.limit(min_cluster_size).count() < min_cluster_size:
+        print(f"Not enough articles to form clusters. Found {processed.count()} articles.")
         session.close()
         return
     
-    # Extract processed text and IDs
-    article_ids = [article.id for article in articles]
-    processed_texts = [article.processed_content for article in articles]
-    
     # Get embeddings
     if embedding_type == 'transformer':
-        embeddings = get_embeddings_transformer(processed_texts)
-        # Convert to numpy array if not already
-        embeddings = np.array(embeddings)
+        embeddings = get_embeddings_transformer(processed_texts(), chunk_size)
     else:  # Default to TF-IDF
-        embeddings = get_embeddings_tfidf(processed_texts)
-        # Convert sparse matrix to dense if using scikit-learn
-        if hasattr(embeddings, 'toarray'):
-            embeddings = embeddings.toarray()
+        # KMeans works on the sparse matrix directly, so it is never densified as a whole
+        embeddings = get_embeddings_tfidf(processed_texts())
     
     # Determine optimal number of clusters (simple heuristic)
-    n_clusters = max(2, min(10, len(processed_texts) // 4))
+    n_clusters = max(2, min(10, len(article_ids) // 4))
     
     # Perform clustering
     kmeans = KMeans(n_clusters=n_clusters, random_state=42)
     cluster_labels = kmeans.fit_predict(embeddings)
     
-    # Store embeddings and cluster assignments
-    for i, article_id in enumerate(article_ids):
-        article = session.query(Article).get(article_id)
-        if article:
-            article.cluster_id = int(cluster_labels[i])
+    # KMeans labels mean nothing across runs; match them to the previous clusters so
+    # topics, summaries and entity statistics stay attached to the same events
+    cluster_ids, overlaps, events = match_clusters(
+        embeddings, cluster_labels, kmeans.cluster_centers_, old_cluster_ids, next_cluster_id(session)
+    )
+    
+    # Store embeddings and cluster assignments, chunk_size rows at a time
+    moves = {}
+    chunk_size = chunk_size or get_chunk_size()
+    for start in range(0, len(article_ids), chunk_size):
+        end = min(start + chunk_size, len(article_ids))
+        rows = embeddings[start:end]
+        if hasattr(rows, 'toarray'):
+            rows = rows.toarray()
+        updates = []
+        for i in range(start, end):
+            new_cluster_id = cluster_ids[int(cluster_labels[i])]
+            if old_cluster_ids[i] != new_cluster_id:
+                moves[article_ids[i]] = (old_cluster_ids[i], new_cluster_id)
             # Store embedding as JSON string
-            article.embedding = json.dumps(embeddings[i].tolist())
+            updates.append({
+                'id': article_ids[i],
+                'cluster_id': new_cluster_id,
+                'embedding': json.dumps(rows[i - start].tolist())
+            })
+        session.bulk_update_mappings(Article, updates)
+    
+    # Shift entity statistics for articles that changed cluster
+    record_cluster_moves(session, moves)
     
     # Create or update cluster information
     cluster_counts = {}
     for label in cluster_labels:
-        label_int = int(label)
-        if label_int not in cluster_counts:
-            cluster_counts[label_int] = 0
-        cluster_counts[label_int] += 1
+        cluster_id = cluster_ids[int(label)]
+        if cluster_id not in cluster_counts:
+            cluster_counts[cluster_id] = 0
+        cluster_counts[cluster_id] += 1
+    
+    # Clusters that gained or lost articles count as updated even if their size is unchanged
+    changed_clusters = {cluster_id for move in moves.values() for cluster_id in move}
     
     for cluster_id, count in cluster_counts.items():
         cluster = session.query(Cluster).filter_by(id=cluster_id).first()
@@ -80,9 +123,15 @@ def cluster_articles(embedding_type='tfidf', min_cluster_size=2):
             session.add(cluster)
         else:
             cluster.article_count = count
+            if cluster_id in changed_clusters:
+                cluster.updated_date = datetime.now()
+    
+    # Record births, splits and merges, retire clusters that didn't continue
+    apply_lineage(session, cluster_ids, overlaps, events)
     
     session.commit()
     session.close()
+    STAGE_ITEMS.inc(len(article_ids), stage='cluster')
     
     print(f"Clustering complete! Created {n_clusters} clusters.")
 
@@ -0,0 +1,119 @@
+import re
+
+# A fast, model-free alternative to the spaCy normalization in processing.preprocess for
+# TF-IDF clustering: one combined regex pass per batch, whitespace tokenization, NLTK
+# stopwords and a rule-based lemmatizer whose results are cached per distinct word.
+# Used when EVENT_NORMALIZER=fast.
+
+# URLs, email addresses, punctuation and digits, removed in a single pass. The
+# alternatives are tried in this order, matching clean_text's sequence of passes
+CLEAN_PATTERN = re.compile(r'https?://\S+|www\.\S+|\S+@\S+|[^\w\s]|\d+')
+
+# Separates the documents of a batch; \x1e is whitespace to \s, so cleaning keeps it
+DOCUMENT_SEPARATOR = '\x1e'
+STRIP_SEPARATOR = str.maketrans(DOCUMENT_SEPARATOR, ' ')
+
+# Words the suffix rules would get wrong
+IRREGULAR_LEMMAS = {
+    'children': 'child', 'men': 'man', 'women': 'woman', 'feet': 'foot', 'teeth': 'tooth', 'mice': 'mouse',
+    'buses': 'bus', 'using': 'use', 'people': 'people', 'police': 'police', 'news': 'news',
+    'series': 'series', 'species': 'species',
+    'said': 'say', 'says': 'say', 'told': 'tell', 'made': 'make', 'took': 'take', 'taken': 'take',
+    'went': 'go', 'gone': 'go', 'came': 'come', 'found': 'find', 'got': 'get', 'gave': 'give',
+    'given': 'give', 'left': 'leave', 'held': 'hold', 'paid': 'pay', 'built': 'build', 'sent': 'send',
+    'spent': 'spend', 'brought': 'bring', 'thought': 'think', 'bought': 'buy', 'ran': 'run',
+    'began': 'begin', 'begun': 'begin', 'knew': 'know', 'known': 'know', 'saw': 'see', 'seen': 'see',
+    'won': 'win', 'lost': 'lose', 'met': 'meet', 'led': 'lead', 'fell': 'fall', 'fallen': 'fall',
+    'rose': 'rise', 'shot': 'shoot', 'struck': 'strike', 'kept': 'keep', 'felt': 'feel', 'heard': 'hear',
+    'meant': 'mean', 'sold': 'sell', 'stood': 'stand', 'understood': 'understand', 'wrote': 'write',
+    'written': 'write', 'chose': 'choose', 'chosen': 'choose', 'drove': 'drive', 'driven': 'drive',
+    'caught': 'catch', 'taught': 'teach', 'fought': 'fight', 'sought': 'seek', 'lit': 'light',
+    'became': 'become', 'grew': 'grow', 'grown': 'grow', 'drew': 'draw', 'drawn': 'draw',
+    'threw': 'throw', 'thrown': 'throw', 'flew': 'fly', 'flown': 'fly', 'broke': 'break', 'broken': 'break',
+    'spoke': 'speak', 'spoken': 'speak', 'stole': 'steal', 'stolen': 'steal', 'hit': 'hit', 'cut': 'cut',
+    'set': 'set', 'put': 'put', 'let': 'let', 'shut': 'shut', 'hurt': 'hurt', 'cost': 'cost',
+}
+
+# Endings that look like inflections but aren't
+NO_PLURAL_ENDINGS = ('ss', 'us', 'is', 'ous')
+
+VOWELS = set('aeiou')
+
+def _measure(stem):
+    """Number of vowel-consonant sequences in a stem (Porter's m)"""
+    measure = 0
+    previous_vowel = False
+    for char in stem:
+        vowel = char in VOWELS or (char == 'y' and not previous_vowel)
+        if previous_vowel and not vowel:
+            measure += 1
+        previous_vowel = vowel
+    return measure
+
+def _restore_stem(stem):
+    """Undo spelling changes made when adding -ing or -ed: runn -> run, mak -> make"""
+    if len(stem) > 2 and stem[-1] == stem[-2] and stem[-1] not in 'lsz' and stem[-1] not in VOWELS:
+        return stem[:-1]
+    if (len(stem) >= 3 and _measure(stem) == 1 and stem[-1] not in VOWELS and stem[-1] not in 'wxy'
+            and stem[-2] in VOWELS and stem[-3] not in VOWELS):
+        return stem + 'e'
+    if len(stem) == 2 and stem[0] in VOWELS and stem[1] not in VOWELS:
+        return stem + 'e'
+    return stem
+
+def lemmatize(word):
+    """Approximate a word's dictionary form from its inflectional suffix"""
+    lemma = IRREGULAR_LEMMAS.get(word)
+    if lemma:
+        return lemma
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith('ied') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith('eed'):
+        return word[:-1]
+    if word.endswith('ing') and len(word) > 5 and any(char in VOWELS for char in word[:-3]):
+        return _restore_stem(word[:-3])
+    if word.endswith('ed') and len(word) > 4 and any(char in VOWELS for char in word[:-2]):
+        return _restore_stem(word[:-2])
+    if word.endswith(('sses', 'ches', 'shes', 'xes', 'zzes')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(NO_PLURAL_ENDINGS) and len(word) > 3:
+        return word[:-1]
+    return word
+
+class FastNormalizer:
+    """Normalizes batches of documents without loading a language model
+
+    Every distinct word is classified once: dropped (stopword or shorter than
+    three letters) or mapped to its lemma. The cache grows with the corpus
+    vocabulary, which is small next to the corpus itself.
+    """
+
+    def __init__(self, stop_words):
+        self.stop_words = frozenset(stop_words)
+        self.tokens = {}
+
+    def _token(self, word):
+        token = self.tokens.get(word)
+        if token is None:
+            if len(word) <= 2 or word in self.stop_words:
+                token = ''
+            else:
+                token = lemmatize(word)
+                # A lemma can itself be a stopword ("having" -> "have") or too short
+                if len(token) <= 2 or token in self.stop_words:
+                    token = ''
+            self.tokens[word] = token
+        return token
+
+    def normalize_batch(self, texts):
+        """Normalize a list of documents, cleaning them all in one regex pass"""
+        batch = DOCUMENT_SEPARATOR.join((text or '').translate(STRIP_SEPARATOR) for text in texts)
+        documents = CLEAN_PATTERN.sub('', batch.lower()).split(DOCUMENT_SEPARATOR)
+        token = self._token
+        return [' '.join(filter(None, map(token, document.split()))) for document in documents]
+
+    def normalize(self, text):
+        """Normalize one document"""
+        return self.normalize_batch([text])[0]
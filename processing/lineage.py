@@ -0,0 +1,140 @@
+import sys
+import os
+import numpy as np
+from scipy import sparse
+from scipy.optimize import linear_sum_assignment
+from sklearn.metrics.pairwise import cosine_similarity
+from sqlalchemy import func
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.models import Cluster, ClusterLineage, Summary
+
+# A new cluster continues an old one when their combined score reaches MATCH_THRESHOLD.
+# The score weighs the Jaccard overlap of their articles against the cosine similarity
+# of their centroids, both measured in the current run's embedding space
+OVERLAP_WEIGHT = 0.6
+CENTROID_WEIGHT = 0.4
+MATCH_THRESHOLD = 0.3
+
+# A continued cluster whose articles overlap its previous ones less than this has
+# drifted too far for its summary to still describe it
+STALE_OVERLAP = 0.5
+
+def _membership(labels, n_columns):
+    """Sparse article x cluster indicator matrix; articles labelled -1 belong to no column"""
+    labels = np.asarray(labels)
+    rows = np.flatnonzero(labels >= 0)
+    return sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, labels[rows])), shape=(len(labels), n_columns)
+    )
+
+def match_clusters(embeddings, new_labels, new_centroids, old_cluster_ids, next_id):
+    """Carry persistent cluster ids over from the previous clustering to this run's labels
+
+    embeddings are the articles' current embeddings (dense or sparse), new_labels
+    and new_centroids this run's clustering, and old_cluster_ids each article's
+    cluster id before it (None if it had none). New clusters are matched to old
+    ones by an optimal one-to-one assignment on article overlap and centroid
+    similarity. Unmatched new clusters get ids from next_id on and are recorded
+    as born, or as split off the old cluster most of their articles came from;
+    unmatched old clusters are recorded as merged into the new cluster that took
+    most of their articles, or as ended.
+
+    Returns (ids, overlaps, events): the persistent id of every new label, the
+    article overlap of each continued id, and the lineage events.
+    """
+    new_labels = np.asarray(new_labels)
+    labels = np.unique(new_labels)
+    old_ids = sorted({cluster_id for cluster_id in old_cluster_ids if cluster_id is not None})
+    old_index = {cluster_id: j for j, cluster_id in enumerate(old_ids)}
+    old_labels = np.array([old_index.get(cluster_id, -1) for cluster_id in old_cluster_ids])
+
+    new_members = _membership(np.searchsorted(labels, new_labels), len(labels))
+    old_members = _membership(old_labels, len(old_ids))
+    new_sizes = np.asarray(new_members.sum(axis=0)).ravel()
+    old_sizes = np.asarray(old_members.sum(axis=0)).ravel()
+
+    ids, overlaps, events = {}, {}, []
+    matched_new, matched_old = set(), set()
+    if old_ids:
+        # Articles shared by every new/old pair, and their Jaccard overlap
+        shared = (new_members.T @ old_members).toarray()
+        jaccard = shared / (new_sizes[:, None] + old_sizes[None, :] - shared)
+
+        # Old centroids are the means of their articles' current embeddings, so both
+        # sides are compared in the same space even though TF-IDF refits its vocabulary
+        old_centroids = sparse.diags(1 / old_sizes) @ (old_members.T @ embeddings)
+        similarity = cosine_similarity(np.asarray(new_centroids)[labels], old_centroids)
+
+        score = OVERLAP_WEIGHT * jaccard + CENTROID_WEIGHT * similarity
+        for i, j in zip(*linear_sum_assignment(score, maximize=True)):
+            if score[i, j] >= MATCH_THRESHOLD:
+                ids[int(labels[i])] = old_ids[j]
+                overlaps[old_ids[j]] = float(jaccard[i, j])
+                matched_new.add(i)
+                matched_old.add(j)
+
+    for i, label in enumerate(labels):
+        if i in matched_new:
+            continue
+        ids[int(label)] = next_id
+        event = {'cluster_id': next_id, 'kind': 'born', 'other_cluster_id': None,
+                 'article_count': int(new_sizes[i]), 'similarity': None}
+        if old_ids and shared[i].any():
+            j = int(shared[i].argmax())
+            if j in matched_old:
+                event.update(kind='split', other_cluster_id=old_ids[j], similarity=float(score[i, j]))
+        events.append(event)
+        next_id += 1
+
+    for j, cluster_id in enumerate(old_ids):
+        if j in matched_old:
+            continue
+        event = {'cluster_id': cluster_id, 'kind': 'ended', 'other_cluster_id': None,
+                 'article_count': int(old_sizes[j]), 'similarity': None}
+        i = int(shared[:, j].argmax())
+        if shared[i, j] and i in matched_new:
+            event.update(kind='merged', other_cluster_id=ids[int(labels[i])], similarity=float(score[i, j]))
+        events.append(event)
+
+    return ids, overlaps, events
+
+def next_cluster_id(session):
+    """Lowest cluster id never handed out, so ids of ended clusters are not reused"""
+    highest = max(
+        session.query(func.max(Cluster.id)).scalar() or 0,
+        session.query(func.max(ClusterLineage.cluster_id)).scalar() or 0,
+        session.query(func.max(Summary.cluster_id)).scalar() or 0
+    )
+    return highest + 1
+
+def apply_lineage(session, ids, overlaps, events):
+    """Record lineage events, retire clusters that didn't continue and drop summaries that went stale
+
+    Returns the ids of the retired clusters.
+    """
+    # Clusters without a successor and the summaries written for them are removed, as are
+    # summaries of clusters whose articles changed too much; summarization redoes them
+    live_ids = set(ids.values())
+    retired = [cluster_id for (cluster_id,) in session.query(Cluster.id) if cluster_id not in live_ids]
+    # Clusters that had already lost all their articles end as well
+    recorded = {event['cluster_id'] for event in events}
+    events = events + [
+        {'cluster_id': cluster_id, 'kind': 'ended', 'other_cluster_id': None, 'article_count': 0, 'similarity': None}
+        for cluster_id in retired if cluster_id not in recorded
+    ]
+    session.bulk_insert_mappings(ClusterLineage, events)
+
+    stale = [cluster_id for cluster_id, overlap in overlaps.items() if overlap < STALE_OVERLAP]
+    if retired or stale:
+        session.query(Summary).filter(Summary.cluster_id.in_(retired + stale)).delete(synchronize_session=False)
+    if retired:
+        session.query(Cluster).filter(Cluster.id.in_(retired)).delete(synchronize_session=False)
+
+    for event in events:
+        if event['kind'] != 'born':
+            print(f"Cluster {event['cluster_id']} {event['kind']}"
+                  + (f" (cluster {event['other_cluster_id']})" if event['other_cluster_id'] is not None else ""))
+    if stale:
+        print(f"Summaries of clusters {', '.join(map(str, stale))} are out of date")
+    return retired
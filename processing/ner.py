@@ -4,10 +4,16 @@ import os
 from collections import Counter
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database.models import Article, Entity, setup_db
+from database.models import Article, EntityMention, STATE_DONE, STATE_FAILED, setup_db
+from database.chunks import iter_chunks
+from database.entity_dictionary import EntityInterner
+from database.entity_stats import ensure_entity_stats, record_article_entities
+from database.search import index_article_entities
+from monitoring.metrics import MODEL_LOAD_SECONDS, STAGE_ITEMS
 
 # Load spaCy model with NER
-nlp = spacy.load('en_core_web_sm')
+with MODEL_LOAD_SECONDS.time(model='en_core_web_sm'):
+    nlp = spacy.load('en_core_web_sm')
 
 def extract_entities(text):
     """Extract named entities from text using spaCy"""
@@ -27,38 +33,67 @@ def extract_entities(text):
     
     return entities
 
-def process_entities():
-    """Extract entities from all articles in the database"""
+def process_entities(chunk_size=None):
+    """Extract entities from all pending articles in the database, committing every chunk_size articles
+    
+    Each commit is a checkpoint: a crashed run resumes after the last committed chunk.
+    """
     session = setup_db()
+    ensure_entity_stats(session)
+    # Mentions are stored as entity dictionary ids; each distinct entity is looked up once per run
+    interner = EntityInterner()
     
-    # Get articles that haven't been processed for entities yet
-    articles = session.query(Article).outerjoin(Entity).filter(Entity.id.is_(None)).all()
+    # Get articles that haven't been processed for entities yet, loading only the columns needed.
+    # The state column also covers articles without any entities, which are never re-parsed.
+    pending = session.query(
+        Article.id, Article.title, Article.content, Article.cluster_id
+    ).filter(Article.ner_state.is_(None))
+    total = pending.count()
     
-    print(f"Found {len(articles)} articles to extract entities from")
+    print(f"Found {total} articles to extract entities from")
     
-    for article in articles:
-        try:
-            # Combine title and content for entity extraction
-            full_text = f"{article.title} {article.content}"
-            entities = extract_entities(full_text)
-            
-            # Count entity occurrences
-            entity_counter = Counter([(e['text'], e['label']) for e in entities])
+    done = 0
+    for chunk in iter_chunks(pending, Article.id, chunk_size):
+        # Extract a whole chunk before writing, so the write transaction stays short while
+        # other pipeline stages are running concurrently
+        extracted = []
+        states = []
+        for article_id, title, content, cluster_id in chunk:
+            try:
+                # Combine title and content for entity extraction
+                full_text = f"{title} {content}"
+                entities = extract_entities(full_text)
+                
+                # Count entity occurrences
+                extracted.append((article_id, title, cluster_id, Counter([(e['text'], e['label']) for e in entities])))
+                states.append({'id': article_id, 'ner_state': STATE_DONE})
+            except Exception as e:
+                # Recorded so the article isn't retried on every run; clear the state to retry it
+                states.append({'id': article_id, 'ner_state': STATE_FAILED})
+                print(f"Error extracting entities from article {article_id}: {e}")
+        
+        # New entities of the whole chunk are added to the dictionary in one batch
+        interner.resolve(session, {mention for _, _, _, entity_counter in extracted for mention in entity_counter})
+        for article_id, title, cluster_id, entity_counter in extracted:
+            entity_counts = interner.intern_counts(session, entity_counter)
+            session.bulk_insert_mappings(EntityMention, [
+                {'article_id': article_id, 'entity_id': entity_id, 'count': count}
+                for entity_id, count in entity_counts.items()
+            ])
             
-            for (entity_text, entity_label), count in entity_counter.items():
-                entity = Entity(
-                    article_id=article.id,
-                    text=entity_text,
-                    label=entity_label,
-                    count=count
-                )
-                session.add(entity)
+            # Keep the per-cluster entity statistics in step with the new rows
+            record_article_entities(session, cluster_id, entity_counts)
+            index_article_entities(session, article_id, [text for text, _ in entity_counter])
             
-            print(f"Extracted {len(entity_counter)} unique entities from article: {article.title[:50]}...")
-        except Exception as e:
-            print(f"Error extracting entities from article {article.id}: {e}")
+            STAGE_ITEMS.inc(stage='ner')
+            print(f"Extracted {len(entity_counts)} unique entities from article: {title[:50]}...")
+        
+        # The entities and the articles' states are committed together
+        session.bulk_update_mappings(Article, states)
+        session.commit()
+        done += len(chunk)
+        print(f"Checkpoint: extracted entities from {done}/{total} articles")
     
-    session.commit()
     session.close()
     
     print("Entity extraction complete!")
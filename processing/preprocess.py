@@ -1,4 +1,3 @@
-import spacy
 import sys
 import os
 import json
@@ -7,11 +6,39 @@ from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database.models import Article, setup_db
+from database.models import Article, STATE_DONE, STATE_FAILED, setup_db
+from database.chunks import iter_chunks
+from monitoring.metrics import MODEL_LOAD_SECONDS, STAGE_ITEMS
+from processing.fast_normalize import FastNormalizer
+
+# Normalization engines for the preprocess stage: 'spacy' lemmatizes with the full
+# spaCy pipeline, 'fast' with the model-free FastNormalizer, which is all TF-IDF
+# clustering needs. EVENT_NORMALIZER selects one
+NORMALIZERS = ('spacy', 'fast')
+DEFAULT_NORMALIZER = 'spacy'
 
-# Load spaCy model
-nlp = spacy.load('en_core_web_sm')
 stop_words = set(stopwords.words('english'))
+_nlp = None
+
+def get_nlp():
+    """Load the spaCy model on first use, so runs with the fast normalizer need no spaCy at all"""
+    global _nlp
+    if _nlp is None:
+        import spacy
+        with MODEL_LOAD_SECONDS.time(model='en_core_web_sm'):
+            _nlp = spacy.load('en_core_web_sm')
+    return _nlp
+
+def get_normalizer():
+    """Get the normalization engine the preprocess stage uses"""
+    normalizer = os.environ.get('EVENT_NORMALIZER') or DEFAULT_NORMALIZER
+    if normalizer not in NORMALIZERS:
+        raise ValueError(f"Unknown normalizer {normalizer!r}; expected one of {', '.join(NORMALIZERS)}")
+    return normalizer
+
+def set_normalizer(normalizer):
+    """Set the normalizer for this process and the worker processes it starts"""
+    os.environ['EVENT_NORMALIZER'] = normalizer
 
 def clean_text(text):
     """Basic text cleaning"""
@@ -42,7 +69,7 @@ def preprocess_text(text):
     text = clean_text(text)
     
     # Process with spaCy
-    doc = nlp(text)
+    doc = get_nlp()(text)
     
     # Extract lemmas, excluding stopwords and punctuation
     tokens = [token.lemma_.lower() for token in doc 
@@ -50,27 +77,57 @@ def preprocess_text(text):
     
     return " ".join(tokens)
 
-def preprocess_articles():
-    """Preprocess all articles in the database"""
+def preprocess_articles(chunk_size=None):
+    """Preprocess all pending articles in the database, committing every chunk_size articles
+    
+    Each commit is a checkpoint: a crashed run resumes after the last committed chunk.
+    """
     session = setup_db()
     
-    # Get articles that haven't been processed yet
-    articles = session.query(Article).filter(Article.processed_content.is_(None)).all()
+    # Get articles that haven't been processed yet, loading only the columns needed
+    pending = session.query(Article.id, Article.title, Article.content).filter(Article.preprocess_state.is_(None))
+    total = pending.count()
+    
+    normalizer = get_normalizer()
+    fast = FastNormalizer(stop_words) if normalizer == 'fast' else None
     
-    print(f"Found {len(articles)} articles to preprocess")
+    print(f"Found {total} articles to preprocess ({normalizer} normalizer)")
     
-    for article in articles:
-        try:
-            # Combine title and content for preprocessing
-            full_text = f"{article.title} {article.content}"
-            processed_text = preprocess_text(full_text)
-            
-            article.processed_content = processed_text
-            print(f"Preprocessed article: {article.title[:50]}...")
-        except Exception as e:
-            print(f"Error preprocessing article {article.id}: {e}")
+    done = 0
+    for chunk in iter_chunks(pending, Article.id, chunk_size):
+        # The fast normalizer cleans a whole chunk in one pass
+        normalized = None
+        if fast:
+            try:
+                normalized = fast.normalize_batch([f"{title} {content}" for _, title, content in chunk])
+            except Exception as e:
+                # Falls back to one article at a time below, so only the offending article fails
+                print(f"Error normalizing chunk, retrying article by article: {e}")
+        processed = []
+        for i, (article_id, title, content) in enumerate(chunk):
+            try:
+                # Combine title and content for preprocessing
+                full_text = f"{title} {content}"
+                if normalized is not None:
+                    processed_text = normalized[i]
+                elif fast:
+                    processed_text = fast.normalize(full_text)
+                else:
+                    processed_text = preprocess_text(full_text)
+                processed.append({'id': article_id, 'processed_content': processed_text, 'preprocess_state': STATE_DONE})
+                STAGE_ITEMS.inc(stage='preprocess')
+                print(f"Preprocessed article: {title[:50]}...")
+            except Exception as e:
+                # Recorded so the article isn't retried on every run; clear the state to retry it
+                processed.append({'id': article_id, 'preprocess_state': STATE_FAILED})
+                print(f"Error preprocessing article {article_id}: {e}")
+        
+        # Commit each chunk with its state, so neither its text nor the write transaction outlives it
+        session.bulk_update_mappings(Article, processed)
+        session.commit()
+        done += len(chunk)
+        print(f"Checkpoint: preprocessed {done}/{total} articles")
     
-    session.commit()
     session.close()
     
     print("Preprocessing complete!")
@@ -7,23 +7,28 @@ from sklearn.feature_extraction.text import CountVectorizer
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database.models import Article, Cluster, setup_db
+from database.chunks import iter_rows
+from monitoring.metrics import STAGE_ITEMS
 
-def extract_topics():
+def extract_topics(chunk_size=None):
     """Extract topics from articles using BERTopic"""
     session = setup_db()
     
-    # Get all articles with processed content
-    articles = session.query(Article).filter(Article.processed_content.isnot(None)).all()
+    # Get all articles with processed content; BERTopic needs every document at once, so
+    # only the processed text and cluster id are loaded, chunk_size rows at a time
+    processed = session.query(Article.id, Article.cluster_id, Article.processed_content).filter(
+        Article.processed_content.isnot(None)
+    )
+    cluster_ids, processed_texts = [], []
+    for _, cluster_id, processed_content in iter_rows(processed, Article.id, chunk_size):
+        cluster_ids.append(cluster_id)
+        processed_texts.append(processed_content)
     
-    if len(articles) < 5:  # Need a minimum number of documents
-        print(f"Not enough articles for topic modeling. Found {len(articles)} articles.")
+    if len(processed_texts) < 5:  # Need a minimum number of documents
+        print(f"Not enough articles for topic modeling. Found {len(processed_texts)} articles.")
         session.close()
         return
     
-    # Prepare data
-    article_ids = [article.id for article in articles]
-    processed_texts = [article.processed_content for article in articles]
-    
     # Load custom vectorizer with English stop words
     vectorizer = CountVectorizer(stop_words="english")
     
@@ -35,19 +40,19 @@ def extract_topics():
         # Get topic information
         topic_info = topic_model.get_topic_info()
         
+        # Each cluster takes the topic of its last article that isn't an outlier (-1)
+        cluster_topics = {}
+        for cluster_id, topic_id in zip(cluster_ids, topics):
+            if cluster_id is not None and topic_id != -1:
+                cluster_topics[cluster_id] = topic_id
+        
         # Update cluster topics in database
-        for i, article_id in enumerate(article_ids):
-            article = session.query(Article).get(article_id)
-            if article and article.cluster_id is not None:
-                cluster = session.query(Cluster).filter_by(id=article.cluster_id).first()
-                if cluster:
-                    topic_id = topics[i]
-                    if topic_id != -1:  # -1 is the outlier topic
-                        topic_words = topic_model.get_topic(topic_id)
-                        topic_label = ", ".join([word for word, _ in topic_words[:5]])
-                        cluster.topic = topic_label
+        for cluster in session.query(Cluster).filter(Cluster.id.in_(list(cluster_topics))):
+            topic_words = topic_model.get_topic(cluster_topics[cluster.id])
+            cluster.topic = ", ".join([word for word, _ in topic_words[:5]])
         
         session.commit()
+        STAGE_ITEMS.inc(len(processed_texts), stage='topics')
         print(f"Topic modeling complete! Extracted topics using BERTopic.")
     except Exception as e:
         print(f"Error in topic modeling: {e}")
@@ -0,0 +1,108 @@
+import os
+import re
+import json
+import contextvars
+from contextlib import contextmanager
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Every region except the default keeps its database, snapshots and archive in shards/<region>/;
+# the default region keeps the original single-region locations
+SHARDS_DIR = os.environ.get('EVENT_SHARDS_DIR') or os.path.join(REPO_DIR, 'shards')
+DEFAULT_REGION = 'seattle'
+
+# Extra or overriding regions are read from this JSON file: {"<region>": {"name", "feeds", "gazetteer"}}
+REGIONS_FILE = os.environ.get('EVENT_REGIONS_FILE') or os.path.join(REPO_DIR, 'regions.json')
+
+# Region names appear in paths and URLs
+REGION_NAME = re.compile(r'^[a-z0-9][a-z0-9_-]*$')
+
+# A region is a metro area: the feeds scraped for it and the place names (gazetteer)
+# that mark an article from a general feed as local news. Feeds with local_only are
+# filtered through the gazetteer.
+REGIONS = {
+    'seattle': {
+        'name': 'Seattle',
+        'feeds': [
+            {'source': 'Seattle PI', 'url': 'https://www.seattlepi.com/rss/feed/Seattle-News-145.php', 'local_only': True},
+            {'source': 'KOMO News', 'url': 'https://komonews.com/feed/rss2/news/local', 'local_only': True},
+            {'source': 'MyNorthwest', 'url': 'https://mynorthwest.com/feed/', 'local_only': True},
+            {'source': 'KING5 News', 'url': 'https://www.king5.com/feeds/syndication/rss/news/local', 'local_only': True},
+            {'source': 'Seattle Medium', 'url': 'https://seattlemedium.com/category/news/feed/'},
+            {'source': 'The Stranger', 'url': 'https://www.thestranger.com/syndication/rss-feed-with-images', 'local_only': True},
+            {'source': 'Crosscut', 'url': 'https://crosscut.com/feed/', 'local_only': True},
+            {'source': 'South Seattle Emerald', 'url': 'https://southseattleemerald.com/feed/', 'local_only': True},
+            {'source': 'Capitol Hill Seattle Blog', 'url': 'https://www.capitolhillseattle.com/feed/', 'local_only': True},
+            {'source': 'Google News - Seattle',
+             'url': 'https://news.google.com/rss/search?q=seattle+washington+news&hl=en-US&gl=US&ceid=US:en',
+             'limit': 10, 'local_only': True},
+        ],
+        'gazetteer': [
+            'seattle', 'washington', 'tacoma', 'bellevue', 'everett', 'olympia',
+            'kirkland', 'redmond', 'renton', 'kent', 'federal way', 'auburn',
+            'bothell', 'issaquah', 'sammamish', 'burien', 'tukwila', 'mercer island',
+            'shoreline', 'lake washington', 'puget sound', 'king county', 'pierce county',
+            'snohomish county', 'sound transit', 'space needle', 'pike place', 'seahawks',
+            'mariners', 'uw', 'university of washington', 'washington state', 'wsu'
+        ],
+    },
+}
+
+_regions = None
+
+def load_regions():
+    """Get every configured region: the built-in ones plus those in the regions file"""
+    global _regions
+    if _regions is None:
+        regions = dict(REGIONS)
+        if os.path.exists(REGIONS_FILE):
+            with open(REGIONS_FILE) as f:
+                regions.update(json.load(f))
+        for name in regions:
+            if not REGION_NAME.match(name):
+                raise ValueError(f"Invalid region name {name!r}: use lowercase letters, digits, '-' and '_'")
+        _regions = regions
+    return _regions
+
+# The region a request or pipeline process works on. Web requests set it per request;
+# pipeline processes inherit it from EVENT_REGION
+_current_region = contextvars.ContextVar('event_region', default=None)
+
+def get_region():
+    """Get the name of the region being worked on"""
+    return _current_region.get() or os.environ.get('EVENT_REGION') or DEFAULT_REGION
+
+def get_region_config(region=None):
+    """Get a region's configuration; raises KeyError for an unknown region"""
+    region = region or get_region()
+    try:
+        return load_regions()[region]
+    except KeyError:
+        raise KeyError(f"Unknown region {region!r}") from None
+
+def set_region(region):
+    """Switch the current context (thread or request) to a region"""
+    get_region_config(region)
+    _current_region.set(region)
+
+@contextmanager
+def use_region(region):
+    """Work on a region for the duration of the block"""
+    get_region_config(region)
+    token = _current_region.set(region)
+    try:
+        yield
+    finally:
+        _current_region.reset(token)
+
+def activate_region(region):
+    """Work on a region for the rest of this process and in the processes it starts"""
+    get_region_config(region)
+    os.environ['EVENT_REGION'] = region
+
+def region_path(default_path, *parts):
+    """Location of per-region data: default_path for the default region, shards/<region>/<parts> otherwise"""
+    region = get_region()
+    if region == DEFAULT_REGION:
+        return default_path
+    return os.path.join(SHARDS_DIR, region, *parts)
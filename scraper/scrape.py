@@ -23,8 +23,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger('scraper')
 
+# Random delay between requests to the same site, to be respectful
+REQUEST_DELAY_SECONDS = (1, 3)
+
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database.models import Article, setup_db
+from database.archive import is_archived_url
+from regions.config import DEFAULT_REGION, get_region, get_region_config
+from monitoring.metrics import SCRAPE_FETCH_SECONDS, SCRAPE_ARTICLES, SCRAPE_ERRORS, STAGE_ITEMS
 
 def clean_text(text):
     if not text:
@@ -68,17 +74,10 @@ def get_random_user_agent():
     ]
     return random.choice(user_agents)
 
-def is_local_seattle_news(article_title, article_content):
-    """Determine if an article is about local Seattle/Washington news"""
-    # List of local terms to check for
-    local_terms = [
-        'seattle', 'washington', 'tacoma', 'bellevue', 'everett', 'olympia', 
-        'kirkland', 'redmond', 'renton', 'kent', 'federal way', 'auburn', 
-        'bothell', 'issaquah', 'sammamish', 'burien', 'tukwila', 'mercer island',
-        'shoreline', 'lake washington', 'puget sound', 'king county', 'pierce county',
-        'snohomish county', 'sound transit', 'space needle', 'pike place', 'seahawks',
-        'mariners', 'uw', 'university of washington', 'washington state', 'wsu'
-    ]
+def is_local_news(article_title, article_content, local_terms=None):
+    """Determine if an article is about local news, using the region's gazetteer by default"""
+    if local_terms is None:
+        local_terms = get_region_config()['gazetteer']
     
     # Convert to lowercase for case-insensitive matching
     title_lower = article_title.lower()
@@ -98,11 +97,12 @@ def is_local_seattle_news(article_title, article_content):
     return False
 
 def scrape_rss_feed(session, feed_url, source_name, limit=15, local_only=False):
-    """Scrape news from an RSS feed"""
+    """Scrape news from an RSS feed; with local_only, keeps only articles that match the region's gazetteer"""
     logger.info(f"Fetching RSS feed from {feed_url} for {source_name}...")
     
     try:
-        feed = feedparser.parse(feed_url)
+        with SCRAPE_FETCH_SECONDS.time(source=source_name, kind='feed'):
+            feed = feedparser.parse(feed_url)
         
         if not feed.entries:
             logger.warning(f"No entries found in RSS feed for {source_name}")
@@ -126,9 +126,9 @@ def scrape_rss_feed(session, feed_url, source_name, limit=15, local_only=False):
                     logger.info(f"Skipping article in category {categories}: {article_url}")
                     continue
             
-            # Check if article already exists in DB
-            existing = session.query(Article).filter_by(url=article_url).first()
-            if existing:
+            # Check if article already exists in DB, live or archived
+            existing = session.query(Article.id).filter_by(url=article_url).first()
+            if existing or is_archived_url(session, article_url):
                 logger.debug(f"{source_name}: Skipping existing article: {article_url}")
                 continue
             
@@ -149,7 +149,8 @@ def scrape_rss_feed(session, feed_url, source_name, limit=15, local_only=False):
             
             # If content from RSS is very short, try to extract the full article
             if len(content) < 300:
-                article_data = extract_article(article_url)
+                with SCRAPE_FETCH_SECONDS.time(source=source_name, kind='article'):
+                    article_data = extract_article(article_url)
                 if article_data and article_data.get('content'):
                     # Use data from article extraction
                     content = article_data['content']
@@ -165,9 +166,9 @@ def scrape_rss_feed(session, feed_url, source_name, limit=15, local_only=False):
                 logger.info(f"{source_name}: Content too short, skipping: {article_url}")
                 continue
             
-            # Check if it's relevant to Seattle/Washington if local_only flag is set
-            if local_only and not is_local_seattle_news(title, content):
-                logger.info(f"{source_name}: Not related to Seattle/Washington, skipping: {title}")
+            # Check if it's relevant to the region if local_only flag is set
+            if local_only and not is_local_news(title, content):
+                logger.info(f"{source_name}: Not related to {get_region_config().get('name', get_region())}, skipping: {title}")
                 continue
                 
             new_article = Article(
@@ -184,66 +185,18 @@ def scrape_rss_feed(session, feed_url, source_name, limit=15, local_only=False):
             logger.info(f"{source_name}: Added article: {title}")
             
             # Random delay between 1-3 seconds to be respectful
-            time.sleep(random.uniform(1, 3))
+            time.sleep(random.uniform(*REQUEST_DELAY_SECONDS))
         
         session.commit()
+        SCRAPE_ARTICLES.inc(len(articles), source=source_name)
         logger.info(f"Scraped {len(articles)} new articles from {source_name}")
         return len(articles)
     except Exception as e:
         logger.error(f"Error scraping {source_name} RSS feed: {e}")
+        SCRAPE_ERRORS.inc(source=source_name)
         session.rollback()
         return 0
 
-def scrape_seattle_pi_rss(session):
-    """Scrape Seattle PI RSS feed"""
-    feed_url = "https://www.seattlepi.com/rss/feed/Seattle-News-145.php"
-    return scrape_rss_feed(session, feed_url, "Seattle PI", local_only=True)
-
-def scrape_komo_rss(session):
-    """Scrape KOMO News RSS feed"""
-    feed_url = "https://komonews.com/feed/rss2/news/local"
-    return scrape_rss_feed(session, feed_url, "KOMO News", local_only=True)
-
-def scrape_my_northwest_rss(session):
-    """Scrape MyNorthwest RSS feed"""
-    feed_url = "https://mynorthwest.com/feed/"
-    return scrape_rss_feed(session, feed_url, "MyNorthwest", local_only=True)
-
-def scrape_king5_rss(session):
-    """Scrape KING5 News RSS feed"""
-    feed_url = "https://www.king5.com/feeds/syndication/rss/news/local"
-    return scrape_rss_feed(session, feed_url, "KING5 News", local_only=True)
-
-def scrape_seattle_medium_rss(session):
-    """Scrape The Seattle Medium RSS feed"""
-    feed_url = "https://seattlemedium.com/category/news/feed/"
-    return scrape_rss_feed(session, feed_url, "Seattle Medium")
-
-def scrape_the_stranger_rss(session):
-    """Scrape The Stranger RSS feed"""
-    feed_url = "https://www.thestranger.com/syndication/rss-feed-with-images"
-    return scrape_rss_feed(session, feed_url, "The Stranger", local_only=True)
-
-def scrape_crosscut_rss(session):
-    """Scrape Crosscut RSS feed"""
-    feed_url = "https://crosscut.com/feed/"
-    return scrape_rss_feed(session, feed_url, "Crosscut", local_only=True)
-
-def scrape_south_seattle_emerald_rss(session):
-    """Scrape South Seattle Emerald RSS feed"""
-    feed_url = "https://southseattleemerald.com/feed/"
-    return scrape_rss_feed(session, feed_url, "South Seattle Emerald", local_only=True)
-
-def scrape_capitol_hill_seattle_rss(session):
-    """Scrape Capitol Hill Seattle Blog RSS feed"""
-    feed_url = "https://www.capitolhillseattle.com/feed/"
-    return scrape_rss_feed(session, feed_url, "Capitol Hill Seattle Blog", local_only=True)
-
-def scrape_local_google_news(session):
-    """Scrape Google News for Seattle news"""
-    feed_url = "https://news.google.com/rss/search?q=seattle+washington+news&hl=en-US&gl=US&ceid=US:en"
-    return scrape_rss_feed(session, feed_url, "Google News - Seattle", limit=10, local_only=True)
-
 def create_sample_articles(session):
     """Create sample articles if no articles were scraped"""
     count = session.query(Article).count()
@@ -386,33 +339,27 @@ def run_scraper():
     # Track total articles scraped
     total_articles = 0
     
-    # Try scraping from multiple RSS feeds
-    rss_sources = [
-        scrape_seattle_pi_rss,
-        scrape_komo_rss,
-        scrape_my_northwest_rss,
-        scrape_king5_rss,
-        scrape_seattle_medium_rss,
-        scrape_the_stranger_rss,
-        scrape_crosscut_rss,
-        scrape_south_seattle_emerald_rss,
-        scrape_capitol_hill_seattle_rss,
-        scrape_local_google_news
-    ]
-    
-    for source_func in rss_sources:
+    # Try scraping from every RSS feed configured for the region
+    region = get_region()
+    for feed in get_region_config(region)['feeds']:
         try:
             # Add a small delay between different sources
-            time.sleep(random.uniform(1, 3))
-            articles_scraped = source_func(session)
+            time.sleep(random.uniform(*REQUEST_DELAY_SECONDS))
+            articles_scraped = scrape_rss_feed(
+                session, feed['url'], feed['source'],
+                limit=feed.get('limit', 15), local_only=feed.get('local_only', False)
+            )
             total_articles += articles_scraped if articles_scraped else 0
         except Exception as e:
-            logger.error(f"Error in {source_func.__name__}: {e}")
+            logger.error(f"Error scraping {feed['source']}: {e}")
     
     # Create sample articles if no real articles were successfully scraped
-    if total_articles == 0:
+    # (the sample articles are Seattle stories)
+    if total_articles == 0 and region == DEFAULT_REGION:
         create_sample_articles(session)
     
+    STAGE_ITEMS.inc(total_articles, stage='scrape')
+    
     # Log final count
     article_count = session.query(Article).count()
     logger.info(f"Scraper completed. Total articles in database: {article_count}")
@@ -1,18 +1,23 @@
 import sys
 import os
 import torch
+from datetime import datetime
 from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
 from sqlalchemy import func
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database.models import Article, Cluster, Summary, setup_db
+from database.entity_stats import top_entities
+from database.chunks import iter_rows
+from monitoring.metrics import MODEL_LOAD_SECONDS, STAGE_ITEMS
 
 def load_summarizer():
     """Load the summarization model"""
     # Use smaller model for resource efficiency
     model_name = "facebook/bart-large-cnn"
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+    with MODEL_LOAD_SECONDS.time(model=model_name):
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
     
     # Use GPU if available
     device = 0 if torch.cuda.is_available() else -1
@@ -20,25 +25,12 @@ def load_summarizer():
     
     return summarizer
 
-def get_top_entities(session, article_ids, limit=10):
+def get_top_entities(session, cluster_id, limit=10):
     """Get top entities mentioned in a cluster of articles"""
-    from sqlalchemy import func
-    from database.models import Entity
-    
-    # Query to get the most frequent entities across the articles
-    top_entities = session.query(
-        Entity.text, Entity.label, func.sum(Entity.count).label('total_count')
-    ).filter(
-        Entity.article_id.in_(article_ids)
-    ).group_by(
-        Entity.text, Entity.label
-    ).order_by(
-        func.sum(Entity.count).desc()
-    ).limit(limit).all()
-    
-    return top_entities
+    # Read from the materialized per-cluster statistics instead of aggregating entities
+    return top_entities(session, cluster_id, limit=limit)
 
-def generate_cluster_summaries():
+def generate_cluster_summaries(chunk_size=None):
     """Generate summaries for each cluster"""
     session = setup_db()
     
@@ -50,67 +42,76 @@ def generate_cluster_summaries():
         session.close()
         return
     
+    summarized = {row.cluster_id for row in session.query(Summary.cluster_id)}
+    
     try:
         summarizer = load_summarizer()
         
-        for cluster in clusters:
-            # Check if summary already exists
-            existing_summary = session.query(Summary).filter_by(cluster_id=cluster.id).first()
-            if existing_summary:
-                print(f"Summary for cluster {cluster.id} already exists.")
-                continue
-            
-            # Get all articles in this cluster
-            articles = session.query(Article).filter_by(cluster_id=cluster.id).all()
-            article_ids = [article.id for article in articles]
-            
-            if len(articles) < 2:
-                continue
-            
-            # Get top entities
-            top_entities = get_top_entities(session, article_ids, limit=5)
-            entity_text = ""
-            if top_entities:
-                persons = [e.text for e in top_entities if e.label == "PERSON"][:2]
-                locations = [e.text for e in top_entities if e.label == "LOC" or e.label == "GPE"][:2]
-                organizations = [e.text for e in top_entities if e.label == "ORG"][:2]
+        # Pending summaries are only flushed at commit, so the write transaction doesn't
+        # stay open while the model runs alongside other pipeline stages
+        with session.no_autoflush:
+            for cluster in clusters:
+                # Check if summary already exists
+                if cluster.id in summarized:
+                    print(f"Summary for cluster {cluster.id} already exists.")
+                    continue
+                
+                # Prepare text for summarization, reading only as many articles as fit
+                max_length = 4000  # Characters, not tokens, but a safe estimate
+                articles = session.query(
+                    Article.id, Article.title, func.substr(Article.content, 1, 500)
+                ).filter_by(cluster_id=cluster.id)
+                combined_text = ""
+                article_count = 0
+                for _, title, content in iter_rows(articles, Article.id, chunk_size):
+                    combined_text += f"{title}. {content or ''} "
+                    article_count += 1
+                    if len(combined_text) > max_length and article_count >= 2:
+                        break
                 
+                if article_count < 2:
+                    continue
+                
+                # Get top entities
+                cluster_entities = get_top_entities(session, cluster.id, limit=5)
                 entity_text = ""
-                if persons:
-                    entity_text += f"People: {', '.join(persons)}. "
-                if locations:
-                    entity_text += f"Locations: {', '.join(locations)}. "
-                if organizations:
-                    entity_text += f"Organizations: {', '.join(organizations)}. "
-            
-            # Prepare text for summarization
-            combined_text = ""
-            for article in articles:
-                combined_text += f"{article.title}. {article.content[:500]} "
-            
-            # Truncate to fit model's max input length (typically 1024 tokens)
-            max_length = 4000  # Characters, not tokens, but a safe estimate
-            if len(combined_text) > max_length:
-                combined_text = combined_text[:max_length]
-            
-            # Generate summary
-            try:
-                summary = summarizer(combined_text, max_length=150, min_length=30, do_sample=False)[0]['summary_text']
+                if cluster_entities:
+                    persons = [e.text for e in cluster_entities if e.label == "PERSON"][:2]
+                    locations = [e.text for e in cluster_entities if e.label == "LOC" or e.label == "GPE"][:2]
+                    organizations = [e.text for e in cluster_entities if e.label == "ORG"][:2]
+                    
+                    entity_text = ""
+                    if persons:
+                        entity_text += f"People: {', '.join(persons)}. "
+                    if locations:
+                        entity_text += f"Locations: {', '.join(locations)}. "
+                    if organizations:
+                        entity_text += f"Organizations: {', '.join(organizations)}. "
                 
-                # Add entity information if available
-                if entity_text:
-                    summary = f"{summary} {entity_text}"
+                # Truncate to fit model's max input length (typically 1024 tokens)
+                if len(combined_text) > max_length:
+                    combined_text = combined_text[:max_length]
                 
-                # Store summary
-                new_summary = Summary(
-                    cluster_id=cluster.id,
-                    summary_text=summary
-                )
-                session.add(new_summary)
-                print(f"Generated summary for cluster {cluster.id}")
-            except Exception as e:
-                print(f"Error generating summary for cluster {cluster.id}: {e}")
-        
+                # Generate summary
+                try:
+                    summary = summarizer(combined_text, max_length=150, min_length=30, do_sample=False)[0]['summary_text']
+                    
+                    # Add entity information if available
+                    if entity_text:
+                        summary = f"{summary} {entity_text}"
+                    
+                    # Store summary
+                    new_summary = Summary(
+                        cluster_id=cluster.id,
+                        summary_text=summary
+                    )
+                    session.add(new_summary)
+                    cluster.updated_date = datetime.now()
+                    STAGE_ITEMS.inc(stage='summarize')
+                    print(f"Generated summary for cluster {cluster.id}")
+                except Exception as e:
+                    print(f"Error generating summary for cluster {cluster.id}: {e}")
+            
         session.commit()
         print("Summary generation complete!")
     except Exception as e:
@@ -0,0 +1,410 @@
+import sys
+import os
+import json
+import time
+import hmac
+import base64
+from datetime import datetime
+from functools import wraps
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from markupsafe import Markup, escape
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.models import Article, Cluster, ClusterLineage, Entity, EntityMention, Summary, PipelineJob, setup_db
+from database.snapshot import setup_read_db
+from database.changes import get_changes, get_version_range
+from database.runs import get_latest_run
+from database.search import search_articles, search_summaries, SNIPPET_START, SNIPPET_END
+from pipeline.jobs import enqueue_job, job_to_dict
+from webapp.http_cache import conditional_response
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+EXPORT_CHUNK_SIZE = 1000
+
+# Change feed streaming: how often to poll for new changes, and how long one
+# stream stays open before the client reconnects with Last-Event-ID
+CHANGE_POLL_SECONDS = 5
+CHANGE_STREAM_SECONDS = 300
+
+# Selectable fields per resource; the primary key doubles as the pagination key
+CLUSTER_FIELDS = {
+    'id': Cluster.id,
+    'topic': Cluster.topic,
+    'article_count': Cluster.article_count,
+    'created_date': Cluster.created_date
+}
+# processed_content is pipeline-only and cleared in published snapshots, so it isn't offered
+ARTICLE_FIELDS = {
+    'id': Article.id,
+    'title': Article.title,
+    'url': Article.url,
+    'source': Article.source,
+    'author': Article.author,
+    'published_date': Article.published_date,
+    'cluster_id': Article.cluster_id,
+    'content': Article.content
+}
+ENTITY_FIELDS = {
+    'id': Entity.id,
+    'text': Entity.text,
+    'label': Entity.label
+}
+ENTITY_MENTION_FIELDS = {
+    'id': EntityMention.id,
+    'article_id': EntityMention.article_id,
+    'entity_id': EntityMention.entity_id,
+    'count': EntityMention.count
+}
+LINEAGE_FIELDS = {
+    'id': ClusterLineage.id,
+    'cluster_id': ClusterLineage.cluster_id,
+    'kind': ClusterLineage.kind,
+    'other_cluster_id': ClusterLineage.other_cluster_id,
+    'article_count': ClusterLineage.article_count,
+    'similarity': ClusterLineage.similarity,
+    'created_at': ClusterLineage.created_at
+}
+SUMMARY_FIELDS = {
+    'id': Summary.id,
+    'cluster_id': Summary.cluster_id,
+    'summary_text': Summary.summary_text,
+    'created_date': Summary.created_date
+}
+
+# Article bodies are large, so they are only returned when asked for
+DEFAULT_ARTICLE_FIELDS = ['id', 'title', 'url', 'source', 'author', 'published_date', 'cluster_id']
+
+EXPORT_TABLES = {
+    'articles': ARTICLE_FIELDS,
+    'clusters': CLUSTER_FIELDS,
+    'entities': ENTITY_FIELDS,
+    'entity_mentions': ENTITY_MENTION_FIELDS,
+    'summaries': SUMMARY_FIELDS
+}
+
+def get_current_run():
+    """Get the current data version and when it was produced"""
+    session = setup_read_db()
+    try:
+        run = get_latest_run(session)
+        if run is None:
+            return 0, None
+        return run.id, run.finished_at
+    finally:
+        session.close()
+
+def versioned(view):
+    """Give a read-only endpoint the data version as its validator, answering 304 when the client's copy is current"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version, last_modified = get_current_run()
+        return conditional_response(f"api-v{version}", last_modified, lambda: view(*args, **kwargs))
+    return wrapper
+
+class ApiError(Exception):
+    """Invalid request parameters, reported to the client as a 400"""
+
+@api.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({'error': str(error)}), 400
+
+def encode_cursor(last_id):
+    """Encode the last seen primary key as an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps({'after': last_id}).encode()).decode()
+
+def decode_cursor(cursor):
+    """Decode a cursor into the primary key to continue after"""
+    if not cursor:
+        return None
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode()))['after'])
+    except (ValueError, KeyError, TypeError):
+        raise ApiError("Invalid cursor")
+
+def parse_limit():
+    """Read the page size from the query string"""
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ApiError("limit must be an integer")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def parse_fields(allowed, default=None):
+    """Read the comma separated field selection from the query string"""
+    fields = request.args.get('fields')
+    if not fields:
+        return list(default or allowed)
+
+    selected = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in selected if field not in allowed]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+def serialize_row(row, fields):
+    """Convert a result row into a JSON-ready dict with only the selected fields"""
+    record = {}
+    for field in fields:
+        value = getattr(row, field)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        record[field] = value
+    return record
+
+def keyset_query(session, columns, fields, after_id, filters=()):
+    """Build a query ordered by primary key that resumes after the given id"""
+    key = columns['id']
+    # The key is always selected so the next cursor can be computed
+    selected = [key] + [columns[field] for field in fields if field != 'id']
+    query = session.query(*selected).filter(*filters)
+    if after_id is not None:
+        query = query.filter(key > after_id)
+    return query.order_by(key)
+
+def paginate(columns, default_fields=None, filters=()):
+    """Return one keyset page of a resource as a JSON response"""
+    limit = parse_limit()
+    fields = parse_fields(columns, default_fields)
+    after_id = decode_cursor(request.args.get('cursor'))
+
+    session = setup_read_db()
+    try:
+        # Fetch one extra row to know whether another page exists
+        rows = keyset_query(session, columns, fields, after_id, filters).limit(limit + 1).all()
+    finally:
+        session.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return jsonify({
+        'data': [serialize_row(row, fields) for row in rows],
+        'next_cursor': encode_cursor(rows[-1].id) if has_more else None
+    })
+
+@api.route('/clusters')
+@versioned
+def list_clusters():
+    """List clusters"""
+    return paginate(CLUSTER_FIELDS)
+
+@api.route('/clusters/<int:cluster_id>/articles')
+@versioned
+def list_cluster_articles(cluster_id):
+    """List the articles of a cluster"""
+    session = setup_read_db()
+    exists = session.query(Cluster.id).filter_by(id=cluster_id).first() is not None
+    session.close()
+    if not exists:
+        return jsonify({'error': "Cluster not found"}), 404
+
+    return paginate(ARTICLE_FIELDS, DEFAULT_ARTICLE_FIELDS, filters=(Article.cluster_id == cluster_id,))
+
+@api.route('/clusters/<int:cluster_id>/lineage')
+@versioned
+def list_cluster_lineage(cluster_id):
+    """List the lineage events (born, split, merged, ended) that involve a cluster, oldest first"""
+    session = setup_read_db()
+    try:
+        events = session.query(*LINEAGE_FIELDS.values()).filter(
+            (ClusterLineage.cluster_id == cluster_id) | (ClusterLineage.other_cluster_id == cluster_id)
+        ).order_by(ClusterLineage.id).all()
+    finally:
+        session.close()
+    if not events:
+        return jsonify({'error': "No lineage recorded for this cluster"}), 404
+
+    return jsonify({'data': [serialize_row(event, LINEAGE_FIELDS) for event in events]})
+
+@api.route('/articles')
+@versioned
+def list_articles():
+    """List articles, optionally filtered by source"""
+    filters = ()
+    source = request.args.get('source')
+    if source:
+        filters = (Article.source == source,)
+    return paginate(ARTICLE_FIELDS, DEFAULT_ARTICLE_FIELDS, filters=filters)
+
+def highlight_snippet(snippet):
+    """Escape a search snippet and turn its match markers into <mark> tags"""
+    escaped = str(escape(snippet or ''))
+    return Markup(escaped.replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>'))
+
+@api.route('/search')
+@versioned
+def search():
+    """BM25-ranked full-text search over articles and cluster summaries"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        raise ApiError("q is required")
+    limit = parse_limit()
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        raise ApiError("offset must be an integer")
+
+    session = setup_read_db()
+    try:
+        articles = search_articles(session, query, limit=limit, offset=offset)
+        summaries = search_summaries(session, query, limit=min(limit, 10)) if offset == 0 else []
+    finally:
+        session.close()
+
+    return jsonify({
+        'articles': [{
+            'id': row.id,
+            'title': row.title,
+            'url': row.url,
+            'source': row.source,
+            'published_date': row.published_date,
+            'cluster_id': row.cluster_id,
+            'snippet': str(highlight_snippet(row.snippet)),
+            'score': row.score
+        } for row in articles],
+        'clusters': [{
+            'cluster_id': row.cluster_id,
+            'topic': row.topic,
+            'snippet': str(highlight_snippet(row.snippet)),
+            'score': row.score
+        } for row in summaries]
+    })
+
+def parse_since(value):
+    """Read the change version to continue after"""
+    try:
+        return max(0, int(value or 0))
+    except ValueError:
+        raise ApiError("since must be an integer")
+
+@api.route('/changes')
+@versioned
+def list_changes():
+    """Changes recorded after a version, for incremental client sync"""
+    since = parse_since(request.args.get('since'))
+    limit = parse_limit()
+
+    session = setup_read_db()
+    try:
+        oldest, latest = get_version_range(session)
+        # Changes the client still needs were pruned, so it has to resync from the export
+        if oldest and since < oldest - 1:
+            return jsonify({'error': "Changes since this version are no longer available", 'latest_version': latest}), 410
+        changes = get_changes(session, since, limit)
+    finally:
+        session.close()
+
+    return jsonify({
+        'changes': changes,
+        'next_since': changes[-1]['version'] if changes else since,
+        'latest_version': latest
+    })
+
+def iter_change_events(since):
+    """Yield Server-Sent Events for new changes, polling until the stream times out"""
+    deadline = time.monotonic() + CHANGE_STREAM_SECONDS
+    yield f"retry: {int(CHANGE_POLL_SECONDS * 1000)}\n\n"
+    while time.monotonic() < deadline:
+        session = setup_read_db()
+        try:
+            changes = get_changes(session, since, MAX_PAGE_SIZE)
+        finally:
+            session.close()
+
+        for change in changes:
+            yield f"id: {change['version']}\nevent: change\ndata: {json.dumps(change)}\n\n"
+            since = change['version']
+        if len(changes) < MAX_PAGE_SIZE:
+            # Comment line keeps proxies from closing an idle stream
+            yield ": keepalive\n\n"
+            time.sleep(CHANGE_POLL_SECONDS)
+
+@api.route('/changes/stream')
+def stream_changes():
+    """Server-Sent Events stream of changes; reconnecting clients resume from Last-Event-ID"""
+    since = parse_since(request.headers.get('Last-Event-ID') or request.args.get('since'))
+    response = Response(stream_with_context(iter_change_events(since)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def iter_export_rows(columns, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield every row of a table as an NDJSON line, reading it in keyset chunks"""
+    session = setup_read_db()
+    try:
+        after_id = None
+        while True:
+            rows = keyset_query(session, columns, fields, after_id).limit(chunk_size).all()
+            if not rows:
+                break
+            for row in rows:
+                yield json.dumps(serialize_row(row, fields)) + "\n"
+            after_id = rows[-1].id
+    finally:
+        session.close()
+
+@api.route('/export/<table>.ndjson')
+@versioned
+def export_table(table):
+    """Stream a whole table as newline-delimited JSON"""
+    columns = EXPORT_TABLES.get(table)
+    if columns is None:
+        return jsonify({'error': f"Unknown table: {table}"}), 404
+
+    fields = parse_fields(columns)
+    return Response(
+        stream_with_context(iter_export_rows(columns, fields)),
+        mimetype='application/x-ndjson'
+    )
+
+def _pipeline_token_error():
+    """Check the bearer token for queueing runs; returns an error response, or None if it is valid
+
+    Queueing is disabled unless EVENT_PIPELINE_TOKEN is set, so an exposed web
+    server can't be made to run the pipeline.
+    """
+    token = os.environ.get('EVENT_PIPELINE_TOKEN')
+    if not token:
+        return jsonify({'error': "Queueing pipeline runs over the API is disabled"}), 403
+    supplied = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+        return jsonify({'error': "Missing or invalid pipeline token"}), 401
+    return None
+
+@api.route('/pipeline/jobs', methods=['POST'])
+def create_pipeline_job():
+    """Queue a pipeline run for the pipeline runner process"""
+    error = _pipeline_token_error()
+    if error:
+        return error
+    session = setup_db()
+    try:
+        job = enqueue_job(session, trigger='manual')
+        return jsonify(job_to_dict(job)), 202
+    finally:
+        session.close()
+
+@api.route('/pipeline/jobs')
+def list_pipeline_jobs():
+    """List the most recent pipeline jobs with their progress"""
+    limit = parse_limit()
+    session = setup_db()
+    try:
+        jobs = session.query(PipelineJob).order_by(PipelineJob.id.desc()).limit(limit).all()
+        return jsonify({'data': [job_to_dict(job) for job in jobs]})
+    finally:
+        session.close()
+
+@api.route('/pipeline/jobs/<int:job_id>')
+def get_pipeline_job(job_id):
+    """Get one pipeline job with its progress"""
+    session = setup_db()
+    try:
+        job = session.query(PipelineJob).filter_by(id=job_id).first()
+        if not job:
+            return jsonify({'error': "Job not found"}), 404
+        return jsonify(job_to_dict(job))
+    finally:
+        session.close()
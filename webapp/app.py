@@ -1,60 +1,158 @@
 import sys
 import os
 import json
-from flask import Flask, render_template, jsonify, request
-from apscheduler.schedulers.background import BackgroundScheduler
+import threading
+import contextvars
+from collections import defaultdict
+from flask import Flask, render_template, jsonify, request, url_for
 from datetime import datetime, timedelta
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database.models import Article, Cluster, Summary, Entity, setup_db
-from scraper.scrape import run_scraper
-from processing.preprocess import preprocess_articles
-from processing.ner import process_entities
-from processing.cluster import cluster_articles
-from processing.topic_model import extract_topics
-from summarization.summarize import generate_cluster_summaries
-from analysis.visualize import generate_all_visualizations
+from database.models import Article, Cluster, Summary, Entity
+from database.snapshot import setup_read_db, is_snapshot, ClusterCard
+from database.entity_stats import top_entities as get_top_entities
+from database.search import search_articles, search_summaries
+from analysis.visualize import generate_all_visualizations, load_chart_manifest, get_charts_static_path
+from analysis.analytics_store import has_store, get_totals as get_store_totals, get_source_counts
+from webapp.api import api, highlight_snippet, get_current_run
+from webapp.http_cache import conditional_response, init_http_cache
+from webapp.metrics import init_metrics
+from webapp.region_routes import init_regions
+from regions.config import get_region
+from monitoring.profiling import init_profiling
 from sqlalchemy import func
 
 app = Flask(__name__)
+app.register_blueprint(api)
+init_metrics(app)
+init_http_cache(app)
+init_regions(app)
 
 # Add datetime to Jinja context for use in templates (e.g., footer year)
 @app.context_processor
 def inject_now():
     return {'now': datetime.utcnow}
 
+# Pages read from the snapshot published at the end of each pipeline run (see
+# database/snapshot.py), so they never wait on the pipeline's write transactions.
+
+# Rendered pages keyed by region, route and arguments; entries are only reused while
+# the data version (latest completed pipeline run) they were rendered for is current
+_page_cache = {}
+_page_cache_lock = threading.Lock()
+MAX_CACHED_PAGES = 256
+
+def cached_page(key, render, version):
+    """Return a cached rendering of a page, calling render() on a miss"""
+    # Each region has its own shard and data versions
+    region = get_region()
+    key = (region,) + key
+    with _page_cache_lock:
+        cached = _page_cache.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+    
+    page = render()
+    with _page_cache_lock:
+        # Drop the region's entries rendered for older versions, and bound the cache size
+        stale = [cached_key for cached_key, (entry_version, _) in _page_cache.items()
+                 if cached_key[0] == region and entry_version != version]
+        for cached_key in stale:
+            del _page_cache[cached_key]
+        if len(_page_cache) >= MAX_CACHED_PAGES:
+            _page_cache.clear()
+        _page_cache[key] = (version, page)
+    return page
+
 @app.route('/')
 def index():
     """Home page showing clusters and summaries"""
-    session = setup_db()
-    
-    # Get all clusters with their summaries
-    clusters = session.query(Cluster).all()
-    
-    cluster_data = []
-    for cluster in clusters:
-        summary = session.query(Summary).filter_by(cluster_id=cluster.id).first()
-        article_count = cluster.article_count
-        
-        # Get a sample article from the cluster
-        sample_article = session.query(Article).filter_by(cluster_id=cluster.id).first()
-        
-        if summary and sample_article:
-            cluster_data.append({
-                'id': cluster.id,
-                'topic': cluster.topic or f"Cluster {cluster.id}",
-                'summary': summary.summary_text,
-                'article_count': article_count,
-                'sample_title': sample_article.title
-            })
+    version, last_modified = get_current_run()
+    return conditional_response(
+        f"v{version}", last_modified,
+        lambda: cached_page(('index',), render_index, version)
+    )
+
+def render_index():
+    """Render the home page with a single query over clusters, summaries and articles"""
+    session = setup_read_db()
+    
+    if is_snapshot(session):
+        # Published snapshots carry the home page rows pre-joined
+        cards = session.query(ClusterCard).order_by(ClusterCard.id).all()
+        cluster_data = [{
+            'id': card.id,
+            'topic': card.topic or f"Cluster {card.id}",
+            'summary': card.summary_text,
+            'article_count': card.article_count,
+            'sample_title': card.sample_title
+        } for card in cards]
+        session.close()
+        return render_template('index.html', clusters=cluster_data)
+    
+    # First summary and first article of each cluster
+    first_summaries = session.query(
+        Summary.cluster_id, func.min(Summary.id).label('summary_id')
+    ).group_by(Summary.cluster_id).subquery()
+    first_articles = session.query(
+        Article.cluster_id, func.min(Article.id).label('article_id')
+    ).filter(
+        Article.cluster_id.isnot(None)
+    ).group_by(Article.cluster_id).subquery()
+    
+    rows = session.query(
+        Cluster.id, Cluster.topic, Cluster.article_count,
+        Summary.summary_text, Article.title
+    ).join(
+        first_summaries, first_summaries.c.cluster_id == Cluster.id
+    ).join(
+        Summary, Summary.id == first_summaries.c.summary_id
+    ).join(
+        first_articles, first_articles.c.cluster_id == Cluster.id
+    ).join(
+        Article, Article.id == first_articles.c.article_id
+    ).order_by(Cluster.id).all()
+    
+    cluster_data = [{
+        'id': row.id,
+        'topic': row.topic or f"Cluster {row.id}",
+        'summary': row.summary_text,
+        'article_count': row.article_count,
+        'sample_title': row.title
+    } for row in rows]
     
     session.close()
     return render_template('index.html', clusters=cluster_data)
 
+ARTICLES_PER_PAGE = 50
+
 @app.route('/cluster/<int:cluster_id>')
 def cluster_detail(cluster_id):
     """Detail page for a specific cluster"""
-    session = setup_db()
+    after = request.args.get('after', type=int)
+    version, last_modified = get_current_run()
+    
+    session = setup_read_db()
+    updated = session.query(Cluster.updated_date).filter_by(id=cluster_id).scalar()
+    session.close()
+    
+    # The page changes with the data version and with the cluster itself
+    etag = f"v{version}-c{cluster_id}-{int(updated.timestamp()) if updated else 0}-a{after or 0}"
+    if updated and (last_modified is None or updated > last_modified):
+        last_modified = updated
+    
+    return conditional_response(
+        etag, last_modified,
+        lambda: cached_page(
+            ('cluster_detail', cluster_id, after, updated),
+            lambda: render_cluster_detail(cluster_id, after),
+            version
+        )
+    )
+
+def render_cluster_detail(cluster_id, after=None):
+    """Render the detail page for a cluster, one page of articles at a time"""
+    session = setup_read_db()
     
     # Get cluster info
     cluster = session.query(Cluster).filter_by(id=cluster_id).first()
@@ -65,21 +163,16 @@ def cluster_detail(cluster_id):
     # Get cluster summary
     summary = session.query(Summary).filter_by(cluster_id=cluster_id).first()
     
-    # Get articles in this cluster
-    articles = session.query(Article).filter_by(cluster_id=cluster_id).all()
-    
-    # Get top entities for this cluster
-    top_entities = []
-    if articles:
-        article_ids = [article.id for article in articles]
-        
-        top_entities = session.query(
-            Entity.text, Entity.label, Entity.count
-        ).filter(
-            Entity.article_id.in_(article_ids)
-        ).order_by(
-            Entity.count.desc()
-        ).limit(15).all()
+    # Get a page of articles in this cluster, continuing after the last article shown
+    query = session.query(Article).filter_by(cluster_id=cluster_id)
+    if after is not None:
+        query = query.filter(Article.id > after)
+    articles = query.order_by(Article.id).limit(ARTICLES_PER_PAGE + 1).all()
+    next_after = articles[ARTICLES_PER_PAGE - 1].id if len(articles) > ARTICLES_PER_PAGE else None
+    articles = articles[:ARTICLES_PER_PAGE]
+    
+    # Get top entities for this cluster from the materialized statistics
+    top_entities = get_top_entities(session, cluster_id, limit=15)
     
     session.close()
     
@@ -88,68 +181,125 @@ def cluster_detail(cluster_id):
         cluster=cluster,
         summary=summary.summary_text if summary else "No summary available",
         articles=articles,
-        entities=top_entities
+        entities=top_entities,
+        next_after=next_after
     )
 
+# Charts are normally rendered by the pipeline runner; the web process only writes
+# their data once in the background if they were never rendered, so it never
+# needs matplotlib. The bootstrap reads only the analytics store, never the live
+# database. Only one bootstrap per region may run at a time
+_chart_render_locks = defaultdict(threading.Lock)
+
+def render_charts(version=None):
+    """Render the analytics charts unless another render is already in progress"""
+    lock = _chart_render_locks[get_region()]
+    if not lock.acquire(blocking=False):
+        return
+    try:
+        generate_all_visualizations(version, mode='data', db_fallback=False)
+    except Exception as e:
+        print(f"Error rendering charts: {e}")
+    finally:
+        lock.release()
+
+def render_charts_in_background(version=None):
+    """Render the analytics charts on a background thread, for the current region"""
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(render_charts, version), daemon=True).start()
+
 @app.route('/analytics')
 def analytics():
     """Analytics page"""
-    # Generate visualizations
-    generate_all_visualizations()
+    # Charts are rendered after each pipeline run; only bootstrap them if they were never rendered.
+    # Without an analytics store the page shows placeholders until the pipeline's charts stage runs
+    manifest = load_chart_manifest()
+    if manifest is None and has_store():
+        render_charts_in_background()
     
-    session = setup_db()
+    chart_version = manifest['version'] if manifest else None
+    version, last_modified = get_current_run()
+    return conditional_response(
+        f"v{version}-charts{chart_version}", last_modified,
+        lambda: cached_page(('analytics', chart_version), lambda: render_analytics(manifest), version)
+    )
+
+def render_analytics(manifest):
+    """Render the analytics page from the analytics store and the current chart files"""
+    # Aggregations run on the analytics store exported by the pipeline, never on the serving database
+    stats = get_store_totals()
+    sources = get_source_counts()
+    if stats is None:
+        # No store exported yet: count from the snapshot
+        session = setup_read_db()
+        stats = {
+            'total_articles': session.query(Article).count(),
+            'total_clusters': session.query(Cluster).count(),
+            'total_entities': session.query(Entity).count()
+        }
+        sources = session.query(
+            Article.source, func.count(Article.id).label('count')
+        ).group_by(
+            Article.source
+        ).all()
+        session.close()
     
-    # Get some statistics
-    stats = {
-        'total_articles': session.query(Article).count(),
-        'total_clusters': session.query(Cluster).count(),
-        'total_entities': session.query(Entity).count()
-    }
+    source_stats = {source: count for source, count in sources}
     
-    # Get article count by source
-    sources = session.query(
-        Article.source, func.count(Article.id).label('count')
-    ).group_by(
-        Article.source
-    ).all()
+    # Charts without a rendered image are drawn in the browser from the chart data
+    charts = {}
+    chart_data = None
+    if manifest:
+        charts_path = get_charts_static_path()
+        charts = {
+            name: url_for('static', filename=f'{charts_path}/{filename}')
+            for name, filename in manifest['charts'].items()
+        }
+        if manifest.get('data'):
+            chart_data = url_for('static', filename=f"{charts_path}/{manifest['data']}")
     
-    source_stats = {source.source: source.count for source in sources}
+    return render_template('analytics.html', stats=stats, sources=source_stats, charts=charts,
+                           chart_data=chart_data)
+
+SEARCH_RESULTS_PER_PAGE = 20
+
+@app.route('/search')
+def search():
+    """Full-text search over articles and cluster summaries"""
+    query = request.args.get('q', '').strip()
+    page = max(1, request.args.get('page', 1, type=int))
     
-    session.close()
+    articles, summaries = [], []
+    if query:
+        session = setup_read_db()
+        articles = search_articles(
+            session, query,
+            limit=SEARCH_RESULTS_PER_PAGE + 1,
+            offset=(page - 1) * SEARCH_RESULTS_PER_PAGE
+        )
+        if page == 1:
+            summaries = search_summaries(session, query, limit=5)
+        session.close()
     
-    return render_template('analytics.html', stats=stats, sources=source_stats)
+    has_more = len(articles) > SEARCH_RESULTS_PER_PAGE
+    return render_template(
+        'search.html',
+        query=query,
+        page=page,
+        has_more=has_more,
+        articles=articles[:SEARCH_RESULTS_PER_PAGE],
+        summaries=summaries,
+        highlight=highlight_snippet
+    )
 
 @app.route('/about')
 def about():
     """About page explaining the project"""
     return render_template('about.html')
 
-def run_pipeline():
-    """Run the full data pipeline"""
-    print("Running data pipeline...")
-    run_scraper()
-    preprocess_articles()
-    process_entities()
-    cluster_articles()
-    extract_topics()
-    generate_cluster_summaries()
-    generate_all_visualizations()
-    print("Pipeline completed at", datetime.now())
-
-def setup_scheduler():
-    """Set up the scheduler to run the pipeline periodically"""
-    scheduler = BackgroundScheduler()
-    # Run every 6 hours
-    scheduler.add_job(run_pipeline, 'interval', hours=6)
-    scheduler.start()
-    print("Scheduler started!")
+# Opt-in profiling of selected routes (EVENT_PROFILE and EVENT_PROFILE_ROUTES); a no-op otherwise
+init_profiling(app)
 
 if __name__ == "__main__":
-    # Optionally run the pipeline once before starting the app
-    # run_pipeline()
-    
-    # Setup scheduler
-    setup_scheduler()
-    
-    # Start Flask app
+    # The pipeline runs in its own process: start it with `python pipeline/runner.py`
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,129 @@
+import gzip
+import zlib
+from flask import make_response, request
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+# Responses smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 500
+COMPRESSIBLE_MIMETYPES = {'text/html', 'application/json', 'text/css', 'application/javascript'}
+# Streamed responses compressed on the fly with gzip; event streams stay uncompressed
+# so each event reaches the client as soon as it is sent
+STREAM_COMPRESSIBLE_MIMETYPES = {'application/x-ndjson'}
+
+# Chart images and data files (per region below /static/charts/) are versioned by
+# filename, so they never change once written; only the manifests (charts.json)
+# are rewritten in place
+CHARTS_STATIC_PREFIX = '/static/charts/'
+CHARTS_DATA_PREFIX = 'chart_data.'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+def conditional_response(etag, last_modified, render):
+    """Answer with 304 when the client's copy is current, otherwise render and attach validators
+
+    ETags are weak so that compressed and uncompressed variants of a page share one validator.
+    """
+    if request.if_none_match:
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag, last_modified)
+    elif last_modified and request.if_modified_since:
+        if last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None):
+            return _not_modified(etag, last_modified)
+
+    response = make_response(render())
+    if response.status_code == 200:
+        _set_validators(response, etag, last_modified)
+    return response
+
+def _not_modified(etag, last_modified):
+    response = make_response('', 304)
+    _set_validators(response, etag, last_modified)
+    return response
+
+def _set_validators(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    # Clients may keep the page but must revalidate it on every use
+    response.cache_control.no_cache = True
+
+def _choose_encoding():
+    """Pick the best supported encoding from the request's Accept-Encoding header"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def compress_response(response):
+    """after_request hook that compresses text responses and sets static cache headers"""
+    if _is_versioned_chart(request.path):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        return response
+
+    if (response.status_code == 200
+            and response.is_streamed
+            and not response.direct_passthrough
+            and 'Content-Encoding' not in response.headers
+            and response.mimetype in STREAM_COMPRESSIBLE_MIMETYPES):
+        response.vary.add('Accept-Encoding')
+        if request.accept_encodings['gzip']:
+            response.response = _gzip_stream(response.response)
+            response.headers['Content-Encoding'] = 'gzip'
+            response.headers.pop('Content-Length', None)
+        return response
+
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _choose_encoding()
+    data = response.get_data()
+    if encoding is None or len(data) < MIN_COMPRESS_SIZE:
+        return response
+
+    if encoding == 'br':
+        data = brotli.compress(data, quality=5)
+    else:
+        data = gzip.compress(data, compresslevel=6)
+
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def _gzip_stream(chunks):
+    """Gzip a streamed body chunk by chunk, so it is never held in memory whole"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def _is_versioned_chart(path):
+    """Whether a path is a chart image or chart data file whose name carries its version"""
+    if not path.startswith(CHARTS_STATIC_PREFIX):
+        return False
+    filename = path.rsplit('/', 1)[-1]
+    return filename.endswith('.png') or (filename.startswith(CHARTS_DATA_PREFIX) and filename.endswith('.json'))
+
+def init_http_cache(app):
+    """Register compression and static cache headers on the app"""
+    app.after_request(compress_response)
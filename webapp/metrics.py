@@ -0,0 +1,64 @@
+import sys
+import os
+import json
+import time
+from flask import Response, g, request
+from sqlalchemy import func
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.models import PipelineJob, setup_db
+from database.runs import get_latest_run
+from monitoring.metrics import (
+    REGISTRY, HTTP_REQUESTS, HTTP_REQUEST_SECONDS, PIPELINE_JOBS,
+    record_peak_rss, render_samples
+)
+
+JOB_STATUSES = ('queued', 'running', 'completed', 'failed')
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+def _record_request(response):
+    """after_request hook that counts and times requests by route, not by raw path"""
+    start = g.pop('request_start', None)
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    if start is not None:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+    return response
+
+def metrics():
+    """Prometheus scrape endpoint: this process's metrics plus the latest pipeline run's summary"""
+    # Jobs and runs live in the live database; snapshots don't carry the job queue
+    session = setup_db()
+    try:
+        counts = dict(session.query(PipelineJob.status, func.count(PipelineJob.id)).group_by(PipelineJob.status).all())
+        run = get_latest_run(session)
+    finally:
+        session.close()
+
+    for status in JOB_STATUSES:
+        PIPELINE_JOBS.set(counts.get(status, 0), status=status)
+    record_peak_rss('web')
+
+    body = REGISTRY.render()
+    if run:
+        samples = [
+            ['pipeline_id', {}, run.id],
+            ['pipeline_finished_timestamp_seconds', {}, run.finished_at.timestamp()],
+            ['pipeline_duration_seconds', {}, (run.finished_at - run.started_at).total_seconds()],
+        ]
+        if run.metrics:
+            samples.extend(json.loads(run.metrics))
+        body += render_samples(samples, 'pipeline_last_run_')
+    return Response(body, content_type=PROMETHEUS_CONTENT_TYPE)
+
+def init_metrics(app):
+    """Register request instrumentation and the /metrics endpoint on the app
+
+    Call before init_http_cache, so the measured time includes compression.
+    """
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics)
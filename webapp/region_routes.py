@@ -0,0 +1,57 @@
+import sys
+import os
+import re
+from flask import request
+from werkzeug.exceptions import NotFound
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from regions.config import DEFAULT_REGION, get_region, load_regions, set_region
+
+# /r/<region>/... serves a region's pages and API from its own shard
+REGION_PREFIX = re.compile(r'^/r/([^/]+)(/.*)?$')
+
+class RegionDispatcher:
+    """WSGI middleware that selects the region for each request from its /r/<region>/ prefix
+
+    The prefix moves into SCRIPT_NAME, so the app's routes stay unchanged and url_for
+    keeps generated links inside the region. Requests without the prefix are served
+    from the process's own region (EVENT_REGION, the default region if unset).
+    """
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.home_region = get_region()
+
+    def __call__(self, environ, start_response):
+        region = self.home_region
+        match = REGION_PREFIX.match(environ.get('PATH_INFO', ''))
+        if match:
+            region = match.group(1)
+            if region not in load_regions():
+                return NotFound(f"Unknown region {region!r}")(environ, start_response)
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + f'/r/{region}'
+            environ['PATH_INFO'] = match.group(2) or '/'
+        # Set, not scoped: streamed responses are generated after this call returns,
+        # and every request sets its own region before running
+        set_region(region)
+        return self.wsgi_app(environ, start_response)
+
+def inject_regions():
+    """Template context for the region switcher"""
+    regions = load_regions()
+    region = get_region()
+    # The app's mount point without this request's /r/<region> prefix
+    root = request.script_root
+    if root.endswith(f'/r/{region}'):
+        root = root[:-len(f'/r/{region}')]
+    return {
+        'region': region,
+        'region_name': regions[region].get('name', region),
+        'regions': {name: config.get('name', name) for name, config in regions.items()},
+        'region_urls': {name: f'{root}/r/{name}/' for name in regions},
+        'default_region': DEFAULT_REGION
+    }
+
+def init_regions(app):
+    """Route /r/<region>/ requests to the region's shard"""
+    app.wsgi_app = RegionDispatcher(app.wsgi_app)
+    app.context_processor(inject_regions)